@@ -0,0 +1,124 @@
+# addresses.py
+"""
+Normalisation des adresses avant géocodage : une adresse physique = une
+clé, quelle que soit la saisie ("10 rue Nationale, Tours" et
+"10 Rue  Nationale , 37000 Tours, France" donnent la même).
+
+- casse, accents, ponctuation et espaces repliés,
+- abréviations de voie développées (av → avenue, bd → boulevard...),
+- code postal extrait, pays retiré.
+
+`GeocodeIndex` associe ces clés au géocodage canonique déjà payé.
+"""
+import re
+import threading
+import unicodedata
+from typing import NamedTuple
+
+from gateway import CacheInfo
+
+ABBREVIATIONS = {
+    "r": "rue",
+    "av": "avenue",
+    "ave": "avenue",
+    "bd": "boulevard",
+    "bld": "boulevard",
+    "bvd": "boulevard",
+    "pl": "place",
+    "rte": "route",
+    "chem": "chemin",
+    "imp": "impasse",
+    "all": "allee",
+    "sq": "square",
+    "fbg": "faubourg",
+    "st": "saint",
+    "ste": "sainte",
+    "gal": "general",
+    "mal": "marechal",
+    "pdt": "president",
+}
+NOISE = {"france", "cedex"}
+_POSTCODE = re.compile(r"^\d{5}$")
+
+
+class AddressKey(NamedTuple):
+    text: str        # "10 rue nationale tours"
+    postcode: str    # "37000", "" si absent de la saisie
+
+
+def clean_address(address: str) -> str:
+    """Nettoyage à l'écriture : espaces multiples et virgules mal placées, sans rien perdre."""
+    address = re.sub(r"\s+", " ", address or "")
+    address = re.sub(r"\s*,[\s,]*", ", ", address)
+    return address.strip(" ,")
+
+
+def normalize_address(address: str) -> str:
+    """
+    Clé de comparaison : sans accents ni casse, ponctuation réduite à un
+    espace, abréviations développées.
+    """
+    ascii_only = unicodedata.normalize("NFKD", address).encode("ascii", "ignore").decode()
+    tokens = re.sub(r"[^a-z0-9]+", " ", ascii_only.lower()).split()
+    return " ".join(ABBREVIATIONS.get(t, t) for t in tokens)
+
+
+def address_key(address: str) -> AddressKey:
+    """Clé de déduplication : texte normalisé sans pays ni code postal, code postal à part."""
+    postcode = ""
+    words = []
+    for token in normalize_address(address).split():
+        if _POSTCODE.match(token):
+            postcode = postcode or token
+        elif token not in NOISE:
+            words.append(token)
+    return AddressKey(" ".join(words), postcode)
+
+
+class GeocodeIndex:
+    """
+    Clé normalisée → géocodage canonique (lng, lat), thread-safe.
+    Une clé sans code postal ne retrouve une entrée que si elle est unique
+    (même rue, même ville, un seul code postal connu).
+    """
+
+    def __init__(self):
+        self._by_text: dict[str, dict[str, tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: AddressKey) -> tuple[float, float] | None:
+        entries = self._by_text.get(key.text)
+        if not entries:
+            return None
+        if key.postcode in entries:
+            return entries[key.postcode]
+        if len(entries) == 1 and (not key.postcode or "" in entries):
+            return next(iter(entries.values()))
+        return None
+
+    def get(self, key: AddressKey) -> tuple[float, float] | None:
+        with self._lock:
+            coords = self._lookup(key)
+            if coords is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return coords
+
+    def put(self, key: AddressKey, coords: tuple[float, float]) -> None:
+        if not key.text:
+            return
+        with self._lock:
+            self._by_text.setdefault(key.text, {})[key.postcode] = coords
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            size = sum(len(v) for v in self._by_text.values())
+            return CacheInfo(self.hits, self.misses, None, size)
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._by_text.clear()
+            self.hits = self.misses = 0
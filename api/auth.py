@@ -1,9 +1,16 @@
 import os
+import time
+import asyncio
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Annotated
 import bcrypt as _bcrypt_lib
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, text
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from pydantic import BaseModel
 from jose import JWTError, jwt
@@ -14,10 +21,17 @@ _DATABASE_URL = os.getenv("DATABASE_URL", "").replace(
 _engine = create_engine(_DATABASE_URL, pool_pre_ping=True)
 _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
 _Base = declarative_base()
+# partagée avec main.py pour que la FK teams.user_id → users.id se résolve
+metadata = _Base.metadata
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "sportcov-secret-change-me-in-prod")
 ALGORITHM = "HS256"
 TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 jours
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # secondes
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))       # facteur de coût bcrypt
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))          # threads dédiés au hachage
+HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", "32"))     # demandes en attente max
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -29,23 +43,12 @@ class UserORM(_Base):
     full_name = Column(String, nullable=False)
     password_hash = Column(String, nullable=True)
     is_admin = Column(Boolean, default=True)
+    # incrémenté à chaque changement de rôle : invalide les tokens déjà émis
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 
-def _init_db():
-    with _engine.connect() as conn:
-        cols = [r[0] for r in conn.execute(text(
-            "SELECT column_name FROM information_schema.columns WHERE table_name='users'"
-        ))]
-        if "is_admin" not in cols:
-            conn.execute(text("ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT TRUE"))
-            conn.commit()
-
-
-_init_db()
-
-
 def _get_db():
     db = _SessionLocal()
     try:
@@ -55,30 +58,189 @@ def _get_db():
 
 
 def _hash(pw: str) -> str:
-    return _bcrypt_lib.hashpw(pw.encode(), _bcrypt_lib.gensalt()).decode()
+    return _bcrypt_lib.hashpw(pw.encode(), _bcrypt_lib.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 
 def _verify(plain: str, hashed: str) -> bool:
     return _bcrypt_lib.checkpw(plain.encode(), hashed.encode())
 
 
-def _make_token(user_id: int) -> str:
+def _needs_rehash(hashed: str) -> bool:
+    # format "$2b$12$<sel+hash>" : le 3e champ est le coût
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+# ── Pool de hachage borné ────────────────────────────────────────
+
+class _HashPool:
+    """
+    Exécute bcrypt sur quelques threads dédiés (bcrypt relâche le GIL),
+    pour ne pas occuper le threadpool qui sert les endpoints sync.
+    Au-delà de workers + queue_max demandes en cours, on répond 503.
+    """
+
+    def __init__(self, workers: int, queue_max: int):
+        self.workers = workers
+        self.capacity = workers + queue_max
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pending = 0          # soumis, pas encore terminés (file + en cours)
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    def _timed(self, submitted: float, fn, args):
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            ended = time.monotonic()
+            with self._lock:
+                self.wait_seconds_total += started - submitted
+                self.run_seconds_total += ended - started
+                self.completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.capacity:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503, detail="Trop de connexions simultanées, réessayez"
+                )
+            self.pending += 1
+        try:
+            future = self._executor.submit(self._timed, time.monotonic(), fn, args)
+            return await asyncio.wrap_future(future)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "pending": self.pending,
+                "queued": max(0, self.pending - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(1000 * self.wait_seconds_total / done, 1),
+                "avg_run_ms": round(1000 * self.run_seconds_total / done, 1),
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+
+_hash_pool = _HashPool(HASH_WORKERS, HASH_QUEUE_MAX)
+
+
+def hash_pool_stats() -> dict:
+    return _hash_pool.stats()
+
+
+def _make_token(user: UserORM) -> str:
     expire = datetime.datetime.utcnow() + datetime.timedelta(minutes=TOKEN_EXPIRE_MINUTES)
-    return jwt.encode({"sub": str(user_id), "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+    claims = {
+        "sub": str(user.id),
+        "ver": user.token_version or 0,
+        "exp": expire,
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+# ── Principal courant (cache mémoire à TTL court) ────────────────
 
+@dataclass(frozen=True)
+class CurrentUser:
+    """Vue figée d'un utilisateur authentifié, détachée de toute session SQLAlchemy."""
+    id: int
+    email: str
+    full_name: str
+    is_admin: bool
+    token_version: int
+
+
+_principal_cache: dict[int, tuple[float, CurrentUser]] = {}
+_principal_lock = threading.Lock()
+
+
+def _principal_from_orm(user: UserORM) -> CurrentUser:
+    return CurrentUser(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        is_admin=bool(user.is_admin),
+        token_version=user.token_version or 0,
+    )
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(_get_db)):
+
+def _load_principal(user_id: int, min_version: int = 0) -> CurrentUser | None:
+    """
+    Résout l'utilisateur depuis le cache ; on ne touche la BDD
+    qu'à l'expiration de l'entrée (PRINCIPAL_CACHE_TTL), ou quand l'entrée
+    est plus ancienne que min_version (token émis après un changement de rôle).
+    """
+    now = time.monotonic()
+    with _principal_lock:
+        entry = _principal_cache.get(user_id)
+    if entry and entry[0] > now and entry[1].token_version >= min_version:
+        return entry[1]
+
+    db = _SessionLocal()
+    try:
+        user = db.query(UserORM).filter(UserORM.id == user_id).first()
+        principal = _principal_from_orm(user) if user else None
+    finally:
+        db.close()
+
+    if principal is not None:
+        with _principal_lock:
+            _principal_cache[user_id] = (now + PRINCIPAL_CACHE_TTL, principal)
+    return principal
+
+
+def invalidate_principal(user_id: int | None = None) -> None:
+    """
+    Oublie un utilisateur du cache (ou tout le cache si user_id est None).
+
+    Cache propre au process : les autres workers gardent l'ancien rôle
+    jusqu'à l'expiration de leur entrée. C'est voulu : un changement de rôle
+    prend effet partout en au plus PRINCIPAL_CACHE_TTL secondes, au prix
+    d'aucune requête BDD par appel authentifié (ver n'est comparé qu'au
+    token_version mis en cache). Un token plus récent que l'entrée (nouvelle
+    connexion après le changement) la fait relire aussitôt.
+    """
+    with _principal_lock:
+        if user_id is None:
+            _principal_cache.clear()
+        else:
+            _principal_cache.pop(user_id, None)
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = int(payload.get("sub"))
+        token_version = int(payload.get("ver", 0))
     except (JWTError, TypeError, ValueError):
         raise HTTPException(status_code=401, detail="Token invalide ou expiré")
-    user = db.query(UserORM).filter(UserORM.id == user_id).first()
+    user = _load_principal(user_id, min_version=token_version)
     if not user:
         raise HTTPException(status_code=401, detail="Utilisateur introuvable")
+    if token_version != user.token_version:
+        # rôle modifié depuis l'émission du token : on force une reconnexion
+        raise HTTPException(status_code=401, detail="Session expirée, reconnectez-vous")
     return user
 
 
+# à utiliser en annotation : `current_user: UserDep`
+UserDep = Annotated[CurrentUser, Depends(get_current_user)]
+
+
 # ── Schémas Pydantic ──────────────────────────────────────────────
 
 class RegisterIn(BaseModel):
@@ -108,44 +270,75 @@ class UserOut(BaseModel):
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.post("/register", response_model=LoginOut)
-def register(req: RegisterIn, db: Session = Depends(_get_db)):
-    if db.query(UserORM).filter(UserORM.email == req.email).first():
-        raise HTTPException(status_code=400, detail="Cet email est déjà utilisé")
+def _login_out(user: UserORM) -> LoginOut:
+    return LoginOut(
+        access_token=_make_token(user),
+        full_name=user.full_name,
+        email=user.email,
+        is_admin=user.is_admin,
+        role="admin" if user.is_admin else "coach",
+    )
+
+
+# accès BDD des handlers async : dans le threadpool, jamais sur la boucle
+def _user_by_email(db: Session, email: str) -> UserORM | None:
+    return db.query(UserORM).filter(UserORM.email == email).first()
+
+
+def _create_user(db: Session, req: RegisterIn, password_hash: str) -> LoginOut:
     user = UserORM(
         email=req.email,
         full_name=req.full_name,
-        password_hash=_hash(req.password),
+        password_hash=password_hash,
         is_admin=True,
     )
     db.add(user)
     db.commit()
     db.refresh(user)
-    return LoginOut(
-        access_token=_make_token(user.id),
-        full_name=user.full_name,
-        email=user.email,
-        is_admin=user.is_admin,
-        role="admin" if user.is_admin else "coach",
-    )
+    return _login_out(user)
+
+
+def _save_hash(db: Session, user: UserORM, password_hash: str) -> LoginOut:
+    user.password_hash = password_hash
+    db.commit()
+    db.refresh(user)
+    return _login_out(user)
+
+
+@router.post("/register", response_model=LoginOut)
+async def register(req: RegisterIn, db: Annotated[Session, Depends(_get_db)]):
+    if await run_in_threadpool(_user_by_email, db, req.email):
+        raise HTTPException(status_code=400, detail="Cet email est déjà utilisé")
+    password_hash = await _hash_pool.run(_hash, req.password)
+    return await run_in_threadpool(_create_user, db, req, password_hash)
 
 
 @router.post("/login", response_model=LoginOut)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(_get_db)):
-    user = db.query(UserORM).filter(UserORM.email == form.username).first()
-    if not user or not user.password_hash or not _verify(form.password, user.password_hash):
+async def login(
+    form: Annotated[OAuth2PasswordRequestForm, Depends()],
+    db: Annotated[Session, Depends(_get_db)],
+):
+    user = await run_in_threadpool(_user_by_email, db, form.username)
+    if not user or not user.password_hash:
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
-    return LoginOut(
-        access_token=_make_token(user.id),
-        full_name=user.full_name,
-        email=user.email,
-        is_admin=user.is_admin,
-        role="admin" if user.is_admin else "coach",
-    )
+    if not await _hash_pool.run(_verify, form.password, user.password_hash):
+        raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
+    if _needs_rehash(user.password_hash):
+        # BCRYPT_ROUNDS a changé : on profite du mot de passe en clair pour rehacher
+        password_hash = await _hash_pool.run(_hash, form.password)
+        return await run_in_threadpool(_save_hash, db, user, password_hash)
+    return _login_out(user)
+
+
+@router.get("/_diag/hashing")
+def diag_hashing(current_user: UserDep):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Réservé aux admins")
+    return hash_pool_stats()
 
 
 @router.get("/me", response_model=UserOut)
-def me(current_user: UserORM = Depends(get_current_user)):
+def me(current_user: UserDep):
     role = "admin" if current_user.is_admin else "coach"
     return UserOut(id=current_user.id, email=current_user.email,
                    full_name=current_user.full_name, is_admin=current_user.is_admin, role=role)
@@ -155,8 +348,8 @@ def me(current_user: UserORM = Depends(get_current_user)):
 def set_user_role(
     user_id: int,
     is_admin: bool,
-    current_user: UserORM = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    current_user: UserDep,
+    db: Annotated[Session, Depends(_get_db)],
 ):
     """Admin only: promote or demote a user."""
     if not current_user.is_admin:
@@ -164,6 +357,9 @@ def set_user_role(
     user = db.query(UserORM).filter(UserORM.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
-    user.is_admin = is_admin
-    db.commit()
+    if bool(user.is_admin) != is_admin:
+        user.is_admin = is_admin
+        user.token_version = (user.token_version or 0) + 1
+        db.commit()
+        invalidate_principal(user.id)
     return {"id": user.id, "email": user.email, "is_admin": user.is_admin, "role": "admin" if is_admin else "coach"}
@@ -0,0 +1,144 @@
+# batch_cli.py
+"""
+Optimisation hors ligne d'un flux JSONL, sans serveur HTTP (re-plans de
+nuit, tests de capacité) :
+
+    python api/batch_cli.py plans.jsonl -o resultats.jsonl
+    cat plans.jsonl | python api/batch_cli.py - --workers 8
+    python api/batch_cli.py capacite.jsonl --fake-routing carnet.json   # aucun appel Google
+
+Entrée : un InputData par ligne (participants, destination, aller_retour,
+event_date) ; un champ "id" éventuel est recopié tel quel.
+Sortie : une ligne par entrée, dans l'ordre d'entrée, écrite dès qu'elle est prête :
+{"ligne", "id", "duree_s", "resultat": OptimiserResult} ou {..., "erreur": {"status", "detail"}}.
+
+Caches partagés par tout le lot : géocodages (table geocodes de --cache-db,
+gardée d'un lancement à l'autre) et tronçons (mémoire du processus).
+--workers entrées sont préparées en même temps ; les grands effectifs sont
+résolus dans le pool de processus du solveur (SOLVER_WORKERS).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input", help="fichier JSONL d'InputData, - pour l'entrée standard")
+    parser.add_argument("-o", "--output", default="-",
+                        help="fichier JSONL de résultats (défaut : sortie standard)")
+    parser.add_argument("--workers", type=int, default=4, help="entrées préparées simultanément")
+    parser.add_argument("--cache-db", default="sportcov-batch.sqlite",
+                        help="base SQLite du cache de géocodage (ignorée si --database-url)")
+    parser.add_argument("--database-url", default=None,
+                        help="base à utiliser à la place de --cache-db")
+    parser.add_argument("--fake-routing", metavar="CARNET_JSON", default=None,
+                        help="fournisseur factice (bench.fake_routing) : {adresse: [lng, lat]}")
+    return parser.parse_args(argv)
+
+
+def _records(path: str):
+    with ExitStack() as stack:
+        stream = sys.stdin if path == "-" else stack.enter_context(open(path, encoding="utf-8"))
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def _optimise_line(main, number: int, line: str) -> dict:
+    started = time.perf_counter()
+    out: dict = {"ligne": number}
+    try:
+        record = json.loads(line)
+        out["id"] = record.get("id") if isinstance(record, dict) else None
+        result = main._run_optimisation(main.InputData.model_validate(record))
+        out["resultat"] = result.model_dump(mode="json")
+    except main.HTTPException as e:
+        out["erreur"] = {"status": e.status_code, "detail": e.detail}
+    except (json.JSONDecodeError, main.ValidationError) as e:
+        out["erreur"] = {"status": 422, "detail": str(e).splitlines()[0]}
+    out["duree_s"] = round(time.perf_counter() - started, 4)
+    return out
+
+
+def main_cli(argv=None) -> int:
+    args = _parse_args(argv)
+    # l'API s'importe sur la base du cache : aucune table métier n'est écrite
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{Path(args.cache_db).resolve()}"
+    if args.fake_routing:
+        os.environ.setdefault("GOOGLE_API_KEY", "fake-routing")
+    elif not os.getenv("GOOGLE_API_KEY"):
+        print("GOOGLE_API_KEY manquante (ou --fake-routing)", file=sys.stderr)
+        return 2
+
+    import main
+    import migrate
+
+    migrate.run_migrations(main.engine)
+    provider = None
+    if args.fake_routing:
+        sys.path.insert(0, str(ROOT_DIR))
+        from bench.fake_routing import FakeRoutingProvider
+
+        with open(args.fake_routing, encoding="utf-8") as f:
+            book = {address: tuple(coords) for address, coords in json.load(f).items()}
+        provider = FakeRoutingProvider(book)
+
+    out = sys.stdout
+    started = time.perf_counter()
+    count = errors = 0
+
+    def write(item: dict) -> None:
+        nonlocal count, errors
+        count += 1
+        errors += "erreur" in item
+        out.write(json.dumps(item, ensure_ascii=False) + "\n")
+        out.flush()
+
+    workers = max(1, args.workers)
+    with ExitStack() as stack:
+        if provider is not None:
+            # session HTTP partagée par main : tout appel Google passe par le faux
+            stack.enter_context(patch.object(main.session, "get", provider.get))
+        if args.output != "-":
+            out = stack.enter_context(open(args.output, "w", encoding="utf-8"))
+        # sortie dans l'ordre d'entrée, au plus 2 × workers entrées en vol
+        pool = stack.enter_context(
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        )
+        pending: deque = deque()
+        for number, line in enumerate(_records(args.input), 1):
+            pending.append(pool.submit(_optimise_line, main, number, line))
+            while len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+
+    summary = {
+        "lignes": count,
+        "erreurs": errors,
+        "duree_s": round(time.perf_counter() - started, 3),
+        "caches": {
+            "geocode": main._geocodes.cache_info()._asdict(),
+            "directions": main._legs.cache_info()._asdict(),
+        },
+    }
+    if provider is not None:
+        summary["appels_fournisseur"] = dict(provider.calls)
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
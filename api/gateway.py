@@ -0,0 +1,327 @@
+# gateway.py
+"""
+Passerelle unique vers le fournisseur de routage (Google) :
+- seau à jetons global calé sur notre quota (GOOGLE_QPS / GOOGLE_BURST),
+- voies prioritaires : "interactive" (coach qui clique) passe avant
+  "batch" (n8n), qui laisse toujours une réserve de jetons,
+- coalescence « single-flight » : deux requêtes identiques en vol
+  partagent la même réponse au lieu de payer deux fois,
+- OVER_QUERY_LIMIT / HTTP 429 : pause du seau puis nouvel essai, au lieu
+  des retries aveugles de l'adaptateur urllib3,
+- disjoncteur : après GOOGLE_BREAKER_THRESHOLD pannes consécutives
+  (timeouts, erreurs réseau, HTTP 5xx) les appels échouent immédiatement
+  (ProviderUnavailable) ; une sonde en tâche de fond rejoue la dernière
+  requête en échec jusqu'au retour du fournisseur.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+
+import metrics
+
+GOOGLE_QPS = float(os.getenv("GOOGLE_QPS", "40"))                     # jetons / seconde
+GOOGLE_BURST = float(os.getenv("GOOGLE_BURST", str(GOOGLE_QPS)))      # capacité du seau
+GOOGLE_BATCH_RESERVE = float(os.getenv("GOOGLE_BATCH_RESERVE", "0.25"))  # réservé à l'interactif
+GOOGLE_QUOTA_WAIT = float(os.getenv("GOOGLE_QUOTA_WAIT", "20"))       # attente max d'un jeton (s)
+GOOGLE_QUOTA_RETRIES = int(os.getenv("GOOGLE_QUOTA_RETRIES", "2"))  # essais après OVER_QUERY_LIMIT
+GOOGLE_QUOTA_BACKOFF = float(os.getenv("GOOGLE_QUOTA_BACKOFF", "1.0"))  # pause du seau (s)
+GOOGLE_BREAKER_THRESHOLD = int(os.getenv("GOOGLE_BREAKER_THRESHOLD", "5"))  # pannes avant ouverture
+GOOGLE_BREAKER_COOLDOWN = float(os.getenv("GOOGLE_BREAKER_COOLDOWN", "30"))  # entre deux sondes (s)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+_lane: ContextVar[str] = ContextVar("sportcov_provider_lane", default=INTERACTIVE)
+
+
+class QuotaExceeded(Exception):
+    """Pas de jeton disponible dans le délai imparti, ou quota toujours épuisé."""
+
+
+class ProviderUnavailable(Exception):
+    """Fournisseur en panne (disjoncteur ouvert, timeout, erreur réseau ou 5xx)."""
+
+
+@contextmanager
+def lane(name: str):
+    """Fixe la voie des appels fournisseur faits dans ce contexte."""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, batch_reserve: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.reserve = self.capacity * batch_reserve
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, lane_name: str = INTERACTIVE, timeout: float = GOOGLE_QUOTA_WAIT) -> float:
+        """Bloque jusqu'à obtenir un jeton. Retourne le temps attendu (s)."""
+        interactive = lane_name != BATCH
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    # le batch garde `reserve` jetons pour l'interactif et lui cède la place
+                    floor = 1.0 if interactive else 1.0 + self.reserve
+                    can_take = interactive or self._interactive_waiting == 0
+                    if now >= self._paused_until and can_take and self.tokens >= floor:
+                        self.tokens -= 1.0
+                        return now - start
+                    if now >= deadline:
+                        raise QuotaExceeded(
+                            f"aucun jeton fournisseur en {timeout:.0f}s ({lane_name})"
+                        )
+                    wait = max(self._paused_until - now, (floor - self.tokens) / self.rate, 0.005)
+                    self._cond.wait(min(wait, deadline - now))
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Quota dépassé côté fournisseur : plus aucun jeton pendant `seconds`."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def available(self) -> float:
+        with self._cond:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class SingleFlight:
+    """Une seule exécution en vol par clé ; les suivants attendent son résultat."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: dict = {}
+
+    def do(self, key, fn):
+        """Retourne (résultat, partagé?). Les exceptions sont partagées aussi."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LegCache:
+    """
+    LRU borné et thread-safe des tronçons (origine, destination) → valeur,
+    alimenté par lots (Distance Matrix). Même `cache_info()` que lru_cache.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+class CircuitBreaker:
+    """
+    Fermé : les appels passent, les pannes consécutives sont comptées.
+    Ouvert : `check()` lève ProviderUnavailable sans toucher au réseau ;
+    seule la sonde (thread de fond, toutes les `cooldown` s) peut refermer.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, probe, threshold: int = GOOGLE_BREAKER_THRESHOLD,
+                 cooldown: float = GOOGLE_BREAKER_COOLDOWN):
+        self.probe = probe              # () -> bool : True si le fournisseur répond
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def check(self) -> None:
+        if self.state == self.OPEN:
+            raise ProviderUnavailable(
+                f"disjoncteur ouvert depuis {time.monotonic() - self.opened_at:.0f}s"
+            )
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                threading.Thread(
+                    target=self._probe_loop, name="provider-probe", daemon=True
+                ).start()
+
+    def try_probe(self) -> bool:
+        """Un essai de la sonde ; referme le disjoncteur s'il réussit."""
+        try:
+            ok = bool(self.probe())
+        except Exception:
+            ok = False
+        if ok:
+            with self._lock:
+                self.state = self.CLOSED
+                self.failures = 0
+        return ok
+
+    def _probe_loop(self) -> None:
+        while self.state == self.OPEN:
+            time.sleep(self.cooldown)
+            if self.state != self.OPEN or self.try_probe():
+                return
+
+
+class ProviderGateway:
+    def __init__(self, session, rate: float = GOOGLE_QPS, burst: float = GOOGLE_BURST,
+                 batch_reserve: float = GOOGLE_BATCH_RESERVE):
+        self.session = session
+        self.bucket = TokenBucket(rate, burst, batch_reserve)
+        self.flight = SingleFlight()
+        self.breaker = CircuitBreaker(self._probe)
+        self._last_failed: tuple | None = None   # (url, params, timeout) rejouée par la sonde
+
+    def get_json(self, endpoint: str, url: str, params: dict, timeout) -> dict:
+        self.breaker.check()
+        # la clé API ne fait pas partie de l'identité de la requête
+        key = (url, tuple(sorted((k, str(v)) for k, v in params.items() if k != "key")))
+        data, shared = self.flight.do(key, lambda: self._fetch(endpoint, url, params, timeout))
+        if shared:
+            metrics.PROVIDER_COALESCED.labels(endpoint).inc()
+        return data
+
+    def _fetch(self, endpoint: str, url: str, params: dict, timeout) -> dict:
+        lane_name = current_lane()
+        data: dict = {"status": "OVER_QUERY_LIMIT"}
+        for attempt in range(GOOGLE_QUOTA_RETRIES + 1):
+            try:
+                waited = self.bucket.acquire(lane_name)
+            except QuotaExceeded:
+                metrics.PROVIDER_CALLS.labels(endpoint, "THROTTLED").inc()
+                raise
+            metrics.PROVIDER_THROTTLE_SECONDS.labels(lane_name).observe(waited)
+
+            with metrics.provider_call(endpoint) as call:
+                try:
+                    resp = self.session.get(url, params=params, timeout=timeout)
+                except requests.exceptions.RequestException as e:
+                    timed_out = isinstance(e, requests.exceptions.Timeout)
+                    call.status = "timeout" if timed_out else "network_error"
+                    self._failed(url, params, timeout)
+                    raise ProviderUnavailable(f"{endpoint} : {e}") from e
+                if resp.status_code >= 500:
+                    call.status = f"HTTP_{resp.status_code}"
+                    self._failed(url, params, timeout)
+                    raise ProviderUnavailable(f"{endpoint} : HTTP {resp.status_code}")
+                self.breaker.success()
+                if resp.status_code == 429:
+                    call.status = "HTTP_429"
+                else:
+                    resp.raise_for_status()
+                    data = resp.json()
+                    call.status = data.get("status", "UNKNOWN")
+
+            if resp.status_code != 429 and data.get("status") != "OVER_QUERY_LIMIT":
+                return data
+            self.bucket.pause(GOOGLE_QUOTA_BACKOFF * (attempt + 1))
+        return data
+
+    def _failed(self, url: str, params: dict, timeout) -> None:
+        self._last_failed = (url, params, timeout)
+        self.breaker.failure()
+
+    def _probe(self) -> bool:
+        if self._last_failed is None:
+            return False
+        url, params, timeout = self._last_failed
+        with metrics.provider_call("probe") as call:
+            resp = self.session.get(url, params=params, timeout=timeout)
+            call.status = f"HTTP_{resp.status_code}"
+        return resp.status_code < 500
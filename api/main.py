@@ -1,22 +1,37 @@
 # main.py
-from typing import Tuple, List, Optional
+from typing import Annotated, Tuple, List, Optional
 import urllib.parse
 import os
+import string
+import codecs
+import csv
+import json
 import uuid
+import asyncio
 import datetime
 import tempfile
-import httpx
+import threading
+import contextvars
 
 import requests
 from dotenv import load_dotenv
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
 from functools import lru_cache
-from itertools import combinations
+from itertools import chain
+from zoneinfo import ZoneInfo
 
-from fastapi import FastAPI
-from auth import router as auth_router, get_current_user, UserORM, HTTPException, Depends
+from fastapi import BackgroundTasks, FastAPI, Request, WebSocket, WebSocketDisconnect
+from auth import router as auth_router, CurrentUser, HTTPException, Depends
+from auth import metadata as auth_metadata, hash_pool_stats, UserDep
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
@@ -30,20 +45,37 @@ from sqlalchemy import (
     Boolean,
     ForeignKey,
     DateTime,
+    Index,
+    JSON,
+    LargeBinary,
     Text,
     text,
     select,
+    func,
+    literal_column,
+    event as sa_event,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import declarative_base, deferred, sessionmaker, relationship, Session
 
 from jinja2 import Template
-from weasyprint import HTML, CSS
+
+import metrics
+import tracing
+import solver
+from addresses import AddressKey, GeocodeIndex, address_key, clean_address, normalize_address
+from gateway import BATCH, LegCache, ProviderGateway, ProviderUnavailable, QuotaExceeded, lane
+from solver import haversine_km
+from startup import load_pdf_stack, liveness, readiness
 
 # -------------------------------------------------------------------
 # 1) CONFIG GLOBALE
 # -------------------------------------------------------------------
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# racine des API Google ; pointer sur bench/fake_google_server.py pour mesurer hors ligne
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com").rstrip("/")
 
 CO2_PER_KM = float(os.getenv("CO2_PER_KM", "0.2"))            # kg/km
 MAX_PASSENGERS = int(os.getenv("MAX_PASSENGERS", "3"))        # passagers max
@@ -51,10 +83,25 @@ SEUIL_RALLONGE = float(os.getenv("SEUIL_RALLONGE", "1.5"))    # facteur x trajet
 
 LOGO_URL_DEFAULT = os.getenv("LOGO_URL", "").strip()
 
-CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "5.0"))
-READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", "30.0"))
-REQUESTS_TOTAL_RETRIES = int(os.getenv("REQUESTS_TOTAL_RETRIES", "5"))
-REQUESTS_BACKOFF = float(os.getenv("REQUESTS_BACKOFF", "0.7"))
+# appels Google : courts et sans retry HTTP, la passerelle (quota) et le
+# disjoncteur décident seuls de réessayer ou de basculer sur le repli
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "2.0"))
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", "8.0"))
+
+# repli pendant une panne Google : vol d'oiseau x facteur route, à vitesse moyenne
+FALLBACK_ROAD_FACTOR = float(os.getenv("FALLBACK_ROAD_FACTOR", "1.3"))
+FALLBACK_SPEED_KMH = float(os.getenv("FALLBACK_SPEED_KMH", "50"))
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", "50000"))   # dernières valeurs connues
+
+LEG_CACHE_SIZE = int(os.getenv("LEG_CACHE_SIZE", "200000"))        # tronçons en cache
+MATRIX_BLOCK = int(os.getenv("MATRIX_BLOCK", "25"))                # éléments par appel Matrix
+MATRIX_FETCH_WORKERS = int(os.getenv("MATRIX_FETCH_WORKERS", "8"))  # appels Matrix simultanés
+VENUE_REFRESH_WORKERS = int(os.getenv("VENUE_REFRESH_WORKERS", "1"))  # 0 = recalcul désactivé
+# trafic à l'heure du départ : cache des tronçons par créneau (jour de semaine × plage horaire)
+ROUTE_BUCKET_HOURS = int(os.getenv("ROUTE_BUCKET_HOURS", "2"))      # largeur d'une plage horaire
+DEPARTURE_LEAD_MIN = int(os.getenv("DEPARTURE_LEAD_MIN", "60"))     # avance du départ (min)
+MATCH_DURATION_MIN = int(os.getenv("MATCH_DURATION_MIN", "120"))    # départ du retour (min)
+EVENT_TZ = ZoneInfo(os.getenv("EVENT_TZ", "Europe/Paris"))          # heure des matchs saisis
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
@@ -63,6 +110,14 @@ if not DATABASE_URL:
         "postgresql+psycopg2://sportcov:<mdp>@n8n-postgres:5432/sportcov"
     )
 
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "50"))   # événements par appel batch
+
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "500"))           # lignes par INSERT
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "5000"))              # lignes par import
+IMPORT_GEOCODE_WORKERS = int(os.getenv("IMPORT_GEOCODE_WORKERS", "4"))   # géocodages simultanés
+
+SEASON_START_MONTH = int(os.getenv("SEASON_START_MONTH", "8"))   # saison sportive : août → juillet
+
 N8N_WEBHOOK_URL = os.getenv(
     "N8N_WEBHOOK_URL",
     "http://n8n:5678/webhook/carpool",  # URL interne Docker par défaut
@@ -74,7 +129,7 @@ N8N_WEBHOOK_URL = os.getenv(
 # -------------------------------------------------------------------
 engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+Base = declarative_base(metadata=auth_metadata)
 
 
 def get_db() -> Session:
@@ -85,6 +140,9 @@ def get_db() -> Session:
         db.close()
 
 
+DbDep = Annotated[Session, Depends(get_db)]
+
+
 # -------------------------------------------------------------------
 # 3) ORM (tables principales)
 # -------------------------------------------------------------------
@@ -93,11 +151,13 @@ class TeamORM(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String(64), unique=True, index=True, nullable=False)
-    name = Column(String(255), nullable=False)
+    name = Column(String(255), nullable=False, index=True)
     logo_url = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
+    __table_args__ = (Index("ix_teams_user_id_created_at", "user_id", "created_at"),)
+
     events = relationship("EventORM", back_populates="team", cascade="all, delete-orphan")
     participants = relationship("ParticipantORM", back_populates="team", cascade="all, delete-orphan")
 
@@ -116,9 +176,31 @@ class ParticipantORM(Base):
     token = Column(String(32), unique=True, nullable=False, default=lambda: uuid.uuid4().hex[:24])
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (Index("ix_participants_team_id_name", "team_id", "name"),)
+
     team = relationship("TeamORM", back_populates="participants")
 
 
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def identity_lower(value: str, dialect_name: str) -> str:
+    """
+    lower() tel que la base l'applique dans PARTICIPANT_IDENTITY : SQLite ne
+    replie que l'ASCII ("É" reste "É"), PostgreSQL (UTF-8) tout l'Unicode.
+    """
+    return value.lower() if dialect_name == "postgresql" else value.translate(_ASCII_LOWER)
+
+
+# identité d'un joueur dans son équipe pour la synchro n8n / l'import : (nom, email) sans casse
+PARTICIPANT_IDENTITY = (
+    ParticipantORM.team_id,
+    func.lower(ParticipantORM.name),
+    func.lower(func.coalesce(ParticipantORM.email, literal_column("''"))),
+)
+Index("ux_participants_identity", *PARTICIPANT_IDENTITY, unique=True)
+
+
 class EventORM(Base):
     __tablename__ = "events"
 
@@ -127,9 +209,21 @@ class EventORM(Base):
     title = Column(String(255), nullable=True)
     destination = Column(Text, nullable=False)
     event_date = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=True, index=True)
+    # dernier plan tel que servi (cf. _save_plan) : lectures sans jointure ni
+    # sérialisation ; trips / trip_co2 restent la source des requêtes
+    plan_snapshot = deferred(
+        Column(JSON().with_variant(postgresql.JSONB(), "postgresql"), nullable=True)
+    )
+    plan_snapshot_bytes = deferred(Column(LargeBinary, nullable=True))
+    plan_format = Column(Integer, nullable=True)   # PLAN_SNAPSHOT_FORMAT à l'écriture
+    plan_revision = Column(Integer, nullable=False, default=0, server_default="0")  # +1/plan (ETag)
+
+    __table_args__ = (Index("ix_events_team_id_created_at", "team_id", "created_at"),)
 
     team = relationship("TeamORM", back_populates="events")
+    venue = relationship("VenueORM")
     trips = relationship("TripORM", back_populates="event", cascade="all, delete-orphan")
     co2_entries = relationship("TripCO2ORM", back_populates="event", cascade="all, delete-orphan")
 
@@ -138,13 +232,14 @@ class TripORM(Base):
     __tablename__ = "trips"
 
     id = Column(Integer, primary_key=True, index=True)
-    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
     voiture = Column(String(64), nullable=False)
     conducteur = Column(String(255), nullable=False)
     email_conducteur = Column(String(255), nullable=True)
     telephone_conducteur = Column(String(64), nullable=True)
     ordre = Column(Text, nullable=False)
     google_maps = Column(Text, nullable=False)
+    sens = Column(String(8), nullable=False, default="aller", server_default="aller")  # ou retour
 
     event = relationship("EventORM", back_populates="trips")
     passengers = relationship(
@@ -156,7 +251,7 @@ class TripPassengerORM(Base):
     __tablename__ = "trip_passengers"
 
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False)
+    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
     nom = Column(String(255), nullable=False)
     marche = Column(Boolean, default=False)
     email = Column(String(255), nullable=True)
@@ -169,16 +264,107 @@ class TripCO2ORM(Base):
     __tablename__ = "trip_co2"
 
     id = Column(Integer, primary_key=True, index=True)
-    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
     voiture = Column(String(64), nullable=False)
     conducteur = Column(String(255), nullable=False)
     email_conducteur = Column(String(255), nullable=True)
     nb_passagers = Column(Integer, nullable=False)
     co2_voiture_kg = Column(Float, nullable=False)
+    sens = Column(String(8), nullable=False, default="aller", server_default="aller")
 
     event = relationship("EventORM", back_populates="co2_entries")
 
 
+# totaux CO₂ tenus à jour par _save_plan (cf. _apply_co2_delta) : la page CO₂
+# lit quelques lignes au lieu de re-sommer trip_co2 sur tout l'historique
+class TeamCo2SeasonORM(Base):
+    __tablename__ = "co2_team_seasons"
+
+    id = Column(Integer, primary_key=True, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    saison = Column(Integer, nullable=False)   # année de début : 2025 = saison 2025-2026
+    nb_evenements = Column(Integer, nullable=False, default=0)
+    nb_voitures = Column(Integer, nullable=False, default=0)     # voitures, aller et retour
+    nb_passagers = Column(Integer, nullable=False, default=0)
+    co2_kg = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (Index("ux_co2_team_seasons", "team_id", "saison", unique=True),)
+
+
+class ClubCo2SeasonORM(Base):
+    """Club = compte propriétaire des équipes (teams.user_id)."""
+    __tablename__ = "co2_club_seasons"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    saison = Column(Integer, nullable=False)
+    nb_evenements = Column(Integer, nullable=False, default=0)
+    nb_voitures = Column(Integer, nullable=False, default=0)
+    nb_passagers = Column(Integer, nullable=False, default=0)
+    co2_kg = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (Index("ux_co2_club_seasons", "user_id", "saison", unique=True),)
+
+
+class GeocodeORM(Base):
+    """Géocodage canonique d'une adresse physique (clé normalisée, cf. addresses.address_key)."""
+    __tablename__ = "geocodes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    address_text = Column(String(512), nullable=False)
+    postcode = Column(String(16), nullable=False, default="")
+    lng = Column(Float, nullable=False)
+    lat = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (Index("ux_geocodes_address", "address_text", "postcode", unique=True),)
+
+
+class VenueORM(Base):
+    """Lieu de match récurrent : destination géocodée une fois, tronçons entrants précalculés."""
+    __tablename__ = "venues"
+
+    id = Column(Integer, primary_key=True, index=True)
+    address = Column(Text, nullable=False)
+    lng = Column(Float, nullable=False)
+    lat = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    refreshed_at = Column(DateTime, nullable=True)   # dernier recalcul des tronçons entrants
+
+    aliases = relationship("VenueAliasORM", back_populates="venue", cascade="all, delete-orphan")
+    legs = relationship("VenueLegORM", back_populates="venue", cascade="all, delete-orphan")
+
+
+class VenueAliasORM(Base):
+    __tablename__ = "venue_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=False, index=True)
+    alias_key = Column(String(512), nullable=False, unique=True)   # normalize_address(...)
+
+    venue = relationship("VenueORM", back_populates="aliases")
+
+
+class VenueLegORM(Base):
+    """Tronçon domicile → lieu ; durée / distance nulles si Google ne trouve pas d'itinéraire."""
+    __tablename__ = "venue_legs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=False)
+    origin_lng = Column(Float, nullable=False)
+    origin_lat = Column(Float, nullable=False)
+    duration_s = Column(Integer, nullable=True)
+    distance_km = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ux_venue_legs_origin", "venue_id", "origin_lng", "origin_lat", unique=True),
+    )
+
+    venue = relationship("VenueORM", back_populates="legs")
+
+
 # -------------------------------------------------------------------
 # 4) Pydantic modèles (entrée/sortie API)
 # -------------------------------------------------------------------
@@ -223,11 +409,21 @@ class ParticipantUpdate(BaseModel):
 class InputData(BaseModel):
     participants: List[Participant]
     destination: str
+    aller_retour: bool = False   # planifie aussi le retour lieu → domiciles
+    event_date: datetime.datetime | None = None   # trafic du créneau de départ
 
 class CarpoolRequest(BaseModel):
     event_address: str
     participant_ids: List[int]
     event_title: Optional[str] = None
+    event_date: datetime.datetime | None = None
+    aller_retour: bool = False
+
+class CarpoolBatchJob(CarpoolRequest):
+    team_id: int
+
+class CarpoolBatchRequest(BaseModel):
+    jobs: list[CarpoolBatchJob]
 
 class OptimizeAndSavePayload(InputData):
     team_name: str
@@ -267,6 +463,19 @@ class OptimiserResult(BaseModel):
     max_passagers: int
     seuil_rallonge: float
     co2_par_voiture: List[Co2Voiture]
+    # True si des tronçons ont été estimés (vol d'oiseau) pendant une panne Google
+    approximatif: bool = False
+    troncons_estimes: int = 0
+    # plan du retour (lieu → domiciles) en mode aller_retour ; chaque plan
+    # compte alors le CO₂ de son seul sens
+    retour: Optional["OptimiserResult"] = None
+
+
+class CarpoolBatchItem(BaseModel):
+    team_id: int
+    event_id: int | None = None
+    result: OptimiserResult | None = None
+    error: str | None = None
 
 
 class TeamCreate(BaseModel):
@@ -304,25 +513,74 @@ class EventOut(BaseModel):
         from_attributes = True
 
 
+class Co2Saison(BaseModel):
+    saison: int            # année de début
+    libelle: str           # "2025-2026"
+    nb_evenements: int
+    nb_voitures: int
+    nb_passagers: int
+    co2_kg: float
+
+
+class Co2EquipeOut(BaseModel):
+    team_id: int
+    name: str
+    saisons: list[Co2Saison]
+
+
+class Co2SaisonsOut(BaseModel):
+    club: list[Co2Saison]          # toutes les équipes du compte
+    equipes: list[Co2EquipeOut]
+
+
+class ImportProgress(BaseModel):
+    id: str
+    team_id: int
+    status: str = "receiving"    # receiving → geocoding → done
+    rows: int = 0
+    inserted: int = 0
+    rejected: int = 0
+    errors: list[str] = []       # "ligne 12 : adresse manquante" (100 premières)
+    to_geocode: int = 0
+    geocoded: int = 0
+    geocode_failed: int = 0
+    created_at: datetime.datetime
+    finished_at: datetime.datetime | None = None
+
+
+class VenueCreate(BaseModel):
+    address: str
+    aliases: list[str] = []   # autres libellés du même lieu ("Stade Municipal d'Amboise"...)
+
+
+class VenueOut(BaseModel):
+    id: int
+    address: str
+    lng: float
+    lat: float
+    aliases: list[str]
+    troncons: int
+    refreshed_at: datetime.datetime | None = None
+
+
 # -------------------------------------------------------------------
-# 5) HTTP session Google (retries + timeouts)
+# 5) HTTP session Google (timeouts courts, aucun retry)
 # -------------------------------------------------------------------
 session = requests.Session()
-retries = Retry(
-    total=REQUESTS_TOTAL_RETRIES,
-    connect=REQUESTS_TOTAL_RETRIES,
-    read=REQUESTS_TOTAL_RETRIES,
-    backoff_factor=REQUESTS_BACKOFF,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["GET", "POST"],
-    raise_on_status=False,
-)
+# un échec = un appel : le disjoncteur compte les pannes réelles et s'ouvre
+# sans que chaque appel ait déjà attendu plusieurs backoffs et timeouts
+retries = Retry(total=0, connect=0, read=0, status=0, redirect=0, raise_on_status=False)
 adapter = HTTPAdapter(max_retries=retries)
 session.mount("https://", adapter)
 session.mount("http://", adapter)
 
 DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)  # (connect, read)
 
+# seau à jetons + coalescence des requêtes identiques (voir gateway.py)
+gateway = ProviderGateway(session)
+metrics.PROVIDER_TOKENS.set_function(gateway.bucket.available)
+metrics.PROVIDER_BREAKER_OPEN.set_function(lambda: gateway.breaker.is_open)
+
 
 # -------------------------------------------------------------------
 # 6) FASTAPI APP + startup
@@ -345,17 +603,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+metrics.install(app)
+tracing.install(app)
+metrics.HASH_POOL_PENDING.set_function(lambda: hash_pool_stats()["pending"])
+metrics.SOLVER_QUEUE_DEPTH.set_function(lambda: solver.executor.stats()["queued"])
+metrics.SOLVER_PENDING.set_function(lambda: solver.executor.stats()["pending"])
 
 
 @app.on_event("startup")
-def check_api_key():
-    if not GOOGLE_API_KEY:
-        raise RuntimeError("GOOGLE_API_KEY manquante (variable d'environnement).")
+def start_tracing():
+    tracing.setup_tracing()
 
 
 @app.on_event("startup")
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def check_api_key():
+    if not GOOGLE_API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY manquante (variable d'environnement).")
 
 
 VERSION = "pdf-template V3 + events/trips persistence (2025-11-18)"
@@ -373,27 +636,24 @@ def print_version():
 def geocode_address_cached(address: str) -> Tuple[float, float]:
     if not GOOGLE_API_KEY:
         raise HTTPException(status_code=500, detail="GOOGLE_API_KEY manquante.")
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/geocode/json"
     params = {"address": address, "key": GOOGLE_API_KEY}
     try:
-        resp = session.get(url, params=params, timeout=DEFAULT_TIMEOUT)
-        resp.raise_for_status()
-    except requests.exceptions.Timeout:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Timeout géocodage pour '{address}'",
-        )
+        data = gateway.get_json("geocode", url, params, DEFAULT_TIMEOUT)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=503, detail=f"Quota Google atteint : {e}") from e
     except requests.exceptions.RequestException as e:
         raise HTTPException(
             status_code=500,
             detail=f"Échec appel Google Geocode: {e}",
         )
+    # ProviderUnavailable remonte tel quel : geocode_address tente le repli
 
-    data = resp.json()
     status = data.get("status", "UNKNOWN")
 
     if status == "OK" and data.get("results"):
         loc = data["results"][0]["geometry"]["location"]
+        _remember(_stale_geocodes, address, (loc["lng"], loc["lat"]))
         return (loc["lng"], loc["lat"])  # (lng, lat)
     elif status == "ZERO_RESULTS":
         # adresse introuvable côté Google → 400
@@ -409,62 +669,320 @@ def geocode_address_cached(address: str) -> Tuple[float, float]:
         )
 
 def geocode_address(address: str) -> Tuple[float, float]:
+    """
+    (lng, lat) d'une adresse : index de déduplication d'abord (une adresse
+    physique n'est payée qu'une fois, quelle que soit sa saisie), puis Google.
+    """
+    key = address_key(address)
+    known = _geocodes.get(key)
+    if known is not None:
+        return known
     try:
         lng, lat = geocode_address_cached(address.strip())
+        _store_geocode(key, (lng, lat))
         return (lng, lat)
+    except ProviderUnavailable as e:
+        stale = _stale_geocodes.get(address.strip())
+        if stale is None:
+            # pas d'estimation possible pour une adresse jamais vue
+            raise HTTPException(
+                status_code=503, detail=f"Géocodage Google indisponible : {e}"
+            ) from e
+        metrics.PROVIDER_FALLBACKS.labels("geocode", "stale").inc()
+        return stale
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur geocodage '{address}' : {e}")
 
 
-@lru_cache(maxsize=8192)
-def get_google_duration(origin: Tuple[float, float], destination: Tuple[float, float]) -> int:
-    url = "https://maps.googleapis.com/maps/api/directions/json"
-    params = {
-        "origin": f"{origin[1]},{origin[0]}",
-        "destination": f"{destination[1]},{destination[0]}",
-        "key": GOOGLE_API_KEY,
-        "mode": "driving",
-    }
+# adresses normalisées → géocodage canonique ; copie mémoire de la table geocodes
+_geocodes = GeocodeIndex()
+
+
+def _store_geocode(key: AddressKey, coords: tuple[float, float]) -> None:
+    """Ajoute un géocodage payé à l'index et à la table (best effort : l'index suffit)."""
+    _geocodes.put(key, coords)
+    if not key.text:
+        return
     try:
-        response = session.get(url, params=params, timeout=DEFAULT_TIMEOUT)
-        response.raise_for_status()
-        data = response.json()
-        status = data.get("status")
-        if status == "OK":
-            return data["routes"][0]["legs"][0]["duration"]["value"]
-        raise HTTPException(status_code=400, detail=f"Google Directions error: {status}")
-    except requests.exceptions.Timeout:
-        raise HTTPException(status_code=500, detail="Timeout vers Google Directions")
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Erreur Google Directions: {e}")
+        with SessionLocal() as db:
+            db.add(GeocodeORM(address_text=key.text, postcode=key.postcode,
+                              lng=coords[0], lat=coords[1]))
+            db.commit()
+    except IntegrityError:
+        pass   # même adresse enregistrée entre-temps (autre requête, autre process)
+    except SQLAlchemyError:
+        pass
+
+
+def prime_geocodes(addresses) -> None:
+    """Charge en une requête les géocodages déjà en BDD pour ces adresses."""
+    texts = {k.text for k in map(address_key, addresses) if k.text and _geocodes.get(k) is None}
+    if not texts:
+        return
+    try:
+        with SessionLocal() as db:
+            rows = db.query(GeocodeORM).filter(GeocodeORM.address_text.in_(texts)).all()
+    except SQLAlchemyError:
+        return
+    for row in rows:
+        _geocodes.put(AddressKey(row.address_text, row.postcode), (row.lng, row.lat))
+
+
+# cache des tronçons (origine, destination) → (durée s, distance km), partagé par
+# toutes les optimisations ; alimenté par lots Distance Matrix
+_legs = LegCache(LEG_CACHE_SIZE)
+_matrix_pool = ThreadPoolExecutor(max_workers=MATRIX_FETCH_WORKERS, thread_name_prefix="matrix")
+
+
+def _event_local(when: datetime.datetime) -> datetime.datetime:
+    """Heure dans EVENT_TZ : une date naïve y est déjà, une date avec fuseau y est convertie."""
+    return when.replace(tzinfo=EVENT_TZ) if when.tzinfo is None else when.astimezone(EVENT_TZ)
+
+
+def departure_bucket(event_date: datetime.datetime | None,
+                     retour: bool = False) -> tuple[int, int] | None:
+    """
+    Créneau de départ (jour de semaine, plage de ROUTE_BUCKET_HOURS heures)
+    d'un événement, à l'heure de EVENT_TZ : DEPARTURE_LEAD_MIN avant le
+    coup d'envoi, ou MATCH_DURATION_MIN après pour le retour.
+    None sans date (trafic courant).
+    """
+    if event_date is None:
+        return None
+    offset = MATCH_DURATION_MIN if retour else -DEPARTURE_LEAD_MIN
+    depart = _event_local(event_date) + datetime.timedelta(minutes=offset)
+    return depart.weekday(), depart.hour // ROUTE_BUCKET_HOURS
 
 
-@lru_cache(maxsize=8192)
-def get_google_distance_km(origin: Tuple[float, float], destination: Tuple[float, float]) -> float:
-    url = "https://maps.googleapis.com/maps/api/directions/json"
+def bucket_departure_time(bucket: tuple[int, int], now: datetime.datetime | None = None) -> int:
+    """
+    Horodatage représentatif d'un créneau : le milieu de sa prochaine
+    occurrence dans EVENT_TZ (Google refuse un departure_time passé). Tous
+    les événements du créneau partagent ainsi les mêmes tronçons en cache.
+    """
+    weekday, band = bucket
+    now = _event_local(now) if now else datetime.datetime.now(EVENT_TZ)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(
+        days=(weekday - now.weekday()) % 7,
+        minutes=(band * ROUTE_BUCKET_HOURS * 60) + ROUTE_BUCKET_HOURS * 30,
+    )
+    if start <= now:
+        start += datetime.timedelta(days=7)
+    return int(start.timestamp())
+
+
+def _fetch_matrix_block(origins: list, destinations: list,
+                        bucket: tuple[int, int] | None = None) -> dict:
+    """Un appel Distance Matrix. Retourne {(o, d): (s, km) | None si pas d'itinéraire}."""
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/distancematrix/json"
     params = {
-        "origin": f"{origin[1]},{origin[0]}",
-        "destination": f"{destination[1]},{destination[0]}",
+        "origins": "|".join(f"{o[1]},{o[0]}" for o in origins),
+        "destinations": "|".join(f"{d[1]},{d[0]}" for d in destinations),
         "key": GOOGLE_API_KEY,
         "mode": "driving",
     }
+    if bucket is not None:
+        # durée avec trafic prévu au créneau (duration_in_traffic)
+        params["departure_time"] = str(bucket_departure_time(bucket))
+        params["traffic_model"] = "best_guess"
     try:
-        response = session.get(url, params=params, timeout=DEFAULT_TIMEOUT)
-        response.raise_for_status()
-        data = response.json()
+        data = gateway.get_json("distancematrix", url, params, DEFAULT_TIMEOUT)
         status = data.get("status")
-        if status == "OK":
-            meters = data["routes"][0]["legs"][0]["distance"]["value"]
-            return meters / 1000.0
-        raise HTTPException(status_code=400, detail=f"Google Directions error: {status}")
-    except requests.exceptions.Timeout:
-        raise HTTPException(status_code=500, detail="Timeout vers Google Directions")
+        if status != "OK":
+            raise HTTPException(status_code=400, detail=f"Google Distance Matrix error: {status}")
+        block = {}
+        for o, row in zip(origins, data["rows"], strict=True):
+            for d, element in zip(destinations, row["elements"], strict=True):
+                if element.get("status") == "OK":
+                    duration = element.get("duration_in_traffic", element["duration"])["value"]
+                    block[(o, d)] = (duration, element["distance"]["value"] / 1000.0)
+                else:
+                    block[(o, d)] = None   # ZERO_RESULTS / NOT_FOUND
+        return block
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=503, detail=f"Quota Google atteint : {e}") from e
     except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Erreur Google Directions: {e}")
-    except (KeyError, IndexError):
-        raise HTTPException(status_code=500, detail="Réponse Google Directions invalide")
+        raise HTTPException(status_code=500, detail=f"Erreur Google Distance Matrix: {e}") from e
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        # ValueError : lignes ou éléments en nombre différent de la requête
+        raise HTTPException(
+            status_code=500, detail="Réponse Google Distance Matrix invalide"
+        ) from e
+
+
+def _matrix_blocks(pairs: list) -> list:
+    """
+    Regroupe les tronçons manquants en appels d'au plus MATRIX_BLOCK éléments :
+    par origine (ligne) ou par destination (colonne), le découpage le moins coûteux.
+    Seuls les tronçons demandés sont facturés.
+    """
+    by_origin: dict = defaultdict(list)
+    by_destination: dict = defaultdict(list)
+    for o, d in pairs:
+        by_origin[o].append(d)
+        by_destination[d].append(o)
+    rows = [
+        ([o], ds[i:i + MATRIX_BLOCK])
+        for o, ds in by_origin.items() for i in range(0, len(ds), MATRIX_BLOCK)
+    ]
+    cols = [
+        (os_[i:i + MATRIX_BLOCK], [d])
+        for d, os_ in by_destination.items() for i in range(0, len(os_), MATRIX_BLOCK)
+    ]
+    return min(rows, cols, _mixed_blocks(by_origin, by_destination), key=len)
+
+
+def _mixed_blocks(by_origin: dict, by_destination: dict) -> list:
+    """
+    Découpage mixte, glouton : la plus grande ligne ou colonne restante
+    d'abord. Utile aux étoiles dans les deux sens (domicile → lieu et
+    lieu → domicile d'un aller-retour) : une colonne + une ligne.
+    """
+    rows = {o: dict.fromkeys(ds) for o, ds in by_origin.items()}
+    cols = {d: dict.fromkeys(os_) for d, os_ in by_destination.items()}
+    blocks = []
+    while rows:
+        o, ds = max(rows.items(), key=lambda item: len(item[1]))
+        d, os_ = max(cols.items(), key=lambda item: len(item[1]))
+        if len(ds) >= len(os_):
+            ds = list(rows.pop(o))
+            for x in ds:
+                cols[x].pop(o)
+                if not cols[x]:
+                    del cols[x]
+            blocks.extend(([o], ds[i:i + MATRIX_BLOCK]) for i in range(0, len(ds), MATRIX_BLOCK))
+        else:
+            os_ = list(cols.pop(d))
+            for x in os_:
+                rows[x].pop(d)
+                if not rows[x]:
+                    del rows[x]
+            blocks.extend((os_[i:i + MATRIX_BLOCK], [d]) for i in range(0, len(os_), MATRIX_BLOCK))
+    return blocks
+
+
+def get_route_legs(
+    pairs, bucket: tuple[int, int] | None = None
+) -> dict[tuple, tuple[int, float] | None]:
+    """
+    (durée s, distance km) de chaque tronçon demandé, dédoublonnés ; None
+    si Google ne trouve pas d'itinéraire. Les absents du cache partent en
+    appels Distance Matrix parallèles (bornés par le seau de la passerelle).
+    bucket : créneau de départ (departure_bucket), None = trafic courant ;
+    le cache est clé par (origine, destination, créneau).
+    En panne Google : dernière valeur connue, sinon estimation vol d'oiseau.
+    """
+    legs: dict = {}
+    missing = []
+    for pair in dict.fromkeys(pairs):
+        cached = _legs.get((*pair, bucket))
+        if cached is None:
+            missing.append(pair)
+        else:
+            legs[pair] = cached
+    if not missing:
+        return legs
+
+    # une copie du contexte par tâche : la voie (interactive / batch) suit les threads
+    futures = [
+        (block, _matrix_pool.submit(
+            contextvars.copy_context().run, _fetch_matrix_block, *block, bucket
+        ))
+        for block in _matrix_blocks(missing)
+    ]
+    for (origins, destinations), future in futures:
+        try:
+            fetched = future.result()
+        except ProviderUnavailable:
+            fetched = {(o, d): _fallback_leg(o, d, bucket) for o in origins for d in destinations}
+        else:
+            for pair, leg in fetched.items():
+                if leg is not None:
+                    _legs.put((*pair, bucket), leg)
+                    _remember(_stale_legs, (*pair, bucket), leg)
+        legs.update(fetched)
+    return legs
+
+
+def _legs_by_bucket(wanted) -> dict[tuple[int, int] | None, dict]:
+    """(créneau, tronçon)... → {créneau: tronçons} : un get_route_legs par créneau."""
+    grouped: dict = defaultdict(list)
+    for bucket, pair in wanted:
+        grouped[bucket].append(pair)
+    return {bucket: get_route_legs(pairs, bucket) for bucket, pairs in grouped.items()}
+
+
+def get_google_leg(origin: tuple[float, float], destination: tuple[float, float],
+                   bucket: tuple[int, int] | None = None) -> tuple[int, float]:
+    """(durée en s, distance en km) d'un tronçon isolé."""
+    leg = get_route_legs([(origin, destination)], bucket)[(origin, destination)]
+    if leg is None:
+        raise HTTPException(status_code=400, detail="Google Distance Matrix error: ZERO_RESULTS")
+    return leg
+
+
+def get_google_duration(origin: tuple[float, float], destination: tuple[float, float],
+                        bucket: tuple[int, int] | None = None) -> int:
+    return get_google_leg(origin, destination, bucket)[0]
+
+
+def get_google_distance_km(origin: tuple[float, float], destination: tuple[float, float],
+                           bucket: tuple[int, int] | None = None) -> float:
+    return get_google_leg(origin, destination, bucket)[1]
+
+
+# -------------------------------------------------------------------
+# Repli pendant une panne Google (disjoncteur ouvert, timeouts, 5xx)
+# -------------------------------------------------------------------
+# dernières valeurs connues, hors caches : survivent aux évictions et aux cache_clear
+_stale_geocodes: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+_stale_legs: "OrderedDict[tuple, tuple[int, float]]" = OrderedDict()
+_stale_lock = threading.Lock()
+
+# tronçons estimés pendant l'optimisation en cours (None hors optimisation)
+_estimated_legs: ContextVar[set | None] = ContextVar("sportcov_estimated_legs", default=None)
+
+
+def _remember(store: OrderedDict, key, value) -> None:
+    with _stale_lock:
+        store[key] = value
+        store.move_to_end(key)
+        if len(store) > STALE_CACHE_SIZE:
+            store.popitem(last=False)
+
+
+def _fallback_leg(origin: tuple[float, float], destination: tuple[float, float],
+                  bucket: tuple[int, int] | None = None) -> tuple[int, float]:
+    """Dernière valeur connue du tronçon (même créneau), sinon vol d'oiseau (signalé)."""
+    stale = _stale_legs.get((origin, destination, bucket))
+    if stale is not None:
+        metrics.PROVIDER_FALLBACKS.labels("directions", "stale").inc()
+        return stale
+    metrics.PROVIDER_FALLBACKS.labels("directions", "estimate").inc()
+    estimated = _estimated_legs.get()
+    if estimated is not None:
+        estimated.add((origin, destination))
+    km = haversine_km(origin, destination) * FALLBACK_ROAD_FACTOR
+    return int(km / FALLBACK_SPEED_KMH * 3600), km
+
+
+metrics.register_cache("geocode", geocode_address_cached)
+metrics.register_cache("geocode_index", _geocodes)
+metrics.register_cache("directions", _legs)
+
+
+def clear_provider_caches() -> None:
+    """
+    Vide les caches géocodage / itinéraires en mémoire (tests, benchmarks).
+    La table geocodes n'est jamais touchée : prime_geocodes la relit au besoin.
+    """
+    geocode_address_cached.cache_clear()
+    _geocodes.cache_clear()
+    _legs.cache_clear()
+    _stale_geocodes.clear()
+    _stale_legs.clear()
 
 
 def create_google_maps_link(adresses: List[str]) -> str:
@@ -497,166 +1015,784 @@ def format_full_address(row: ParticipantORM) -> str:
     parts: list[str] = []
 
     if row.address:
-        parts.append(row.address.strip())
+        parts.append(clean_address(row.address))
 
     cp_ville = " ".join(
         p.strip()
         for p in [row.postal_code or "", row.city or ""]
         if p and p.strip()
     )
-    if cp_ville:
+    # adresse saisie en entier ("…, 37000 Tours, France") : pas de doublon
+    def deja_en_fin(suffixe: str) -> bool:
+        saisie = " " + normalize_address(", ".join(parts))
+        return saisie.endswith(" " + normalize_address(suffixe))
+
+    if cp_ville and not deja_en_fin(cp_ville):
         parts.append(cp_ville)
 
     # On force le pays pour aider Google
-    parts.append("France")
+    if not deja_en_fin("France"):
+        parts.append("France")
 
     # On filtre les éléments vides et on joint
     return ", ".join(p for p in parts if p)
 
+
+# -------------------------------------------------------------------
+# Catalogue des lieux (destinations récurrentes)
+# -------------------------------------------------------------------
+@dataclass(frozen=True)
+class _Venue:
+    id: int
+    coords: tuple[float, float]
+    inbound: dict[tuple[float, float], tuple[int, float] | None]   # domicile → (s, km) | None
+
+
+# lieux déjà lus en BDD, par clé d'adresse (les inconnus ne sont pas mémorisés)
+_venues: dict[str, _Venue] = {}
+_venues_lock = threading.Lock()
+_venue_pool = ThreadPoolExecutor(
+    max_workers=max(1, VENUE_REFRESH_WORKERS), thread_name_prefix="venues"
+)
+_venue_refresh_pending: set = set()
+
+
+def find_venue(address: str) -> _Venue | None:
+    """Lieu connu pour cette adresse (ou l'un de ses alias), avec ses tronçons entrants."""
+    key = normalize_address(address)
+    with _venues_lock:
+        venue = _venues.get(key)
+    if venue is not None:
+        return venue
+    try:
+        with SessionLocal() as db:
+            row = (
+                db.query(VenueORM)
+                .join(VenueAliasORM, VenueAliasORM.venue_id == VenueORM.id)
+                .filter(VenueAliasORM.alias_key == key)
+                .first()
+            )
+            if row is None:
+                return None
+            legs = db.query(VenueLegORM).filter(VenueLegORM.venue_id == row.id).all()
+            venue = _Venue(
+                id=row.id,
+                coords=(row.lng, row.lat),
+                inbound={
+                    (leg.origin_lng, leg.origin_lat): (
+                        None if leg.duration_s is None else (leg.duration_s, leg.distance_km)
+                    )
+                    for leg in legs
+                },
+            )
+    except SQLAlchemyError:
+        return None   # catalogue indisponible : on retombe sur Google
+    with _venues_lock:
+        _venues[key] = venue
+    return venue
+
+
+def _forget_venue(venue_id: int) -> None:
+    with _venues_lock:
+        for key in [k for k, v in _venues.items() if v.id == venue_id]:
+            del _venues[key]
+
+
+def register_venue(db: Session, address: str, aliases: list[str] | None = None) -> "VenueORM":
+    """Lieu de cette adresse, créé (géocodage) s'il n'existe pas ; ajoute les alias manquants."""
+    keys = dict.fromkeys(normalize_address(a) for a in [address, *(aliases or [])])
+    keys = [k for k in keys if k]
+    if not keys:
+        raise HTTPException(status_code=400, detail="Adresse du lieu obligatoire.")
+    known = db.query(VenueAliasORM).filter(VenueAliasORM.alias_key.in_(keys)).all()
+    venue_ids = {a.venue_id for a in known}
+    if len(venue_ids) > 1:
+        raise HTTPException(status_code=409, detail="Ces adresses désignent des lieux différents.")
+    if venue_ids:
+        venue = db.get(VenueORM, venue_ids.pop())
+    else:
+        lng, lat = geocode_address(address)
+        venue = VenueORM(address=address.strip(), lng=lng, lat=lat)
+        db.add(venue)
+    seen = {a.alias_key for a in known}
+    venue.aliases.extend(VenueAliasORM(alias_key=k) for k in keys if k not in seen)
+    db.flush()
+    _forget_venue(venue.id)
+    return venue
+
+
+def _attach_venue(db: Session, event: "EventORM", register: bool = False) -> None:
+    """
+    Rattache l'événement au lieu de sa destination. register=True crée le lieu
+    (la destination vient d'être géocodée par l'optimisation : cache).
+    Première venue de l'équipe sur ce lieu → recalcul de ses tronçons entrants.
+    """
+    try:
+        if register:
+            venue_id = register_venue(db, event.destination).id
+        else:
+            venue = find_venue(event.destination)
+            if venue is None:
+                return
+            venue_id = venue.id
+    except HTTPException:
+        return   # lieu facultatif : l'événement est enregistré sans
+    known_team = (
+        db.query(EventORM.id)
+        .filter(EventORM.team_id == event.team_id, EventORM.venue_id == venue_id)
+        .first()
+    )
+    event.venue_id = venue_id
+    if known_team is None:
+        _queue_venue_refresh(db, [venue_id])
+
+
+def _team_venue_ids(db: Session, team_id: int) -> list[int]:
+    rows = (
+        db.query(EventORM.venue_id)
+        .filter(EventORM.team_id == team_id, EventORM.venue_id.isnot(None))
+        .distinct()
+        .all()
+    )
+    return [r[0] for r in rows]
+
+
+def _queue_venue_refresh(db: Session, venue_ids) -> None:
+    """Recalcul à lancer après le commit de la session (les workers lisent la BDD)."""
+    db.info.setdefault("venue_refresh", set()).update(venue_ids)
+
+
+@sa_event.listens_for(SessionLocal, "after_commit")
+def _schedule_queued_venue_refresh(db: Session) -> None:
+    venue_ids = db.info.pop("venue_refresh", None)
+    if venue_ids:
+        schedule_venue_refresh(venue_ids)
+
+
+@sa_event.listens_for(SessionLocal, "after_rollback")
+def _drop_queued_venue_refresh(db: Session) -> None:
+    db.info.pop("venue_refresh", None)
+
+
+def schedule_venue_refresh(venue_ids) -> list:
+    """Recalculs en tâche de fond (voie batch), dédoublonnés tant qu'ils attendent."""
+    if VENUE_REFRESH_WORKERS <= 0:
+        return []
+    futures = []
+    for venue_id in set(venue_ids):
+        with _venues_lock:
+            if venue_id in _venue_refresh_pending:
+                continue
+            _venue_refresh_pending.add(venue_id)
+        futures.append(_venue_pool.submit(_refresh_venue_task, venue_id))
+    return futures
+
+
+def _refresh_venue_task(venue_id: int) -> None:
+    with _venues_lock:
+        _venue_refresh_pending.discard(venue_id)   # un changement pendant le calcul en relance un
+    try:
+        with lane(BATCH):
+            refresh_venue(venue_id)
+    except Exception:
+        metrics.VENUE_REFRESHES.labels("error").inc()
+    else:
+        metrics.VENUE_REFRESHES.labels("ok").inc()
+
+
+def refresh_venue(venue_id: int) -> int:
+    """
+    Calcule les tronçons domicile → lieu de tous les participants des équipes
+    qui y jouent (un appel Distance Matrix par bloc, cache partagé). Les
+    estimations faites pendant une panne Google ne sont pas enregistrées.
+    Retourne le nombre de tronçons connus du lieu.
+    """
+    with SessionLocal() as db:
+        venue = db.get(VenueORM, venue_id)
+        if venue is None:
+            return 0
+        team_ids = select(EventORM.team_id).where(EventORM.venue_id == venue_id).distinct()
+        rows = db.query(ParticipantORM).filter(ParticipantORM.team_id.in_(team_ids)).all()
+
+        origins = []
+        for row in rows:
+            try:
+                origins.append(geocode_address(format_full_address(row)))
+            except HTTPException:
+                continue   # adresse introuvable : l'optimisation le signalera
+        dest = (venue.lng, venue.lat)
+        estimated: set = set()
+        estimated_token = _estimated_legs.set(estimated)
+        try:
+            legs = get_route_legs((o, dest) for o in origins)
+        finally:
+            _estimated_legs.reset(estimated_token)
+
+        stored = {(leg.origin_lng, leg.origin_lat): leg for leg in venue.legs}
+        for (origin, _), leg in legs.items():
+            if (origin, dest) in estimated:
+                continue
+            row = stored.get(origin)
+            if row is None:
+                row = stored[origin] = VenueLegORM(origin_lng=origin[0], origin_lat=origin[1])
+                venue.legs.append(row)
+            row.duration_s, row.distance_km = leg if leg is not None else (None, None)
+        venue.refreshed_at = datetime.datetime.utcnow()
+        db.commit()
+    _forget_venue(venue_id)
+    return len(stored)
+
 # -------------------------------------------------------------------
 # 8) Diag
 # -------------------------------------------------------------------
 @app.get("/_diag/google")
 def diag_google():
     try:
-        r = session.get("https://maps.googleapis.com/generate_204", timeout=(3, 5))
+        r = session.get(f"{GOOGLE_MAPS_BASE_URL}/generate_204", timeout=(3, 5))
         return {"ok": True, "status_code": r.status_code}
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Egress KO: {e}")
 
 
+@app.get("/_diag/solver")
+def diag_solver():
+    return solver.executor.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness : le process répond, sans toucher aux dépendances."""
+    return liveness()
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness : BDD joignable + migrations appliquées + clé Google."""
+    report = readiness(engine, GOOGLE_API_KEY)
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 # -------------------------------------------------------------------
 # 9) Cœur de l’algo d’optimisation
 # -------------------------------------------------------------------
-def _run_optimisation(data: InputData) -> dict:
-    participants = data.participants
-    destination = data.destination
-
-    indexed = list(enumerate(participants))  # [(pid, Participant), ...]
-
-    infos_participants = {
-        pid: {
-            "name": p.name,
-            "email": p.email,
-            "telephone": p.telephone,
-            "address": p.address,
-        }
-        for pid, p in indexed
-    }
+class OptimisationCancelled(Exception):
+    """Le client a fermé le flux : on arrête entre deux étapes."""
 
-    try:
-        coords = {pid: geocode_address(p.address) for pid, p in indexed}
-        coord_dest = geocode_address(destination)
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur géocodage : {e}")
 
-    try:
-        durees_directes = {pid: get_google_duration(coords[pid], coord_dest) for pid, _ in indexed}
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur de calcul des durées directes : {e}")
+@dataclass(slots=True)
+class _Job:
+    """
+    Une optimisation en préparation, en colonnes indexées par participant
+    (indice i = data.participants[i]) : pas de dict par joueur.
+    """
+    data: InputData
+    coords: list[tuple[float, float]] = field(default_factory=list)   # tuples du cache géocodage
+    coord_dest: tuple[float, float] | None = None
+    direct_s: array = field(default_factory=lambda: array("i"))       # durée (s) i → destination
+    direct_km: array = field(default_factory=lambda: array("d"))      # km i → destination
+    back_s: array = field(default_factory=lambda: array("i"))         # retour : destination → i
+    back_km: array = field(default_factory=lambda: array("d"))
+    estimated_keys: set = field(default_factory=set)   # tronçons consultés estimés (panne Google)
+    inbound: dict = field(default_factory=dict)        # tronçons domicile → lieu précalculés
+    bucket: tuple[int, int] | None = None              # créneau de départ (trafic), None = courant
+    return_bucket: tuple[int, int] | None = None       # créneau du retour (après le match)
+    problem: solver.Problem | None = None
+    return_problem: solver.Problem | None = None       # aller_retour : problème transposé
+    error: HTTPException | None = None
+
+    def note_legs(self, keys, estimated: set) -> None:
+        if estimated:
+            self.estimated_keys.update(k for k in keys if k in estimated)
+
+
+def _prepare_jobs(jobs: list[_Job], timer: metrics.PhaseTimer,
+                  progress: Callable[[str, int, int], None] | None = None) -> None:
+    """
+    Géocodage puis tronçons de tous les jobs en une passe : les adresses et
+    tronçons communs (même stade, mêmes joueurs) ne sont demandés qu'une fois.
+    Une erreur propre à un job (adresse introuvable...) est rangée dans job.error.
+    progress(phase, fait, total) : avancement, pour l'optimisation en flux.
+    """
+    progress = progress or (lambda phase, done, total: None)
+    total = sum(len(job.data.participants) for job in jobs)
+    with timer("geocode"):
+        prime_geocodes(
+            address
+            for job in jobs
+            for address in [job.data.destination, *(p.address for p in job.data.participants)]
+        )
+        done = 0
+        for job in jobs:
+            job.bucket = departure_bucket(job.data.event_date)
+            job.return_bucket = departure_bucket(job.data.event_date, retour=True)
+            try:
+                job.coords = []
+                for p in job.data.participants:
+                    job.coords.append(geocode_address(p.address))
+                    done += 1
+                    progress("geocode", done, total)
+                venue = find_venue(job.data.destination)
+                if venue is not None:
+                    # tronçons du lieu calculés sans horaire : pas pour un départ daté
+                    job.coord_dest = venue.coords
+                    job.inbound = venue.inbound if job.bucket is None else {}
+                else:
+                    job.coord_dest = geocode_address(job.data.destination)
+            except HTTPException as e:
+                job.error = e
+            except OptimisationCancelled:
+                raise
+            except Exception as e:
+                job.error = HTTPException(status_code=500, detail=f"Erreur géocodage : {e}")
+    ready = [job for job in jobs if job.error is None]
+
+    progress("direct_durations", 0, total)
+    estimated = _estimated_legs.get()
+    # lieu connu : la moitié en étoile (domicile → lieu) est déjà en BDD ;
+    # aller_retour : l'étoile lieu → domiciles part dans la même passe
+    with timer("direct_durations"):
+        legs = _legs_by_bucket(chain(
+            ((job.bucket, (c, job.coord_dest))
+             for job in ready for c in job.coords if c not in job.inbound),
+            ((job.return_bucket, (job.coord_dest, c))
+             for job in ready if job.data.aller_retour for c in job.coords),
+        ))
+        for job in ready:
+            job_legs = legs.get(job.bucket, {})
+            keys = [(c, job.coord_dest) for c in job.coords]
+            job.note_legs(keys, estimated)
+            direct = [
+                job.inbound[c] if c in job.inbound else job_legs[(c, job.coord_dest)]
+                for c in job.coords
+            ]
+            sans_itineraire = [
+                p.address
+                for p, leg in zip(job.data.participants, direct, strict=True) if leg is None
+            ]
+            if sans_itineraire:
+                job.error = HTTPException(
+                    status_code=400,
+                    detail="Aucun itinéraire vers la destination depuis : "
+                           + ", ".join(sans_itineraire),
+                )
+                continue
+            job.direct_s = array("i", (leg[0] for leg in direct))
+            job.direct_km = array("d", (leg[1] for leg in direct))
+            if not job.data.aller_retour:
+                continue
+            keys = [(job.coord_dest, c) for c in job.coords]
+            job.note_legs(keys, estimated)
+            back = [legs[job.return_bucket][key] for key in keys]
+            sans_itineraire = [
+                p.address
+                for p, leg in zip(job.data.participants, back, strict=True) if leg is None
+            ]
+            if sans_itineraire:
+                job.error = HTTPException(
+                    status_code=400,
+                    detail="Aucun itinéraire depuis la destination vers : "
+                           + ", ".join(sans_itineraire),
+                )
+                continue
+            job.back_s = array("i", (leg[0] for leg in back))
+            job.back_km = array("d", (leg[1] for leg in back))
+    ready = [job for job in ready if job.error is None]
+
+    progress("matrix", 0, total)
+    # seuls les tronçons que le glouton peut consulter sont demandés (élagage vol d'oiseau).
+    # Le retour lieu → p_k → ... → p_1 → conducteur est l'aller du problème transposé
+    # (durée i → j lue sur le tronçon j → i) : même glouton, mêmes bornes (symétriques).
+    with timer("matrix") as matrix_span:
+        candidates, back_candidates = {}, {}
+        for job in ready:
+            candidates[id(job)] = solver.candidate_legs(
+                job.coords, job.coord_dest, job.direct_s, SEUIL_RALLONGE
+            )
+            if job.data.aller_retour:
+                back_candidates[id(job)] = solver.candidate_legs(
+                    job.coords, job.coord_dest, job.back_s, SEUIL_RALLONGE
+                )
+        legs = _legs_by_bucket(chain(
+            ((job.bucket, (job.coords[i], job.coords[j]))
+             for job in ready for i, j in candidates[id(job)]),
+            ((job.return_bucket, (job.coords[j], job.coords[i]))
+             for job in ready for i, j in back_candidates.get(id(job), ())),
+        ))
+        for job in ready:
+            job_legs = legs.get(job.bucket, {})
+            job.problem = _job_problem(job, job.direct_s, candidates[id(job)], job_legs, estimated)
+            if job.data.aller_retour:
+                job.return_problem = _job_problem(
+                    job, job.back_s, back_candidates[id(job)], legs.get(job.return_bucket, {}),
+                    estimated, transposed=True,
+                )
+        matrix_span.set_attribute("legs", sum(len(v) for v in legs.values()))
+
+
+def _job_problem(job: _Job, direct: array, needed, legs: dict, estimated: set,
+                 transposed: bool = False) -> solver.Problem:
+    """Problème du solveur ; transposed : durations[i * n + j] = tronçon j → i (retour)."""
+    n = len(job.coords)
+    coords = job.coords
+    keys = [(coords[j], coords[i]) if transposed else (coords[i], coords[j]) for i, j in needed]
+    durations = solver.empty_matrix(n)
+    for (i, j), key in zip(needed, keys, strict=True):
+        leg = legs[key]
+        if leg is not None:
+            durations[i * n + j] = leg[0]
+    job.note_legs(keys, estimated)
+    return solver.Problem(
+        direct=direct,
+        durations=durations,
+        max_passengers=MAX_PASSENGERS,
+        seuil=SEUIL_RALLONGE,
+    )
 
-    non_assignes = set(pid for pid, _ in indexed)
-    trajets: List[dict] = []
-    trajets_ids: List[List[int]] = []
 
-    from math import inf
+def _return_problem(job: _Job, outbound: solver.Solution) -> solver.Problem:
+    """
+    Retour limité aux voitures de l'aller (elles sont au lieu) : mêmes
+    conducteurs, MAX_PASSENGERS places chacune ; seuls l'attribution des
+    passagers et l'ordre de dépose sont optimisés.
+    """
+    return replace(job.return_problem, drivers=tuple(route[0] for route in outbound.routes))
+
 
-    while non_assignes:
-        conducteur = max(non_assignes, key=lambda pid: durees_directes[pid])
+def _car(job: _Job, route: list[int], numero: int,
+         is_return: bool = False) -> tuple[TrajetOut, Co2Voiture]:
+    """
+    Une voiture du solveur → modèles de l'API, une seule fois (pas de dict à revalider).
+    is_return : route du problème transposé, passagers déposés en ordre inverse.
+    """
+    participants = job.data.participants
+    destination = job.data.destination
+    # un seul sens planifié : le CO₂ de l'aller vaut pour l'A/R
+    co2_sens = 1 if job.data.aller_retour else 2
+    km = job.back_km if is_return else job.direct_km
+
+    conducteur = participants[route[0]]
+    if is_return:
+        passagers = route[:0:-1]
+        adresses = [destination, *(participants[i].address for i in passagers), conducteur.address]
+    else:
+        passagers = route[1:]
+        adresses = [participants[i].address for i in route] + [destination]
+    voiture = f"Voiture {numero}"
+    trajet = TrajetOut(
+        voiture=voiture,
+        conducteur=conducteur.name,
+        email_conducteur=conducteur.email,
+        telephone_conducteur=conducteur.telephone,
+        passagers=[
+            TrajetPassager(
+                nom=participants[i].name,
+                email=participants[i].email,
+                telephone=participants[i].telephone,
+            )
+            for i in passagers
+        ],
+        ordre=" → ".join(adresses),
+        google_maps=create_google_maps_link(adresses),
+    )
 
-        passagers_compatibles: List[int] = []
-        for autre in non_assignes:
-            if autre == conducteur:
-                continue
-            duree_aller = get_google_duration(coords[conducteur], coords[autre])
-            duree_retour = get_google_duration(coords[autre], coord_dest)
-            if (duree_aller + duree_retour) <= SEUIL_RALLONGE * durees_directes[conducteur]:
-                passagers_compatibles.append(autre)
-
-        best_subset: List[int] = []
-        best_k = -1
-        best_duration = inf
-        limit = min(MAX_PASSENGERS, len(passagers_compatibles))
-
-        for k in range(limit, -1, -1):
-            for subset in combinations(passagers_compatibles, k):
-                points = [coords[conducteur]] + [coords[pid] for pid in subset] + [coord_dest]
-                duree_trajet = sum(get_google_duration(points[i], points[i + 1]) for i in range(len(points) - 1))
-                if duree_trajet > SEUIL_RALLONGE * durees_directes[conducteur]:
-                    continue
-                if (k > best_k) or (k == best_k and duree_trajet < best_duration):
-                    best_k = k
-                    best_duration = duree_trajet
-                    best_subset = list(subset)
+    co2_v = sum(km[i] for i in passagers) * CO2_PER_KM * co2_sens
+    return trajet, Co2Voiture(
+        voiture=voiture,
+        conducteur=conducteur.name,
+        email_conducteur=conducteur.email,
+        nb_passagers=len(passagers),
+        co2_voiture_kg=round(co2_v, 2),
+    )
 
-        pids_trajet = [conducteur] + best_subset
-        adresses = [infos_participants[pid]["address"] for pid in pids_trajet] + [destination]
 
-        trajets.append(
-            {
-                "voiture": f"Voiture {len(trajets) + 1}",
-                "conducteur": infos_participants[conducteur]["name"],
-                "email_conducteur": infos_participants[conducteur]["email"],
-                "telephone_conducteur": infos_participants[conducteur]["telephone"],
-                "passagers": [
-                    {
-                        "nom": infos_participants[pid]["name"],
-                        "marche": False,
-                        "email": infos_participants[pid]["email"],
-                        "telephone": infos_participants[pid]["telephone"],
-                    }
-                    for pid in best_subset
-                ],
-                "ordre": " → ".join(adresses),
-                "google_maps": create_google_maps_link(adresses),
-            }
+def _plan_result(job: _Job, cars: list[tuple[TrajetOut, Co2Voiture]],
+                 retour: OptimiserResult | None = None) -> OptimiserResult:
+    co2_par_voiture = [v for _, v in cars]
+    estimes = len(job.estimated_keys)
+    return OptimiserResult(
+        trajets=[t for t, _ in cars],
+        co2_economise_kg=round(sum(v.co2_voiture_kg for v in co2_par_voiture), 2),
+        co2_facteur_kg_km=CO2_PER_KM,
+        max_passagers=MAX_PASSENGERS,
+        seuil_rallonge=SEUIL_RALLONGE,
+        co2_par_voiture=co2_par_voiture,
+        approximatif=estimes > 0,
+        troncons_estimes=estimes,
+        retour=retour,
+    )
+
+
+def _assemble_result(job: _Job, solution: solver.Solution,
+                     retour: solver.Solution | None = None) -> OptimiserResult:
+    plan_retour = None
+    if retour is not None:
+        plan_retour = _plan_result(
+            job, [_car(job, route, k, is_return=True) for k, route in enumerate(retour.routes, 1)]
         )
-        trajets_ids.append(pids_trajet)
-        non_assignes -= set(pids_trajet)
+    cars = [_car(job, route, k) for k, route in enumerate(solution.routes, 1)]
+    return _plan_result(job, cars, plan_retour)
+
+
+def _run_optimisations(datas: list[InputData]) -> list[OptimiserResult | HTTPException]:
+    """
+    Optimise plusieurs effectifs d'un coup : géocodage et tronçons mutualisés,
+    résolutions en parallèle (pool de processus). Un résultat par entrée,
+    ou l'HTTPException propre à cette entrée.
+    """
+    roster_size = sum(len(d.participants) for d in datas)
+    with tracing.span("optimiser.run", roster_size=roster_size, jobs=len(datas)) as run_span:
+        timer = metrics.PhaseTimer()
+        estimated: set = set()
+        estimated_token = _estimated_legs.set(estimated)
+        try:
+            jobs = [_Job(data) for data in datas]
+            _prepare_jobs(jobs, timer)
+            ready = [job for job in jobs if job.error is None]
+
+            # les retours après les allers : ils reprennent les voitures de l'aller
+            with timer("solve", jobs=len(ready)):
+                try:
+                    solutions = solver.executor.solve_many([job.problem for job in ready])
+                    returning = [
+                        (job, sol) for job, sol in zip(ready, solutions, strict=True)
+                        if job.return_problem is not None
+                    ]
+                    return_solutions = solver.executor.solve_many(
+                        [_return_problem(job, sol) for job, sol in returning]
+                    )
+                except solver.SolverBusy as e:
+                    raise HTTPException(
+                        status_code=503, detail=f"Solveur saturé, réessayez : {e}"
+                    ) from e
+            retours = {
+                id(job): sol
+                for (job, _), sol in zip(returning, return_solutions, strict=True)
+            }
+
+            try:
+                with timer("co2"):
+                    results = {
+                        id(job): _assemble_result(job, sol, retours.get(id(job)))
+                        for job, sol in zip(ready, solutions, strict=True)
+                    }
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Erreur calcul CO2 : {e}") from e
+        finally:
+            _estimated_legs.reset(estimated_token)
+
+        timer.observe()
+        solved = solutions + return_solutions
+        run_span.set_attribute("cars", sum(len(s.routes) for s in solved))
+        run_span.set_attribute("compatible_pairs", sum(s.compatible_pairs for s in solved))
+        run_span.set_attribute("subsets_evaluated", sum(s.subsets_evaluated for s in solved))
+        run_span.set_attribute("estimated_legs", len(estimated))
+        return [job.error if job.error is not None else results[id(job)] for job in jobs]
+
+
+def _run_optimisation(data: InputData) -> OptimiserResult:
+    (result,) = _run_optimisations([data])
+    if isinstance(result, HTTPException):
+        raise result
+    return result
+
+
+def _run_optimisation_streaming(data: InputData, emit: Callable[[dict], None],
+                                cancelled: threading.Event) -> OptimiserResult:
+    """
+    _run_optimisation qui raconte son avancement via emit() :
+    {"type": "progression", "phase", "fait", "total"} pendant la préparation,
+    puis {"type": "voiture", "sens", "assignes", "total", "trajet", "co2"} dès
+    que le glouton fixe une voiture. Résolution dans le thread appelant
+    (pas de worker) pour pouvoir s'arrêter quand `cancelled` est levé.
+    """
+    with tracing.span(
+        "optimiser.run", roster_size=len(data.participants), jobs=1, streaming=True
+    ) as run_span:
+        timer = metrics.PhaseTimer()
+        estimated: set = set()
+        estimated_token = _estimated_legs.set(estimated)
+        try:
+            job = _Job(data)
+
+            def progress(phase: str, done: int, total: int) -> None:
+                if cancelled.is_set():
+                    raise OptimisationCancelled()
+                emit({"type": "progression", "phase": phase, "fait": done, "total": total})
+
+            _prepare_jobs([job], timer, progress)
+            if job.error is not None:
+                raise job.error
+
+            total = len(data.participants)
+            plans = ["aller", "retour"] if data.aller_retour else ["aller"]
+            solutions: dict[str, solver.Solution] = {}
+            cars: dict[str, list] = {}
+            with timer("solve", jobs=1):
+                for sens in plans:
+                    problem = (
+                        job.problem if sens == "aller"
+                        else _return_problem(job, solutions["aller"])
+                    )
+                    solution = solutions[sens] = solver.Solution()
+                    cars[sens] = []
+                    for route in solver.executor.iter_solve(problem, solution):
+                        if cancelled.is_set():
+                            raise OptimisationCancelled()
+                        numero = len(cars[sens]) + 1
+                        trajet, co2 = _car(job, route, numero, is_return=sens == "retour")
+                        cars[sens].append((trajet, co2))
+                        emit({
+                            "type": "voiture",
+                            "sens": sens,
+                            "assignes": sum(len(r) for r in solution.routes),
+                            "total": total,
+                            "trajet": trajet.model_dump(),
+                            "co2": co2.model_dump(),
+                        })
+            with timer("co2"):
+                retour = _plan_result(job, cars["retour"]) if "retour" in cars else None
+                result = _plan_result(job, cars["aller"], retour)
+        finally:
+            _estimated_legs.reset(estimated_token)
+
+        timer.observe()
+        run_span.set_attribute("cars", len(cars["aller"]))
+        run_span.set_attribute("estimated_legs", len(estimated))
+        return result
+
+
+# à incrémenter quand OptimiserResult change de forme : les snapshots plus
+# anciens sont ignorés (plan reconstruit depuis les tables)
+PLAN_SNAPSHOT_FORMAT = 1
+
+
+def _save_plan(db: Session, event: "EventORM", result: OptimiserResult) -> None:
+    """
+    Remplace les trips / passagers / CO₂ de l'événement par ceux de `result`,
+    et de `result.retour` s'il y en a un (sens = "retour"), puis le snapshot
+    servi tel quel par les lectures (GET trips, lien joueur).
+    co2_par_voiture est dans le même ordre que trajets. Pas de commit ici.
+    """
+    with metrics.phase("persist") as persist_span:
+        persist_span.set_attribute("event_id", event.id)
+        with tracing.span("persist.delete_previous"):
+            previous = _co2_totals([(c.nb_passagers, c.co2_voiture_kg) for c in event.co2_entries])
+            for trip in list(event.trips):
+                db.delete(trip)
+            for co2 in list(event.co2_entries):
+                db.delete(co2)
+            db.flush()
+
+        plans = [("aller", result)]
+        if result.retour is not None:
+            plans.append(("retour", result.retour))
+        for sens, plan in plans:
+            _add_plan_rows(db, event, plan, sens)
+        current = _co2_totals([
+            (v.nb_passagers, v.co2_voiture_kg) for _, plan in plans for v in plan.co2_par_voiture
+        ])
+        # recalcul : l'ancien plan est retiré des totaux, le nouveau ajouté (même transaction)
+        _apply_co2_delta(db, event, {k: current[k] - previous[k] for k in current})
+        serialized = result.model_dump_json().encode()
+        event.plan_snapshot = json.loads(serialized)
+        event.plan_snapshot_bytes = serialized
+        event.plan_format = PLAN_SNAPSHOT_FORMAT
+        event.plan_revision = (event.plan_revision or 0) + 1
+        with tracing.span("persist.flush", trips=sum(len(plan.trajets) for _, plan in plans)):
+            db.flush()
+
+
+def season_of(when: datetime.datetime | None) -> int:
+    """Saison sportive (année de début) d'une date ; SEASON_START_MONTH ouvre la saison."""
+    when = when or datetime.datetime.utcnow()
+    return when.year if when.month >= SEASON_START_MONTH else when.year - 1
 
-    try:
-        co2_par_voiture = []
-        for i, t in enumerate(trajets):
-            pids_trajet = trajets_ids[i]
-            passagers_pids = pids_trajet[1:]
-            co2_v = 0.0
-            for pid in passagers_pids:
-                dist_km = get_google_distance_km(coords[pid], coord_dest)  # aller simple
-                co2_v += dist_km * CO2_PER_KM * 2  # A/R
-            co2_par_voiture.append({
-                "voiture": t["voiture"],
-                "conducteur": t["conducteur"],
-                "email_conducteur": t["email_conducteur"],
-                "nb_passagers": len(passagers_pids),
-                "co2_voiture_kg": round(co2_v, 2),
-            })
-        co2_total_kg = round(sum(v["co2_voiture_kg"] for v in co2_par_voiture), 2)
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur calcul CO2 : {e}")
 
+def _co2_totals(cars: list[tuple[int, float]]) -> dict:
+    """Contribution d'un plan aux totaux, à partir de (nb_passagers, co2_voiture_kg) par voiture."""
     return {
-        "trajets": trajets,
-        "co2_economise_kg": co2_total_kg,
-        "co2_facteur_kg_km": CO2_PER_KM,
-        "max_passagers": MAX_PASSENGERS,
-        "seuil_rallonge": SEUIL_RALLONGE,
-        "co2_par_voiture": co2_par_voiture,
+        "nb_evenements": 1 if cars else 0,
+        "nb_voitures": len(cars),
+        "nb_passagers": sum(n for n, _ in cars),
+        "co2_kg": sum(kg for _, kg in cars),
     }
 
 
+def _apply_co2_delta(db: Session, event: "EventORM", delta: dict) -> None:
+    """
+    Ajoute `delta` aux totaux équipe × saison et club × saison de l'événement.
+    UPSERT incrémental (col = col + excluded.col) : deux plans simultanés de
+    la même équipe ne perdent pas de mise à jour. Pas de commit ici.
+    """
+    if not any(delta.values()):
+        return
+    saison = season_of(event.event_date or event.created_at)
+    user_id = db.execute(select(TeamORM.user_id).where(TeamORM.id == event.team_id)).scalar()
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    now = datetime.datetime.utcnow()
+    scopes = [(TeamCo2SeasonORM, {"team_id": event.team_id})]
+    if user_id is not None:   # équipes créées par n8n : pas de club
+        scopes.append((ClubCo2SeasonORM, {"user_id": user_id}))
+    for model, key in scopes:
+        stmt = dialect.insert(model).values(**key, saison=saison, updated_at=now, **delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[*key, "saison"],
+            set_={
+                **{k: getattr(model, k) + stmt.excluded[k] for k in delta},
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt)
+
+
+def _add_plan_rows(db: Session, event: "EventORM", plan: OptimiserResult, sens: str) -> None:
+    for t, v in zip(plan.trajets, plan.co2_par_voiture, strict=True):
+        db.add(
+            TripORM(
+                event=event,
+                sens=sens,
+                voiture=t.voiture,
+                conducteur=t.conducteur,
+                email_conducteur=t.email_conducteur,
+                telephone_conducteur=t.telephone_conducteur,
+                ordre=t.ordre,
+                google_maps=t.google_maps,
+                passengers=[
+                    TripPassengerORM(
+                        nom=p.nom,
+                        marche=p.marche,
+                        email=p.email,
+                        telephone=p.telephone,
+                    )
+                    for p in t.passagers
+                ],
+            )
+        )
+        db.add(
+            TripCO2ORM(
+                event=event,
+                sens=sens,
+                voiture=v.voiture,
+                conducteur=v.conducteur,
+                email_conducteur=v.email_conducteur,
+                nb_passagers=v.nb_passagers,
+                co2_voiture_kg=v.co2_voiture_kg,
+            )
+        )
+
+
 # -------------------------------------------------------------------
 # 10) Endpoints d’optimisation
 # -------------------------------------------------------------------
 @app.post("/optimiser_direct", response_model=OptimiserResult)
 async def optimiser_trajets(data: InputData):
-    result_dict = _run_optimisation(data)
-    return OptimiserResult(**result_dict)
+    return await run_in_threadpool(_run_optimisation, data)
 
 @app.post("/events/optimize_and_save")
 async def optimize_and_save(payload: OptimizeAndSavePayload, db: Session = Depends(get_db)):
@@ -673,129 +1809,98 @@ async def optimize_and_save(payload: OptimizeAndSavePayload, db: Session = Depen
     if not name:
         raise HTTPException(status_code=400, detail="team_name obligatoire")
 
-    # 1) Récupérer ou créer l'équipe
-    team = db.query(TeamORM).filter(TeamORM.name == name).first()
-    if not team:
-        team = TeamORM(code=slugify(name), name=name)
-        db.add(team)
-        db.commit()
-        db.refresh(team)
-
-    # 2) Mettre à jour la table participants (roster de l’équipe)
-    existing = db.query(ParticipantORM).filter(ParticipantORM.team_id == team.id).all()
-    existing_index = {
-        (p.name.strip().lower(), (p.email or "").strip().lower()): p for p in existing
-    }
-
-    for p in payload.participants:
-        key = (p.name.strip().lower(), (p.email or "").strip().lower())
-        if key in existing_index:
-            row = existing_index[key]
-            row.address = p.address
-            row.email = p.email or ""
-            row.telephone = p.telephone or ""
-        else:
-            row = ParticipantORM(
-                team_id=team.id,
-                name=p.name,
-                address=p.address,
-                email=p.email or "",
-                telephone=p.telephone or "",
+    # 1) Récupérer l'équipe par nom (ix_teams_name) : son code n'est pas forcément
+    #    slugify(nom) si elle vient de POST /teams ("U13 A" / "u13a")
+    team_id = db.execute(
+        select(TeamORM.id).where(TeamORM.name == name).order_by(TeamORM.id).limit(1)
+    ).scalar()
+    if team_id is None:
+        # sinon la créer (upsert sur le code : deux webhooks simultanés → une équipe)
+        code = slugify(name)
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(TeamORM).values(
+            code=code, name=name, created_at=datetime.datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TeamORM.code], set_={"code": stmt.excluded.code}
+        )
+        team_id, team_name = db.execute(stmt.returning(TeamORM.id, TeamORM.name)).one()
+        if team_name != name:
+            # "U13 Féminines" et "U13 feminines" → même code : ne pas fusionner deux rosters
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail=f"Le code d'équipe « {code} » appartient déjà à « {team_name} » : "
+                       "nom d'équipe ambigu.",
             )
-            db.add(row)
-            existing_index[key] = row
 
-    db.flush()
+    # 2) Synchroniser le roster : une instruction, quelle que soit sa taille
+    _upsert_participants(
+        db,
+        team_id,
+        [
+            {
+                "name": p.name.strip(),
+                "address": clean_address(p.address),
+                "email": (p.email or "").strip(),
+                "telephone": p.telephone or "",
+            }
+            for p in payload.participants
+        ],
+        update=("address", "email", "telephone"),
+    )
+    _queue_venue_refresh(db, _team_venue_ids(db, team_id))
 
     # 3) Créer l'événement
     event = EventORM(
-        team_id=team.id,
+        team_id=team_id,
         title=f"Match à {payload.destination}",
         destination=payload.destination,
+        event_date=payload.event_date,
     )
     db.add(event)
     db.commit()
-    db.refresh(event)
 
     # 4) Calcul des trajets
     input_data = InputData(
         participants=payload.participants,
         destination=payload.destination,
+        aller_retour=payload.aller_retour,
+        event_date=payload.event_date,
     )
-    result = _run_optimisation(input_data)
-
-    trajets = result["trajets"]
-    co2_list = result["co2_par_voiture"]
+    with lane(BATCH):  # appel n8n : passe après les coachs
+        result = await run_in_threadpool(_run_optimisation, input_data)
 
-    # Nettoyer d’éventuels anciens trips/CO2 pour cet event
-    for trip in list(event.trips):
-        db.delete(trip)
-    for co2 in list(event.co2_entries):
-        db.delete(co2)
-    db.flush()
-
-    def find_co2_for_trip(trip_dict: dict) -> float:
-        for c in co2_list:
-            if (
-                c["voiture"] == trip_dict["voiture"]
-                and c["email_conducteur"] == trip_dict["email_conducteur"]
-            ):
-                return c["co2_voiture_kg"]
-        return 0.0
-
-    # Créer nouveaux trips / passagers / CO₂
-    for t in trajets:
-        trip = TripORM(
-            event_id=event.id,
-            voiture=t["voiture"],
-            conducteur=t["conducteur"],
-            email_conducteur=t["email_conducteur"],
-            telephone_conducteur=t["telephone_conducteur"],
-            ordre=t["ordre"],
-            google_maps=t["google_maps"],
-        )
-        db.add(trip)
-        db.flush()
-
-        for p in t["passagers"]:
-            tp = TripPassengerORM(
-                trip_id=trip.id,
-                nom=p["nom"],
-                marche=p.get("marche", False),
-                email=p.get("email", ""),
-                telephone=p.get("telephone", ""),
-            )
-            db.add(tp)
-
-        co2_value = find_co2_for_trip(t)
-        tc = TripCO2ORM(
-            event_id=event.id,
-            voiture=t["voiture"],
-            conducteur=t["conducteur"],
-            email_conducteur=t["email_conducteur"],
-            nb_passagers=len(t["passagers"]),
-            co2_voiture_kg=co2_value,
-        )
-        db.add(tc)
+    trajets = result.trajets
+    co2_list = result.co2_par_voiture
 
+    # Nettoyer d’éventuels anciens trips/CO2 pour cet event, puis enregistrer
+    _attach_venue(db, event, register=True)
+    _save_plan(db, event, result)
     db.commit()
 
     return {
         "event_id": event.id,
-        "team_id": team.id,
+        "team_id": team_id,
         "nb_trips": len(trajets),
-        "co2_economise_kg": result["co2_economise_kg"],
+        "co2_economise_kg": result.co2_economise_kg,
         "trajets": trajets,
         "co2_par_voiture": co2_list,
+        "retour": result.retour,
     }
 
 
 # -------------------------------------------------------------------
 
-def _require_team_owner(team_id: int, current_user: UserORM, db: Session) -> "TeamORM":
-    team = db.query(TeamORM).filter(TeamORM.id == team_id).first()
-    if not team:
-        raise HTTPException(status_code=404, detail="Équipe introuvable")
+def _require_team_owner(team_id: int, current_user: CurrentUser, db: Session) -> "TeamORM":
+    # mémo par requête : la session (get_db) vit le temps d'une requête
+    teams_vues = db.info.setdefault("teams_by_id", {})
+    team = teams_vues.get(team_id)
+    if team is None:
+        team = db.query(TeamORM).filter(TeamORM.id == team_id).first()
+        if not team:
+            raise HTTPException(status_code=404, detail="Équipe introuvable")
+        teams_vues[team_id] = team
     if not current_user.is_admin and team.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Accès interdit à cette équipe")
     return team
@@ -803,7 +1908,7 @@ def _require_team_owner(team_id: int, current_user: UserORM, db: Session) -> "Te
 # 11) Endpoints teams / events / trips
 # -------------------------------------------------------------------
 @app.post("/teams", response_model=TeamOut)
-def create_or_update_team(team: TeamCreate, db: Session = Depends(get_db), current_user: UserORM = Depends(get_current_user)):
+def create_or_update_team(team: TeamCreate, db: DbDep, current_user: UserDep):
     existing = db.query(TeamORM).filter(TeamORM.code == team.code, TeamORM.user_id == current_user.id).first()
     if existing:
         existing.name = team.name
@@ -820,7 +1925,7 @@ def create_or_update_team(team: TeamCreate, db: Session = Depends(get_db), curre
 
 
 @app.get("/teams", response_model=List[TeamOut])
-def list_teams(db: Session = Depends(get_db), current_user: UserORM = Depends(get_current_user)):
+def list_teams(db: DbDep, current_user: UserDep):
     if current_user.is_admin:
         teams = db.query(TeamORM).order_by(TeamORM.created_at.desc()).all()
     else:
@@ -829,7 +1934,7 @@ def list_teams(db: Session = Depends(get_db), current_user: UserORM = Depends(ge
 
 
 @app.get("/teams/{team_id}/participants", response_model=List[ParticipantOut])
-def list_team_participants(team_id: int, db: Session = Depends(get_db), current_user: UserORM = Depends(get_current_user)):
+def list_team_participants(team_id: int, db: DbDep, current_user: UserDep):
     _require_team_owner(team_id, current_user, db)
     participants = (
         db.query(ParticipantORM)
@@ -840,24 +1945,35 @@ def list_team_participants(team_id: int, db: Session = Depends(get_db), current_
     return participants
 
 @app.post("/teams/{team_id}/participants", response_model=ParticipantOut)
-def create_participant(team_id: int, payload: ParticipantCreate, db: Session = Depends(get_db), current_user: UserORM = Depends(get_current_user)):
-    team = _require_team_owner(team_id, current_user, db)
+def create_participant(team_id: int, payload: ParticipantCreate, db: DbDep, current_user: UserDep):
+    _require_team_owner(team_id, current_user, db)
 
     participant = ParticipantORM(
         team_id=team_id,
         name=payload.name.strip(),
-        address=payload.address.strip(),
+        address=clean_address(payload.address),
         postal_code=(payload.postal_code or "").strip() or None,
-        city=(payload.city or "").strip() or None,
+        city=clean_address(payload.city or "") or None,
         email=(payload.email or "").strip() or None,
         telephone=(payload.telephone or "").strip() or None,
     )
     db.add(participant)
-    db.commit()
+    _queue_venue_refresh(db, _team_venue_ids(db, team_id))
+    _commit_participant(db)
     db.refresh(participant)
     return participant
 
 
+def _commit_participant(db: Session) -> None:
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=409, detail="Un joueur de ce nom (et cet email) existe déjà dans l'équipe."
+        ) from e
+
+
 @app.put("/participants/{participant_id}", response_model=ParticipantOut)
 def update_participant(participant_id: int, payload: ParticipantUpdate, db: Session = Depends(get_db)):
     participant = db.query(ParticipantORM).filter(ParticipantORM.id == participant_id).first()
@@ -867,18 +1983,20 @@ def update_participant(participant_id: int, payload: ParticipantUpdate, db: Sess
     if payload.name is not None:
         participant.name = payload.name.strip()
     if payload.address is not None:
-        participant.address = payload.address.strip()
+        participant.address = clean_address(payload.address)
     if payload.postal_code is not None:
         participant.postal_code = payload.postal_code.strip() or None
     if payload.city is not None:
-        participant.city = payload.city.strip() or None
+        participant.city = clean_address(payload.city) or None
     if payload.email is not None:
         participant.email = payload.email.strip() or None
     if payload.telephone is not None:
         participant.telephone = payload.telephone.strip() or None
+    if {"address", "postal_code", "city"} & payload.model_fields_set:
+        _queue_venue_refresh(db, _team_venue_ids(db, participant.team_id))
 
     db.add(participant)
-    db.commit()
+    _commit_participant(db)
     db.refresh(participant)
     return participant
 
@@ -893,6 +2011,287 @@ def delete_participant(participant_id: int, db: Session = Depends(get_db)):
     db.commit()
     return {"ok": True}
 
+
+# -------------------------------------------------------------------
+# Import en masse du roster (CSV / JSON lignes, en flux)
+# -------------------------------------------------------------------
+IMPORT_COLUMNS = {
+    "name": "name", "nom": "name",
+    "address": "address", "adresse": "address",
+    "postal_code": "postal_code", "code_postal": "postal_code", "cp": "postal_code",
+    "city": "city", "ville": "city",
+    "email": "email", "mail": "email",
+    "telephone": "telephone", "tel": "telephone", "portable": "telephone",
+}
+IMPORT_MAX_ERRORS = 100
+
+# imports récents par id (progression), les plus anciens sont oubliés
+_imports: "OrderedDict[str, ImportProgress]" = OrderedDict()
+_imports_lock = threading.Lock()
+_import_pool = ThreadPoolExecutor(max_workers=IMPORT_GEOCODE_WORKERS, thread_name_prefix="import")
+
+
+def _import_column(header: str) -> str | None:
+    return IMPORT_COLUMNS.get(normalize_address(header).replace(" ", "_"))
+
+
+async def _import_records(request: Request):
+    """
+    (n° de ligne, champs bruts) au fil du flux, sans charger le fichier :
+    CSV avec en-tête (séparateur ; ou ,) ou JSON lignes. Un tableau JSON
+    (application/json) est lu d'un bloc.
+    """
+    kind = request.headers.get("content-type", "text/csv").split(";")[0].strip().lower()
+    if kind == "application/json":
+        try:
+            records = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="JSON invalide") from e
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Tableau JSON de participants attendu")
+        for line_no, record in enumerate(records, start=1):
+            yield line_no, record
+        return
+
+    header: list[str | None] | None = None
+    delimiter = ","
+    line_no = 0
+    async for line in _stream_lines(request):
+        line_no += 1
+        if not line.strip():
+            continue
+        if kind in ("application/x-ndjson", "application/jsonl"):
+            try:
+                yield line_no, json.loads(line)
+            except ValueError:
+                yield line_no, None
+            continue
+        if header is None:
+            delimiter = ";" if line.count(";") > line.count(",") else ","
+            header = [_import_column(h) for h in next(csv.reader([line], delimiter=delimiter))]
+            if "name" not in header or "address" not in header:
+                raise HTTPException(
+                    status_code=400, detail="En-tête CSV : colonnes nom et adresse obligatoires"
+                )
+            continue
+        values = next(csv.reader([line], delimiter=delimiter))
+        # ligne courte ou longue : champs manquants signalés à la validation
+        yield line_no, {col: v for col, v in zip(header, values, strict=False) if col}
+
+
+async def _stream_lines(request: Request):
+    """Lignes du corps au fil des paquets reçus (UTF-8, BOM Excel toléré)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    for line in pending.split("\n"):
+        yield line.rstrip("\r")
+
+
+def _import_row(record) -> ParticipantCreate:
+    if not isinstance(record, dict):
+        raise ValueError("ligne illisible")
+    fields = {}
+    for key, value in record.items():
+        column = _import_column(str(key))
+        if column and value not in (None, ""):
+            fields[column] = str(value).strip()
+    participant = ParticipantCreate(**{"name": "", "address": "", **fields})
+    if not participant.name:
+        raise ValueError("nom manquant")
+    if not participant.address:
+        raise ValueError("adresse manquante")
+    return participant
+
+
+def _upsert_participants(db: Session, team_id: int, rows: list[dict],
+                         update: tuple[str, ...]) -> list[dict]:
+    """
+    Synchronise des joueurs en une instruction : INSERT multi-lignes
+    ON CONFLICT sur PARTICIPANT_IDENTITY, qui met à jour les colonnes `update`
+    des joueurs déjà présents. Un doublon dans `rows` : la dernière ligne gagne
+    (un même conflit ne peut être mis à jour deux fois par instruction).
+    Retourne les lignes écrites ; pas de commit ici.
+    """
+    now = datetime.datetime.utcnow()
+    dialect_name = db.get_bind().dialect.name
+    # même repli de casse que l'index, sinon deux lignes « différentes » ici
+    # entrent en conflit dans la même instruction
+    by_identity = {
+        (identity_lower(r["name"], dialect_name),
+         identity_lower(r.get("email") or "", dialect_name)): r
+        for r in rows
+    }
+    values = [
+        {**r, "team_id": team_id, "token": uuid.uuid4().hex[:24], "created_at": now}
+        for r in by_identity.values()
+    ]
+    if not values:
+        return []
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = dialect.insert(ParticipantORM).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(PARTICIPANT_IDENTITY),
+        set_={column: stmt.excluded[column] for column in update},
+    )
+    db.execute(stmt)
+    return values
+
+
+def _insert_import_chunk(db: Session, team_id: int, rows: list[ParticipantCreate]) -> list[str]:
+    """Un INSERT ... ON CONFLICT + un commit par paquet. Retourne les adresses à géocoder."""
+    values = _upsert_participants(
+        db,
+        team_id,
+        [
+            {
+                "name": p.name,
+                "address": clean_address(p.address),
+                "postal_code": p.postal_code or None,
+                "city": clean_address(p.city or "") or None,
+                "email": p.email or None,
+                "telephone": p.telephone or None,
+            }
+            for p in rows
+        ],
+        update=("address", "postal_code", "city", "telephone"),
+    )
+    db.commit()
+    return [format_full_address(ParticipantORM(**v)) for v in values]
+
+
+def _geocode_import(progress: ImportProgress, addresses: list[str]) -> None:
+    """
+    Tâche de fond : géocode les nouvelles adresses (dédoublonnées) en
+    parallèle, voie batch — le seau de la passerelle fixe le débit.
+    """
+    distinct = list(dict.fromkeys(addresses))
+    progress.to_geocode = len(distinct)
+
+    def geocode_batch(address: str) -> None:
+        with lane(BATCH):
+            geocode_address(address)
+
+    futures = [_import_pool.submit(geocode_batch, address) for address in distinct]
+    for future in as_completed(futures):
+        try:
+            future.result()
+            progress.geocoded += 1
+        except Exception:
+            progress.geocode_failed += 1   # adresse corrigée plus tard, l'optimisation la signalera
+    progress.status = "done"
+    progress.finished_at = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        venue_ids = _team_venue_ids(db, progress.team_id)
+    schedule_venue_refresh(venue_ids)
+
+
+@app.post("/teams/{team_id}/participants/import", response_model=ImportProgress, status_code=202)
+async def import_participants(
+    team_id: int,
+    request: Request,
+    background: BackgroundTasks,
+    db: DbDep,
+    current_user: UserDep,
+):
+    """
+    Import d'un roster complet en une requête (CSV ou JSON lignes, en flux).
+    Lignes validées au fil de l'eau, insérées par paquets de IMPORT_CHUNK_ROWS ;
+    les lignes invalides sont comptées et décrites, pas bloquantes.
+    Le géocodage suit en tâche de fond : progression sur GET /imports/{id}.
+    """
+    _require_team_owner(team_id, current_user, db)
+    progress = ImportProgress(
+        id=uuid.uuid4().hex, team_id=team_id, created_at=datetime.datetime.utcnow()
+    )
+    with _imports_lock:
+        _imports[progress.id] = progress
+        while len(_imports) > 200:
+            _imports.popitem(last=False)
+
+    def reject(line_no: int, reason: str) -> None:
+        progress.rejected += 1
+        if len(progress.errors) < IMPORT_MAX_ERRORS:
+            progress.errors.append(f"ligne {line_no} : {reason}")
+
+    chunk: list[ParticipantCreate] = []
+    addresses: list[str] = []
+    async for line_no, record in _import_records(request):
+        progress.rows += 1
+        if progress.inserted + len(chunk) >= IMPORT_MAX_ROWS:
+            reject(line_no, f"au-delà de {IMPORT_MAX_ROWS} lignes")
+            continue
+        try:
+            chunk.append(_import_row(record))
+        except ValidationError as e:
+            reject(line_no, e.errors()[0]["msg"])
+        except ValueError as e:
+            reject(line_no, str(e))
+        if len(chunk) >= IMPORT_CHUNK_ROWS:
+            addresses += await run_in_threadpool(_insert_import_chunk, db, team_id, chunk)
+            progress.inserted += len(chunk)
+            chunk = []
+    if chunk:
+        addresses += await run_in_threadpool(_insert_import_chunk, db, team_id, chunk)
+        progress.inserted += len(chunk)
+
+    progress.status = "geocoding"
+    background.add_task(_geocode_import, progress, addresses)
+    return progress.model_copy()
+
+
+@app.get("/imports/{import_id}", response_model=ImportProgress)
+def import_progress(import_id: str, db: DbDep, current_user: UserDep):
+    with _imports_lock:
+        progress = _imports.get(import_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Import {import_id} introuvable")
+    _require_team_owner(progress.team_id, current_user, db)
+    return progress
+
+
+# -------------------------------------------------------------------
+# Lieux (stades récurrents)
+# -------------------------------------------------------------------
+def _venue_out(venue: VenueORM) -> VenueOut:
+    return VenueOut(
+        id=venue.id,
+        address=venue.address,
+        lng=venue.lng,
+        lat=venue.lat,
+        aliases=[a.alias_key for a in venue.aliases],
+        troncons=len(venue.legs),
+        refreshed_at=venue.refreshed_at,
+    )
+
+
+@app.get("/venues", response_model=list[VenueOut])
+def list_venues(db: DbDep, _: UserDep):
+    return [_venue_out(v) for v in db.query(VenueORM).order_by(VenueORM.address.asc()).all()]
+
+
+@app.post("/venues", response_model=VenueOut)
+def create_venue(payload: VenueCreate, db: DbDep, _: UserDep):
+    """Déclare un lieu (ou lui ajoute des alias) ; tronçons entrants calculés en tâche de fond."""
+    venue = register_venue(db, payload.address, payload.aliases)
+    _queue_venue_refresh(db, [venue.id])
+    db.commit()
+    db.refresh(venue)
+    return _venue_out(venue)
+
+
+@app.post("/venues/{venue_id}/refresh")
+def refresh_venue_legs(venue_id: int, db: DbDep, _: UserDep):
+    if db.get(VenueORM, venue_id) is None:
+        raise HTTPException(status_code=404, detail=f"Lieu {venue_id} introuvable")
+    return {"scheduled": bool(schedule_venue_refresh([venue_id]))}
+
+
 @app.post("/events", response_model=EventOut)
 def create_event(payload: EventCreate, db: Session = Depends(get_db)):
     team = db.query(TeamORM).filter(TeamORM.code == payload.team_code).first()
@@ -906,6 +2305,7 @@ def create_event(payload: EventCreate, db: Session = Depends(get_db)):
         event_date=payload.event_date,
     )
     db.add(event)
+    _attach_venue(db, event)   # lieu déjà connu seulement : pas de géocodage ici
     db.commit()
     db.refresh(event)
 
@@ -920,7 +2320,7 @@ def create_event(payload: EventCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/events", response_model=List[EventOut])
-def list_events(db: Session = Depends(get_db), current_user: UserORM = Depends(get_current_user)):
+def list_events(db: DbDep, current_user: UserDep):
     """
     Liste tous les événements avec leur team_code, via une requête SQL brute.
     """
@@ -952,33 +2352,10 @@ def list_events(db: Session = Depends(get_db), current_user: UserORM = Depends(g
         )
         for r in rows
     ]
-def format_full_address(p: ParticipantORM) -> str:
-    """
-    Construit une adresse complète à partir des champs
-    address + postal_code + city, en ajoutant 'France'.
-    (équivalent de ce que tu faisais dans n8n.)
-    """
-    parts: list[str] = []
 
-    if p.address:
-        parts.append(p.address.strip())
-
-    cp_ville = " ".join(
-        x.strip()
-        for x in [p.postal_code or "", p.city or ""]
-        if x and x.strip()
-    )
-    if cp_ville:
-        parts.append(cp_ville)
-
-    # tu peux adapter si un jour tu as des clubs hors France
-    parts.append("France")
-
-    # On joint avec des virgules pour un format très classique
-    return ", ".join(parts)
 
 @app.get("/teams/{team_id}/events", response_model=List[EventOut])
-def list_team_events(team_id: int, db: Session = Depends(get_db), current_user: UserORM = Depends(get_current_user)):
+def list_team_events(team_id: int, db: DbDep, current_user: UserDep):
     _require_team_owner(team_id, current_user, db)
     """
     Liste uniquement les événements d'une équipe donnée.
@@ -1003,6 +2380,46 @@ def list_team_events(team_id: int, db: Session = Depends(get_db), current_user:
     ]
 
 
+def _co2_saison(row) -> Co2Saison:
+    return Co2Saison(
+        saison=row.saison,
+        libelle=f"{row.saison}-{row.saison + 1}",
+        nb_evenements=row.nb_evenements,
+        nb_voitures=row.nb_voitures,
+        nb_passagers=row.nb_passagers,
+        co2_kg=round(row.co2_kg, 2),
+    )
+
+
+@app.get("/co2/seasons", response_model=Co2SaisonsOut)
+def co2_seasons(db: DbDep, current_user: UserDep, saison: int | None = None):
+    """
+    Totaux CO₂ par saison du compte connecté (club) et de chacune de ses
+    équipes, lus dans les agrégats tenus par _save_plan : quelques lignes par
+    équipe, quelle que soit la taille de l'historique. ?saison=2025 pour une seule.
+    """
+    club_q = select(ClubCo2SeasonORM).where(ClubCo2SeasonORM.user_id == current_user.id)
+    teams_q = (
+        select(TeamCo2SeasonORM, TeamORM.name)
+        .join(TeamORM, TeamORM.id == TeamCo2SeasonORM.team_id)
+        .where(TeamORM.user_id == current_user.id)
+    )
+    if saison is not None:
+        club_q = club_q.where(ClubCo2SeasonORM.saison == saison)
+        teams_q = teams_q.where(TeamCo2SeasonORM.saison == saison)
+
+    equipes: dict = {}
+    for row, name in db.execute(teams_q.order_by(TeamORM.name, TeamCo2SeasonORM.saison.desc())):
+        equipe = equipes.setdefault(
+            row.team_id, Co2EquipeOut(team_id=row.team_id, name=name, saisons=[])
+        )
+        equipe.saisons.append(_co2_saison(row))
+    return Co2SaisonsOut(
+        club=[_co2_saison(r) for r in db.scalars(club_q.order_by(ClubCo2SeasonORM.saison.desc()))],
+        equipes=list(equipes.values()),
+    )
+
+
 @app.get("/events/{event_id}", response_model=EventOut)
 def get_event(event_id: int, db: Session = Depends(get_db)):
     """
@@ -1042,8 +2459,8 @@ def get_event(event_id: int, db: Session = Depends(get_db)):
 async def optimize_carpool(
     team_id: int,
     payload: CarpoolRequest,
-    db: Session = Depends(get_db),
-    current_user: UserORM = Depends(get_current_user),
+    db: DbDep,
+    current_user: UserDep,
 ):
     """
     Calcule les trajets de covoiturage pour une équipe donnée, à partir :
@@ -1071,97 +2488,207 @@ async def optimize_carpool(
         .all()
     )
 
+    # 2) Construire les données pour l’algo
+    input_data = _carpool_input(payload, participants_rows)
+
+    # 3) Appeler l’algo d’optimisation
+    result = await run_in_threadpool(_run_optimisation, input_data)
+
+    # 4) Créer un événement en BDD
+    event = _new_carpool_event(db, team_id, payload)
+
+    # 5) Enregistrer trips + passagers + CO2
+    _save_plan(db, event, result)
+    db.commit()
+
+    # 6) On renvoie toujours le même format que avant
+    return result
+
+
+@app.post("/teams/{team_id}/carpool/optimize/stream")
+async def optimize_carpool_stream(
+    team_id: int,
+    payload: CarpoolRequest,
+    request: Request,
+    db: DbDep,
+    current_user: UserDep,
+):
+    """
+    Même calcul que /teams/{team_id}/carpool/optimize, en NDJSON au fil de l'eau :
+    - {"type": "progression", ...} : géocodage n/N, durées directes, matrice,
+    - {"type": "voiture", ...} : chaque voiture dès que le glouton la fixe,
+    - {"type": "resultat", "event_id", ...OptimiserResult} : bilan CO₂, plan enregistré,
+    - {"type": "erreur", "status", "detail"} : échec après le début du flux.
+    Fermer la connexion arrête le calcul (rien n'est enregistré).
+    """
+    _require_team_owner(team_id, current_user, db)
+    if not payload.participant_ids:
+        raise HTTPException(status_code=400, detail="Aucun participant sélectionné.")
+    participants_rows = (
+        db.query(ParticipantORM)
+        .filter(ParticipantORM.team_id == team_id)
+        .filter(ParticipantORM.id.in_(payload.participant_ids))
+        .order_by(ParticipantORM.name.asc())
+        .all()
+    )
+    input_data = _carpool_input(payload, participants_rows)
+
+    def produce(emit: Callable[[dict], None], cancelled: threading.Event) -> None:
+        result = _run_optimisation_streaming(input_data, emit, cancelled)
+        if cancelled.is_set():
+            raise OptimisationCancelled()
+        # la session de la requête est fermée une fois la réponse partie : la nôtre
+        with SessionLocal() as stream_db:
+            event = _new_carpool_event(stream_db, team_id, payload)
+            _save_plan(stream_db, event, result)
+            stream_db.commit()
+            emit({"type": "resultat", "event_id": event.id, **result.model_dump()})
+
+    return StreamingResponse(_ndjson_stream(request, produce), media_type="application/x-ndjson")
+
+
+async def _ndjson_stream(request: Request,
+                         produce: Callable[[Callable[[dict], None], threading.Event], None]):
+    """
+    Lance produce(emit, cancelled) dans le pool de threads et relaie chaque
+    emit() en une ligne NDJSON. Client parti : cancelled est levé, produce
+    s'arrête à sa prochaine vérification.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    done = object()
+
+    def emit(item: dict) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def run() -> None:
+        try:
+            produce(emit, cancelled)
+        except OptimisationCancelled:
+            pass
+        except HTTPException as e:
+            emit({"type": "erreur", "status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            detail = f"Erreur d'optimisation : {e.__class__.__name__}"
+            emit({"type": "erreur", "status": 500, "detail": detail})
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    worker = asyncio.ensure_future(run_in_threadpool(run))
+    try:
+        while (item := await queue.get()) is not done:
+            yield (json.dumps(item, ensure_ascii=False, default=str) + "\n").encode()
+            if await request.is_disconnected():
+                break
+        else:
+            await worker   # `done` reçu : le thread producteur a fini, on le récupère
+    finally:
+        cancelled.set()
+
+
+@app.post("/carpool/optimize_batch", response_model=list[CarpoolBatchItem])
+def optimize_carpool_batch(
+    payload: CarpoolBatchRequest,
+    db: DbDep,
+    current_user: UserDep,
+):
+    """
+    Tous les matchs d'un week-end en un appel (run n8n du vendredi soir) :
+    - géocodage et tronçons mutualisés entre équipes (mêmes stades, mêmes joueurs),
+    - résolutions en parallèle (pool de processus),
+    - un événement + son plan par job, chacun dans sa propre transaction.
+    Un job en erreur (équipe interdite, adresse introuvable...) n'arrête pas les autres.
+    """
+    if not payload.jobs:
+        raise HTTPException(status_code=400, detail="Aucun job à optimiser.")
+    if len(payload.jobs) > BATCH_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"{BATCH_MAX_JOBS} jobs maximum par appel.")
+
+    # participants de tous les jobs en une requête
+    all_ids = {pid for job in payload.jobs for pid in job.participant_ids}
+    rows = (
+        db.query(ParticipantORM)
+        .filter(ParticipantORM.id.in_(all_ids))
+        .order_by(ParticipantORM.name.asc())
+        .all()
+    ) if all_ids else []
+
+    items: list[CarpoolBatchItem | None] = [None] * len(payload.jobs)
+    positions: list[int] = []
+    inputs: list[InputData] = []
+    for idx, job in enumerate(payload.jobs):
+        try:
+            _require_team_owner(job.team_id, current_user, db)
+            wanted = set(job.participant_ids)
+            selected = [r for r in rows if r.team_id == job.team_id and r.id in wanted]
+            inputs.append(_carpool_input(job, selected))
+            positions.append(idx)
+        except HTTPException as e:
+            items[idx] = CarpoolBatchItem(team_id=job.team_id, error=str(e.detail))
+
+    with lane(BATCH):  # les coachs passent devant
+        results = _run_optimisations(inputs) if inputs else []
+
+    # un événement = une transaction
+    for idx, result in zip(positions, results, strict=True):
+        job = payload.jobs[idx]
+        if isinstance(result, HTTPException):
+            items[idx] = CarpoolBatchItem(team_id=job.team_id, error=str(result.detail))
+            continue
+        try:
+            event = _new_carpool_event(db, job.team_id, job)
+            _save_plan(db, event, result)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            error = f"Erreur d'enregistrement : {e.__class__.__name__}"
+            items[idx] = CarpoolBatchItem(team_id=job.team_id, error=error)
+            continue
+        items[idx] = CarpoolBatchItem(team_id=job.team_id, event_id=event.id, result=result)
+
+    return items
+
+
+def _carpool_input(payload: CarpoolRequest, participants_rows: list[ParticipantORM]) -> InputData:
+    """Participants sélectionnés (déjà chargés) → entrée de l'algo."""
+    if not payload.event_address.strip():
+        raise HTTPException(status_code=400, detail="Adresse de l’événement obligatoire.")
+
     if not participants_rows:
         raise HTTPException(
             status_code=404,
             detail="Aucun participant trouvé pour cette équipe / ces IDs.",
         )
 
-    # 2) Construire les données pour l’algo
-    participants_input: List[Participant] = []
-    for row in participants_rows:
-        participants_input.append(
+    return InputData(
+        participants=[
             Participant(
                 name=row.name,
                 address=format_full_address(row),
                 email=row.email or "",
                 telephone=row.telephone or "",
             )
-        )
-
-    input_data = InputData(
-        participants=participants_input,
+            for row in participants_rows
+        ],
         destination=payload.event_address.strip(),
+        aller_retour=payload.aller_retour,
+        event_date=payload.event_date,
     )
 
-    # 3) Appeler l’algo d’optimisation
-    result_dict = _run_optimisation(input_data)
 
-    # 4) Créer un événement en BDD
+def _new_carpool_event(db: Session, team_id: int, payload: CarpoolRequest) -> "EventORM":
     title = (payload.event_title or f"Covoiturage vers {payload.event_address.strip()}").strip()
-
     event = EventORM(
         team_id=team_id,
         title=title,
         destination=payload.event_address.strip(),
-        event_date=None,  # on gèrera la date plus tard
+        event_date=payload.event_date,
     )
     db.add(event)
+    _attach_venue(db, event, register=True)   # destination géocodée par l'optimisation
     db.flush()  # pour avoir event.id
-
-    trajets = result_dict["trajets"]
-    co2_list = result_dict["co2_par_voiture"]
-
-    def find_co2_for_trip(trip_dict: dict) -> float:
-        for c in co2_list:
-            if (
-                c["voiture"] == trip_dict["voiture"]
-                and c["email_conducteur"] == trip_dict["email_conducteur"]
-            ):
-                return c["co2_voiture_kg"]
-        return 0.0
-
-    # 5) Enregistrer trips + passagers + CO2
-    for t in trajets:
-        trip = TripORM(
-            event_id=event.id,
-            voiture=t["voiture"],
-            conducteur=t["conducteur"],
-            email_conducteur=t["email_conducteur"],
-            telephone_conducteur=t["telephone_conducteur"],
-            ordre=t["ordre"],
-            google_maps=t["google_maps"],
-        )
-        db.add(trip)
-        db.flush()
-
-        # Passagers
-        for p in t["passagers"]:
-            passenger = TripPassengerORM(
-                trip_id=trip.id,
-                nom=p["nom"],
-                marche=p.get("marche", False),
-                email=p.get("email", ""),
-                telephone=p.get("telephone", ""),
-            )
-            db.add(passenger)
-
-        # CO₂ pour ce trajet
-        co2_value = find_co2_for_trip(t)
-        co2_row = TripCO2ORM(
-            event_id=event.id,
-            voiture=t["voiture"],
-            conducteur=t["conducteur"],
-            email_conducteur=t["email_conducteur"],
-            nb_passagers=len(t["passagers"]),
-            co2_voiture_kg=co2_value,
-        )
-        db.add(co2_row)
-
-    db.commit()
-
-    # 6) On renvoie toujours le même format que avant
-    return OptimiserResult(**result_dict)
+    return event
 
 @app.post("/events/{event_id}/recompute", response_model=OptimiserResult)
 async def recompute_event(event_id: int, data: InputData, db: Session = Depends(get_db)):
@@ -1170,69 +2697,58 @@ async def recompute_event(event_id: int, data: InputData, db: Session = Depends(
         raise HTTPException(status_code=404, detail=f"Événement {event_id} introuvable")
 
     if not data.destination.strip():
-        data = InputData(participants=data.participants, destination=event.destination)
+        data = data.model_copy(update={"destination": event.destination})
     else:
         if data.destination != event.destination:
             event.destination = data.destination
             db.add(event)
             db.flush()
+    if data.event_date is None:
+        data = data.model_copy(update={"event_date": event.event_date})
 
-    result_dict = _run_optimisation(data)
-
-    for trip in list(event.trips):
-        db.delete(trip)
-    for co2 in list(event.co2_entries):
-        db.delete(co2)
-    db.flush()
-
-    trajets = result_dict["trajets"]
-    for t in trajets:
-        trip = TripORM(
-            event=event,
-            voiture=t["voiture"],
-            conducteur=t["conducteur"],
-            email_conducteur=t["email_conducteur"],
-            telephone_conducteur=t["telephone_conducteur"],
-            ordre=t["ordre"],
-            google_maps=t["google_maps"],
-        )
-        db.add(trip)
-        db.flush()
-
-        for p in t["passagers"]:
-            passenger = TripPassengerORM(
-                trip=trip,
-                nom=p["nom"],
-                marche=p.get("marche", False),
-                email=p.get("email", ""),
-                telephone=p.get("telephone", ""),
-            )
-            db.add(passenger)
-
-    for v in result_dict["co2_par_voiture"]:
-        co2_row = TripCO2ORM(
-            event=event,
-            voiture=v["voiture"],
-            conducteur=v["conducteur"],
-            email_conducteur=v["email_conducteur"],
-            nb_passagers=v["nb_passagers"],
-            co2_voiture_kg=v["co2_voiture_kg"],
-        )
-        db.add(co2_row)
+    result = await run_in_threadpool(_run_optimisation, data)
 
+    _attach_venue(db, event, register=True)
+    _save_plan(db, event, result)
     db.commit()
 
-    return OptimiserResult(**result_dict)
+    return result
 
 
 @app.get("/events/{event_id}/trips", response_model=OptimiserResult)
-def get_event_trips(event_id: int, db: Session = Depends(get_db), _: UserORM = Depends(get_current_user)):
-    event = db.query(EventORM).filter(EventORM.id == event_id).first()
-    if not event:
+def get_event_trips(event_id: int, request: Request, db: DbDep, _: UserDep):
+    """Snapshot du dernier plan (une ligne, octets prêts), ETag par révision."""
+    row = db.execute(
+        select(EventORM.plan_snapshot_bytes, EventORM.plan_format, EventORM.plan_revision)
+        .where(EventORM.id == event_id)
+    ).first()
+    if row is None:
         raise HTTPException(status_code=404, detail=f"Événement {event_id} introuvable")
 
+    if row.plan_format == PLAN_SNAPSHOT_FORMAT and row.plan_snapshot_bytes is not None:
+        etag = f'"plan-{event_id}-{row.plan_revision}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(
+            content=row.plan_snapshot_bytes, media_type="application/json", headers={"ETag": etag}
+        )
+
+    # plan enregistré avant les snapshots : reconstruit depuis trips / trip_co2
+    return _stored_result(db.get(EventORM, event_id))
+
+
+def _stored_result(event: "EventORM") -> OptimiserResult:
+    result = _stored_plan(event, "aller")
+    if any(trip.sens == "retour" for trip in event.trips):
+        result.retour = _stored_plan(event, "retour")
+    return result
+
+
+def _stored_plan(event: "EventORM", sens: str) -> OptimiserResult:
     trajets: List[TrajetOut] = []
     for trip in event.trips:
+        if trip.sens != sens:
+            continue
         passengers = [
             TrajetPassager(
                 nom=p.nom,
@@ -1263,6 +2779,7 @@ def get_event_trips(event_id: int, db: Session = Depends(get_db), _: UserORM = D
             co2_voiture_kg=row.co2_voiture_kg,
         )
         for row in event.co2_entries
+        if row.sens == sens
     ]
 
     co2_total_kg = round(sum(r.co2_voiture_kg for r in co2_par_voiture), 2)
@@ -1381,28 +2898,64 @@ PDF_TEMPLATE = Template(r"""
 """)
 
 
-@app.post("/export_pdf")
-async def export_pdf(data: InputData, club_name: str = "Sport Cov", logo_url: str = ""):
-    logo = (logo_url or LOGO_URL_DEFAULT).strip()
-    result = _run_optimisation(data)
+def _render_pdf(
+    result: OptimiserResult, club_name: str, logo_url: str, team_name, destination: str
+) -> FileResponse:
     html_str = PDF_TEMPLATE.render(
         now=datetime.datetime.now().strftime("%d/%m/%Y %H:%M"),
         club_name=club_name,
-        team_name=None,
-        destination=data.destination,
-        logo_url=logo,
-        trajets=result["trajets"],
-        co2_par_voiture=result["co2_par_voiture"],
-        co2_total=result["co2_economise_kg"],
-        co2_facteur=result["co2_facteur_kg_km"],
-        max_passagers=result["max_passagers"],
-        seuil_rallonge=result["seuil_rallonge"],
+        team_name=team_name,
+        destination=destination,
+        logo_url=(logo_url or LOGO_URL_DEFAULT).strip(),
+        trajets=[t.model_dump() for t in result.trajets],
+        co2_par_voiture=[v.model_dump() for v in result.co2_par_voiture],
+        co2_total=result.co2_economise_kg,
+        co2_facteur=result.co2_facteur_kg_km,
+        max_passagers=result.max_passagers,
+        seuil_rallonge=result.seuil_rallonge,
     )
+    HTML, CSS = load_pdf_stack()
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
     HTML(string=html_str).write_pdf(tmp.name, stylesheets=[CSS(string=PDF_CSS)])
     return FileResponse(tmp.name, media_type="application/pdf", filename="Mon_equipe_covoiturage.pdf")
 
 
+def _pdf_plan(db: Session, data: InputData | None, event_id: int | None,
+              current_user: CurrentUser) -> tuple[OptimiserResult, str]:
+    """
+    Plan à imprimer et sa destination. event_id (équipe du coach connecté) :
+    snapshot s'il existe, sinon `data` ré-optimisé, sinon plan des tables.
+    Sans event_id : optimisation de `data` (appels Google).
+    """
+    if event_id is not None:
+        row = db.execute(
+            select(
+                EventORM.team_id, EventORM.destination,
+                EventORM.plan_snapshot_bytes, EventORM.plan_format,
+            )
+            .where(EventORM.id == event_id)
+        ).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"Événement {event_id} introuvable")
+        _require_team_owner(row.team_id, current_user, db)
+        if row.plan_format == PLAN_SNAPSHOT_FORMAT and row.plan_snapshot_bytes is not None:
+            return OptimiserResult.model_validate_json(row.plan_snapshot_bytes), row.destination
+        if data is None:
+            return _stored_result(db.get(EventORM, event_id)), row.destination
+    if data is None:
+        raise HTTPException(status_code=422, detail="Participants requis sans event_id")
+    return _run_optimisation(data), data.destination
+
+
+@app.post("/export_pdf")
+async def export_pdf(db: DbDep, current_user: UserDep, data: InputData | None = None,
+                     club_name: str = "Sport Cov", logo_url: str = "",
+                     event_id: int | None = None):
+    """?event_id= : PDF du plan enregistré (snapshot), sans corps ni appel Google."""
+    result, destination = await run_in_threadpool(_pdf_plan, db, data, event_id, current_user)
+    return _render_pdf(result, club_name, logo_url, None, destination)
+
+
 @app.post("/export_pdf_from_result")
 async def export_pdf_from_result(
     result: OptimiserResult,
@@ -1411,22 +2964,7 @@ async def export_pdf_from_result(
     team_name: str = "",
     destination: str = "",
 ):
-    html_str = PDF_TEMPLATE.render(
-        now=datetime.datetime.now().strftime("%d/%m/%Y %H:%M"),
-        club_name=club_name,
-        team_name=team_name,
-        destination=destination,
-        logo_url=(logo_url or LOGO_URL_DEFAULT),
-        trajets=[t.dict() for t in result.trajets],
-        co2_par_voiture=[v.dict() for v in result.co2_par_voiture],
-        co2_total=result.co2_economise_kg,
-        co2_facteur=result.co2_facteur_kg_km,
-        max_passagers=result.max_passagers,
-        seuil_rallonge=result.seuil_rallonge,
-    )
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    HTML(string=html_str).write_pdf(tmp.name, stylesheets=[CSS(string=PDF_CSS)])
-    return FileResponse(tmp.name, media_type="application/pdf", filename="Mon_equipe_covoiturage.pdf")
+    return _render_pdf(result, club_name, logo_url, team_name, destination)
 
 
 @app.get("/_version")
@@ -1443,10 +2981,6 @@ app.include_router(auth_router)
 
 # ── WebSockets : localisation temps réel + chat par voiture ──────
 
-from fastapi import WebSocket, WebSocketDisconnect
-import asyncio, json
-from collections import defaultdict
-
 # { "eventId_voiture" -> {"driver": ws|None, "passengers": [ws,...], "location": dict|None} }
 _loc_rooms: dict = defaultdict(lambda: {"driver": None, "passengers": [], "location": None})
 
@@ -1456,6 +2990,19 @@ _chat_rooms: dict = defaultdict(list)
 # { "eventId_voiture" -> [ws, ...] }
 _chat_connections: dict = defaultdict(list)
 
+metrics.WS_ROOMS.labels("location").set_function(
+    lambda: sum(1 for r in list(_loc_rooms.values()) if r["driver"] or r["passengers"])
+)
+metrics.WS_CONNECTIONS.labels("location").set_function(
+    lambda: sum((r["driver"] is not None) + len(r["passengers"]) for r in list(_loc_rooms.values()))
+)
+metrics.WS_ROOMS.labels("chat").set_function(
+    lambda: sum(1 for c in list(_chat_connections.values()) if c)
+)
+metrics.WS_CONNECTIONS.labels("chat").set_function(
+    lambda: sum(len(c) for c in list(_chat_connections.values()))
+)
+
 
 @app.websocket("/ws/location/{event_id}/{voiture}")
 async def ws_location(ws: WebSocket, event_id: int, voiture: str, role: str = "passenger"):
@@ -1528,25 +3075,59 @@ def get_player_trip(event_id: int, token: str, db: Session = Depends(get_db)):
     if not participant:
         raise HTTPException(status_code=404, detail="Lien invalide")
 
-    event = db.query(EventORM).filter(EventORM.id == event_id).first()
+    event = db.execute(
+        select(EventORM.team_id, EventORM.plan_snapshot, EventORM.plan_format)
+        .where(EventORM.id == event_id)
+    ).first()
     if not event or event.team_id != participant.team_id:
         raise HTTPException(status_code=404, detail="Événement introuvable pour ce participant")
 
-    trips = db.query(TripORM).filter(TripORM.event_id == event_id).all()
     nom_lower = participant.name.strip().lower()
-
-    for trip in trips:
-        if trip.conducteur.strip().lower() == nom_lower:
-            result = _trip_to_dict(trip, role="driver")
-            result["player_name"] = participant.name
-            return result
-        for p in trip.passengers:
-            if p.nom.strip().lower() == nom_lower:
-                result = _trip_to_dict(trip, role="passenger")
-                result["player_name"] = participant.name
-                return result
-
-    raise HTTPException(status_code=404, detail="Participant non trouvé dans cet événement")
+    found = {}
+    if event.plan_format == PLAN_SNAPSHOT_FORMAT and event.plan_snapshot is not None:
+        plans = [("aller", event.plan_snapshot), ("retour", event.plan_snapshot.get("retour"))]
+        for sens, plan in plans:
+            for trajet in (plan or {}).get("trajets", []):
+                if trajet["conducteur"].strip().lower() == nom_lower:
+                    found[sens] = _trajet_to_dict(trajet, role="driver")
+                elif any(p["nom"].strip().lower() == nom_lower for p in trajet["passagers"]):
+                    found[sens] = _trajet_to_dict(trajet, role="passenger")
+                else:
+                    continue
+                break
+    else:
+        # plan enregistré avant les snapshots
+        for trip in db.query(TripORM).filter(TripORM.event_id == event_id).all():
+            if trip.sens in found:
+                continue
+            if trip.conducteur.strip().lower() == nom_lower:
+                found[trip.sens] = _trip_to_dict(trip, role="driver")
+            elif any(p.nom.strip().lower() == nom_lower for p in trip.passengers):
+                found[trip.sens] = _trip_to_dict(trip, role="passenger")
+
+    if "aller" not in found:
+        raise HTTPException(status_code=404, detail="Participant non trouvé dans cet événement")
+    result = found["aller"]
+    result["player_name"] = participant.name
+    if "retour" in found:
+        result["retour"] = found["retour"]
+    return result
+
+
+def _trajet_to_dict(trajet: dict, role: str) -> dict:
+    """Même forme que _trip_to_dict, depuis un trajet du snapshot."""
+    return {
+        "voiture": trajet["voiture"],
+        "role": role,
+        "conducteur": trajet["conducteur"],
+        "telephone_conducteur": trajet["telephone_conducteur"],
+        "passagers": [
+            {"nom": p["nom"], "telephone": p["telephone"], "marche": p["marche"]}
+            for p in trajet["passagers"]
+        ],
+        "google_maps": trajet["google_maps"],
+        "ordre": trajet["ordre"],
+    }
 
 
 def _trip_to_dict(trip: "TripORM", role: str) -> dict:
@@ -0,0 +1,228 @@
+# metrics.py
+"""
+Métriques Prometheus de l'API (exposées sur /metrics) :
+- appels fournisseur (Google) par endpoint / statut, succès des caches,
+  état du disjoncteur et replis pendant une panne,
+- durée de chaque phase de l'optimisation,
+- nombre de requêtes SQL et latence par route HTTP,
+- salles WebSocket actives, files des pools bcrypt et solveur,
+- recalculs du catalogue des lieux.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import tracing
+
+PROVIDER_CALLS = Counter(
+    "sportcov_provider_calls_total",
+    "Appels HTTP réels vers le fournisseur de routage (hors cache)",
+    ["endpoint", "status"],
+)
+PROVIDER_COALESCED = Counter(
+    "sportcov_provider_coalesced_total",
+    "Requêtes fournisseur servies par un appel identique déjà en vol",
+    ["endpoint"],
+)
+PROVIDER_THROTTLE_SECONDS = Histogram(
+    "sportcov_provider_throttle_seconds",
+    "Attente d'un jeton du seau fournisseur, par voie",
+    ["lane"],
+    buckets=(0, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 20),
+)
+PROVIDER_BREAKER_OPEN = Gauge(
+    "sportcov_provider_breaker_open", "1 si le disjoncteur fournisseur est ouvert"
+)
+PROVIDER_FALLBACKS = Counter(
+    "sportcov_provider_fallbacks_total",
+    "Réponses de repli pendant une panne fournisseur "
+    "(stale = dernière valeur connue, estimate = vol d'oiseau)",
+    ["endpoint", "kind"],
+)
+PROVIDER_TOKENS = Gauge("sportcov_provider_tokens", "Jetons disponibles dans le seau fournisseur")
+PROVIDER_LATENCY = Histogram(
+    "sportcov_provider_request_seconds",
+    "Latence des appels fournisseur, retries compris",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+PHASE_SECONDS = Histogram(
+    "sportcov_optimiser_phase_seconds",
+    "Durée cumulée de chaque phase d'une optimisation",
+    ["phase"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+HTTP_SECONDS = Histogram(
+    "sportcov_http_request_seconds",
+    "Latence des requêtes HTTP par route",
+    ["method", "route", "status"],
+)
+DB_QUERIES = Histogram(
+    "sportcov_db_queries_per_request",
+    "Requêtes SQL exécutées par requête HTTP",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+WS_ROOMS = Gauge("sportcov_ws_rooms", "Salles WebSocket avec au moins une connexion", ["kind"])
+WS_CONNECTIONS = Gauge("sportcov_ws_connections", "Connexions WebSocket ouvertes", ["kind"])
+HASH_POOL_PENDING = Gauge("sportcov_hash_pool_pending", "Hachages bcrypt en file ou en cours")
+SOLVER_PENDING = Gauge(
+    "sportcov_solver_pending", "Résolutions confiées au pool de processus (file + en cours)"
+)
+SOLVER_QUEUE_DEPTH = Gauge(
+    "sportcov_solver_queue_depth", "Résolutions en attente d'un worker du solveur"
+)
+VENUE_REFRESHES = Counter(
+    "sportcov_venue_refreshes_total",
+    "Recalculs en tâche de fond des tronçons entrants d'un lieu",
+    ["outcome"],
+)
+
+# compteur SQL de la requête HTTP en cours (liste partagée avec le threadpool)
+_db_queries: ContextVar[list | None] = ContextVar("sportcov_db_queries", default=None)
+
+
+# -------------------------------------------------------------------
+# Fournisseur
+# -------------------------------------------------------------------
+class _ProviderCall:
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = "error"
+
+
+@contextmanager
+def provider_call(endpoint: str):
+    """
+    Enveloppe un appel HTTP réel ; l'appelant renseigne `call.status`
+    (statut Google : OK, ZERO_RESULTS, OVER_QUERY_LIMIT...).
+    """
+    call = _ProviderCall()
+    start = time.perf_counter()
+    with tracing.span(f"provider.{endpoint}") as current:
+        try:
+            yield call
+        except requests.exceptions.Timeout:
+            call.status = "timeout"
+            raise
+        finally:
+            current.set_attribute("provider.status", call.status)
+            PROVIDER_LATENCY.labels(endpoint).observe(time.perf_counter() - start)
+            PROVIDER_CALLS.labels(endpoint, call.status).inc()
+
+
+class _CacheCollector:
+    """Lit `cache_info()` au moment du scrape : aucun coût dans la boucle du solveur."""
+
+    def __init__(self):
+        self._caches: dict = {}
+
+    def register(self, endpoint: str, cached_fn) -> None:
+        self._caches[endpoint] = cached_fn
+
+    def collect(self):
+        lookups = CounterMetricFamily(
+            "sportcov_provider_cache_lookups",
+            "Consultations des caches fournisseur",
+            labels=["endpoint", "result"],
+        )
+        size = GaugeMetricFamily(
+            "sportcov_provider_cache_entries", "Entrées en cache", labels=["endpoint"]
+        )
+        for endpoint, fn in self._caches.items():
+            info = fn.cache_info()
+            lookups.add_metric([endpoint, "hit"], info.hits)
+            lookups.add_metric([endpoint, "miss"], info.misses)
+            size.add_metric([endpoint], info.currsize)
+        yield lookups
+        yield size
+
+
+_cache_collector = _CacheCollector()
+REGISTRY.register(_cache_collector)
+
+
+def register_cache(endpoint: str, cached_fn) -> None:
+    _cache_collector.register(endpoint, cached_fn)
+
+
+# -------------------------------------------------------------------
+# Phases de l'optimisation
+# -------------------------------------------------------------------
+class PhaseTimer:
+    """
+    Cumule le temps par phase (les phases compatibilité / sous-ensembles
+    alternent voiture après voiture) puis publie une observation par phase.
+    Chaque passage ouvre aussi un span `optimiser.<phase>`.
+    """
+
+    def __init__(self):
+        self.totals: dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, phase: str, **attributes):
+        start = time.perf_counter()
+        with tracing.span(f"optimiser.{phase}", **attributes) as current:
+            try:
+                yield current
+            finally:
+                self.totals[phase] = self.totals.get(phase, 0.0) + time.perf_counter() - start
+
+    def observe(self) -> None:
+        for phase, seconds in self.totals.items():
+            PHASE_SECONDS.labels(phase).observe(seconds)
+
+
+@contextmanager
+def phase(name: str):
+    """Phase ponctuelle (ex. persistance) : une observation directe + un span."""
+    start = time.perf_counter()
+    with tracing.span(name) as current:
+        try:
+            yield current
+        finally:
+            PHASE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+# -------------------------------------------------------------------
+# HTTP + SQL
+# -------------------------------------------------------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _db_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def install(app) -> None:
+    """Middleware : latence et nombre de requêtes SQL par route."""
+    from fastapi import Request
+
+    @app.middleware("http")
+    async def _measure(request: Request, call_next):
+        counter = [0]
+        token = _db_queries.set(counter)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            _db_queries.reset(token)
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            elapsed = time.perf_counter() - start
+            HTTP_SECONDS.labels(request.method, path, str(status)).observe(elapsed)
+            DB_QUERIES.labels(path).observe(counter[0])
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
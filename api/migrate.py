@@ -0,0 +1,45 @@
+# migrate.py
+"""
+Étape de migration explicite, à lancer avant l'API :
+
+    python migrate.py            # = alembic upgrade head
+
+Les bases créées avant Alembic (create_all au démarrage) sont
+rattachées à la révision baseline puis migrées normalement.
+"""
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+ALEMBIC_INI = Path(__file__).resolve().parent / "alembic.ini"
+BASELINE = "0001_baseline"
+
+
+def _patch_users_columns(conn) -> None:
+    # colonnes ajoutées après coup sur des bases pré-Alembic
+    cols = {c["name"] for c in inspect(conn).get_columns("users")}
+    if "is_admin" not in cols:
+        conn.execute(text("ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT TRUE"))
+    if "token_version" not in cols:
+        conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def run_migrations(engine: Engine, revision: str = "head") -> None:
+    config = Config(str(ALEMBIC_INI))
+    with engine.begin() as conn:
+        config.attributes["connection"] = conn
+        tables = set(inspect(conn).get_table_names())
+        if "users" in tables and "alembic_version" not in tables:
+            _patch_users_columns(conn)
+            command.stamp(config, BASELINE)
+        command.upgrade(config, revision)
+
+
+if __name__ == "__main__":
+    from main import engine
+
+    run_migrations(engine)
+    print("### migrations OK")
@@ -0,0 +1,39 @@
+# migrations/env.py
+from alembic import context
+
+import main  # toutes les tables (auth + main) sur la même metadata
+
+config = context.config
+target_metadata = main.Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=main.engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # migrate.py peut fournir sa propre connexion (tests, SQLite jetable)
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    with main.engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,109 @@
+"""baseline : schéma tel que créé par create_all jusqu'ici
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("password_hash", sa.String(), nullable=True),
+        sa.Column("is_admin", sa.Boolean(), nullable=True),
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "teams",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("code", sa.String(64), nullable=False),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("logo_url", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+    )
+    op.create_index("ix_teams_id", "teams", ["id"])
+    op.create_index("ix_teams_code", "teams", ["code"], unique=True)
+
+    op.create_table(
+        "participants",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("team_id", sa.Integer(), sa.ForeignKey("teams.id"), nullable=False),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("address", sa.Text(), nullable=False),
+        sa.Column("postal_code", sa.String(32), nullable=True),
+        sa.Column("city", sa.String(255), nullable=True),
+        sa.Column("email", sa.String(255), nullable=True),
+        sa.Column("telephone", sa.String(64), nullable=True),
+        sa.Column("token", sa.String(32), nullable=False, unique=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_participants_id", "participants", ["id"])
+
+    op.create_table(
+        "events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("team_id", sa.Integer(), sa.ForeignKey("teams.id"), nullable=False),
+        sa.Column("title", sa.String(255), nullable=True),
+        sa.Column("destination", sa.Text(), nullable=False),
+        sa.Column("event_date", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_events_id", "events", ["id"])
+
+    op.create_table(
+        "trips",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("event_id", sa.Integer(), sa.ForeignKey("events.id"), nullable=False),
+        sa.Column("voiture", sa.String(64), nullable=False),
+        sa.Column("conducteur", sa.String(255), nullable=False),
+        sa.Column("email_conducteur", sa.String(255), nullable=True),
+        sa.Column("telephone_conducteur", sa.String(64), nullable=True),
+        sa.Column("ordre", sa.Text(), nullable=False),
+        sa.Column("google_maps", sa.Text(), nullable=False),
+    )
+    op.create_index("ix_trips_id", "trips", ["id"])
+
+    op.create_table(
+        "trip_passengers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id"), nullable=False),
+        sa.Column("nom", sa.String(255), nullable=False),
+        sa.Column("marche", sa.Boolean(), nullable=True),
+        sa.Column("email", sa.String(255), nullable=True),
+        sa.Column("telephone", sa.String(64), nullable=True),
+    )
+    op.create_index("ix_trip_passengers_id", "trip_passengers", ["id"])
+
+    op.create_table(
+        "trip_co2",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("event_id", sa.Integer(), sa.ForeignKey("events.id"), nullable=False),
+        sa.Column("voiture", sa.String(64), nullable=False),
+        sa.Column("conducteur", sa.String(255), nullable=False),
+        sa.Column("email_conducteur", sa.String(255), nullable=True),
+        sa.Column("nb_passagers", sa.Integer(), nullable=False),
+        sa.Column("co2_voiture_kg", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_trip_co2_id", "trip_co2", ["id"])
+
+
+def downgrade() -> None:
+    tables = ("trip_co2", "trip_passengers", "trips", "events", "participants", "teams", "users")
+    for table in tables:
+        op.drop_table(table)
@@ -0,0 +1,39 @@
+"""index des requêtes chaudes de main.py
+
+- trips / trip_passengers / trip_co2 : chargés par event_id / trip_id
+  (relations event.trips, trip.passengers, event.co2_entries, get_player_trip)
+- participants(team_id, name) : roster d'une équipe trié par nom
+- events(team_id, created_at) et events(created_at) : listes d'événements triées
+- teams(user_id, created_at) : list_teams d'un coach ; teams(name) : optimize_and_save
+
+Revision ID: 0002_hot_query_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002_hot_query_indexes"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_trips_event_id", "trips", ["event_id"]),
+    ("ix_trip_passengers_trip_id", "trip_passengers", ["trip_id"]),
+    ("ix_trip_co2_event_id", "trip_co2", ["event_id"]),
+    ("ix_participants_team_id_name", "participants", ["team_id", "name"]),
+    ("ix_events_team_id_created_at", "events", ["team_id", "created_at"]),
+    ("ix_events_created_at", "events", ["created_at"]),
+    ("ix_teams_user_id_created_at", "teams", ["user_id", "created_at"]),
+    ("ix_teams_name", "teams", ["name"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,69 @@
+"""catalogue des lieux : destinations géocodées une fois, tronçons entrants précalculés
+
+- venues : adresse + coordonnées du lieu
+- venue_aliases : clés d'adresse normalisées (adresse principale comprise)
+- venue_legs : domicile → lieu, unique par (lieu, origine)
+- events.venue_id : les équipes qui jouent sur un lieu
+
+Revision ID: 0003_venues
+Revises: 0002_hot_query_indexes
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003_venues"
+down_revision = "0002_hot_query_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "venues",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("address", sa.Text(), nullable=False),
+        sa.Column("lng", sa.Float(), nullable=False),
+        sa.Column("lat", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("refreshed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_venues_id", "venues", ["id"])
+
+    op.create_table(
+        "venue_aliases",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("venue_id", sa.Integer(), sa.ForeignKey("venues.id"), nullable=False),
+        sa.Column("alias_key", sa.String(512), nullable=False, unique=True),
+    )
+    op.create_index("ix_venue_aliases_id", "venue_aliases", ["id"])
+    op.create_index("ix_venue_aliases_venue_id", "venue_aliases", ["venue_id"])
+
+    op.create_table(
+        "venue_legs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("venue_id", sa.Integer(), sa.ForeignKey("venues.id"), nullable=False),
+        sa.Column("origin_lng", sa.Float(), nullable=False),
+        sa.Column("origin_lat", sa.Float(), nullable=False),
+        sa.Column("duration_s", sa.Integer(), nullable=True),
+        sa.Column("distance_km", sa.Float(), nullable=True),
+    )
+    op.create_index("ix_venue_legs_id", "venue_legs", ["id"])
+    op.create_index(
+        "ux_venue_legs_origin", "venue_legs", ["venue_id", "origin_lng", "origin_lat"], unique=True
+    )
+
+    with op.batch_alter_table("events") as batch:
+        batch.add_column(sa.Column("venue_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key("fk_events_venue_id", "venues", ["venue_id"], ["id"])
+        batch.create_index("ix_events_venue_id", ["venue_id"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("events") as batch:
+        batch.drop_index("ix_events_venue_id")
+        batch.drop_constraint("fk_events_venue_id", type_="foreignkey")
+        batch.drop_column("venue_id")
+    op.drop_table("venue_legs")
+    op.drop_table("venue_aliases")
+    op.drop_table("venues")
@@ -0,0 +1,34 @@
+"""index de déduplication des géocodages : une adresse physique payée une fois
+
+- geocodes : clé normalisée (addresses.address_key : texte + code postal)
+  → coordonnées canoniques, unique par clé
+
+Revision ID: 0004_geocodes
+Revises: 0003_venues
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004_geocodes"
+down_revision = "0003_venues"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "geocodes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("address_text", sa.String(512), nullable=False),
+        sa.Column("postcode", sa.String(16), nullable=False),
+        sa.Column("lng", sa.Float(), nullable=False),
+        sa.Column("lat", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_geocodes_id", "geocodes", ["id"])
+    op.create_index("ux_geocodes_address", "geocodes", ["address_text", "postcode"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("geocodes")
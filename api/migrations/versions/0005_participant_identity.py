@@ -0,0 +1,75 @@
+"""identité unique d'un joueur dans son équipe : (team_id, lower(name), lower(coalesce(email, '')))
+
+Cible ON CONFLICT de la synchro de roster (optimize_and_save, import).
+Les noms et emails perdent d'abord leurs espaces de bord (l'ancien chemin
+n8n les enregistrait tels quels, l'application les enlève désormais) : sinon
+" Léa" et "Léa" ne se reconnaîtraient pas. Aucune ligne n'est supprimée :
+s'il existe déjà des doublons (même équipe, même nom et email sans casse ni
+espaces de bord), la migration s'arrête et les liste ; ils sont à fusionner
+à la main (liens joueur déjà envoyés) avant de relancer.
+
+Revision ID: 0005_participant_identity
+Revises: 0004_geocodes
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0005_participant_identity"
+down_revision = "0004_geocodes"
+branch_labels = None
+depends_on = None
+
+
+MAX_REPORTED = 50   # groupes de doublons listés dans l'erreur
+
+
+def _duplicates() -> list:
+    """Groupes (team_id, nom, email, ids) qui violeraient l'index une fois les bords ôtés."""
+    rows = op.get_bind().execute(sa.text(
+        """
+        SELECT team_id, lower(trim(name)) AS name, lower(trim(coalesce(email, ''))) AS email, id
+        FROM participants
+        WHERE (team_id, lower(trim(name)), lower(trim(coalesce(email, '')))) IN (
+            SELECT team_id, lower(trim(name)), lower(trim(coalesce(email, '')))
+            FROM participants
+            GROUP BY team_id, lower(trim(name)), lower(trim(coalesce(email, '')))
+            HAVING COUNT(*) > 1
+        )
+        ORDER BY team_id, lower(trim(name)), lower(trim(coalesce(email, ''))), id
+        """
+    )).all()
+    groups: dict = {}
+    for team_id, name, email, pid in rows:
+        groups.setdefault((team_id, name, email), []).append(pid)
+    return [(*key, ids) for key, ids in groups.items()]
+
+
+def upgrade() -> None:
+    duplicates = _duplicates()
+    if duplicates:
+        lines = [
+            f"  équipe {team_id} : {name!r} <{email}> → participants {', '.join(map(str, ids))}"
+            for team_id, name, email, ids in duplicates[:MAX_REPORTED]
+        ]
+        if len(duplicates) > MAX_REPORTED:
+            lines.append(f"  ... et {len(duplicates) - MAX_REPORTED} autres groupes")
+        raise RuntimeError(
+            f"{len(duplicates)} joueurs en double dans leur équipe (nom + email, sans casse) : "
+            "fusionner ou renommer ces lignes avant de créer ux_participants_identity.\n"
+            + "\n".join(lines)
+        )
+    op.execute(
+        "UPDATE participants SET name = trim(name), email = trim(email) "
+        "WHERE name <> trim(name) OR email <> trim(email)"
+    )
+    op.create_index(
+        "ux_participants_identity",
+        "participants",
+        ["team_id", sa.text("lower(name)"), sa.text("lower(coalesce(email, ''))")],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_participants_identity", table_name="participants")
@@ -0,0 +1,29 @@
+"""sens des trajets enregistrés : aller ou retour (planification aller-retour)
+
+- trips.sens, trip_co2.sens : "aller" pour les plans existants
+
+Revision ID: 0006_trip_direction
+Revises: 0005_participant_identity
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0006_trip_direction"
+down_revision = "0005_participant_identity"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("trips", sa.Column("sens", sa.String(8), nullable=False, server_default="aller"))
+    op.add_column(
+        "trip_co2", sa.Column("sens", sa.String(8), nullable=False, server_default="aller")
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("trip_co2") as batch:
+        batch.drop_column("sens")
+    with op.batch_alter_table("trips") as batch:
+        batch.drop_column("sens")
@@ -0,0 +1,39 @@
+"""snapshot du dernier plan sur l'événement : lectures en une ligne
+
+- events.plan_snapshot : OptimiserResult en JSON (JSONB sous PostgreSQL)
+- events.plan_snapshot_bytes : le même, déjà sérialisé (réponse GET trips)
+- events.plan_format : version du format (main.PLAN_SNAPSHOT_FORMAT)
+- events.plan_revision : +1 à chaque plan enregistré (ETag)
+
+Les plans existants n'ont pas de snapshot : ils restent lus depuis trips / trip_co2.
+
+Revision ID: 0007_event_plan_snapshot
+Revises: 0006_trip_direction
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0007_event_plan_snapshot"
+down_revision = "0006_trip_direction"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    snapshot_type = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+    op.add_column("events", sa.Column("plan_snapshot", snapshot_type, nullable=True))
+    op.add_column("events", sa.Column("plan_snapshot_bytes", sa.LargeBinary(), nullable=True))
+    op.add_column("events", sa.Column("plan_format", sa.Integer(), nullable=True))
+    op.add_column(
+        "events", sa.Column("plan_revision", sa.Integer(), nullable=False, server_default="0")
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("events") as batch:
+        batch.drop_column("plan_revision")
+        batch.drop_column("plan_format")
+        batch.drop_column("plan_snapshot_bytes")
+        batch.drop_column("plan_snapshot")
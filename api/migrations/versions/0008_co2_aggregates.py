@@ -0,0 +1,118 @@
+"""totaux CO₂ par saison, tenus à jour à chaque plan enregistré
+
+- co2_team_seasons : équipe × saison (événements, voitures, passagers, kg)
+- co2_club_seasons : club (teams.user_id) × saison
+
+Les totaux sont calculés ici une fois depuis trip_co2 (déjà indexé sur
+event_id, cf. 0002), puis main._save_plan les ajuste par delta.
+
+Revision ID: 0008_co2_aggregates
+Revises: 0007_event_plan_snapshot
+Create Date: 2026-10-19
+"""
+import datetime
+import os
+from collections import defaultdict
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0008_co2_aggregates"
+down_revision = "0007_event_plan_snapshot"
+branch_labels = None
+depends_on = None
+
+COUNTERS = ("nb_evenements", "nb_voitures", "nb_passagers", "co2_kg")
+
+
+def _counters() -> list:
+    return [
+        sa.Column("nb_evenements", sa.Integer(), nullable=False),
+        sa.Column("nb_voitures", sa.Integer(), nullable=False),
+        sa.Column("nb_passagers", sa.Integer(), nullable=False),
+        sa.Column("co2_kg", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    team_seasons = op.create_table(
+        "co2_team_seasons",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("team_id", sa.Integer(), sa.ForeignKey("teams.id"), nullable=False),
+        sa.Column("saison", sa.Integer(), nullable=False),
+        *_counters(),
+    )
+    op.create_index("ix_co2_team_seasons_id", "co2_team_seasons", ["id"])
+    op.create_index("ux_co2_team_seasons", "co2_team_seasons", ["team_id", "saison"], unique=True)
+
+    club_seasons = op.create_table(
+        "co2_club_seasons",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("saison", sa.Integer(), nullable=False),
+        *_counters(),
+    )
+    op.create_index("ix_co2_club_seasons_id", "co2_club_seasons", ["id"])
+    op.create_index("ux_co2_club_seasons", "co2_club_seasons", ["user_id", "saison"], unique=True)
+
+    _backfill(team_seasons, club_seasons)
+
+
+def _backfill(team_seasons: sa.Table, club_seasons: sa.Table) -> None:
+    start_month = int(os.getenv("SEASON_START_MONTH", "8"))   # même réglage que main.py
+    events = sa.table(
+        "events", sa.column("id", sa.Integer), sa.column("team_id", sa.Integer),
+        sa.column("event_date", sa.DateTime), sa.column("created_at", sa.DateTime),
+    )
+    teams = sa.table("teams", sa.column("id", sa.Integer), sa.column("user_id", sa.Integer))
+    co2 = sa.table(
+        "trip_co2", sa.column("event_id", sa.Integer), sa.column("nb_passagers", sa.Integer),
+        sa.column("co2_voiture_kg", sa.Float),
+    )
+    rows = op.get_bind().execute(
+        sa.select(
+            events.c.team_id, teams.c.user_id, events.c.event_date, events.c.created_at,
+            sa.func.count().label("voitures"),
+            sa.func.sum(co2.c.nb_passagers).label("passagers"),
+            sa.func.sum(co2.c.co2_voiture_kg).label("kg"),
+        )
+        .select_from(
+            co2.join(events, events.c.id == co2.c.event_id)
+            .join(teams, teams.c.id == events.c.team_id)
+        )
+        .group_by(
+            events.c.id, events.c.team_id, teams.c.user_id, events.c.event_date, events.c.created_at
+        )
+    ).all()
+
+    by_team: dict = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    by_club: dict = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for row in rows:
+        when = row.event_date or row.created_at or datetime.datetime.utcnow()
+        saison = when.year if when.month >= start_month else when.year - 1
+        targets = [by_team[(row.team_id, saison)]]
+        if row.user_id:
+            targets.append(by_club[(row.user_id, saison)])
+        for totals in targets:
+            totals["nb_evenements"] += 1
+            totals["nb_voitures"] += row.voitures
+            totals["nb_passagers"] += row.passagers or 0
+            totals["co2_kg"] += row.kg or 0.0
+
+    now = datetime.datetime.utcnow()
+    if by_team:
+        op.bulk_insert(team_seasons, [
+            {"team_id": team_id, "saison": saison, "updated_at": now, **totals}
+            for (team_id, saison), totals in by_team.items()
+        ])
+    if by_club:
+        op.bulk_insert(club_seasons, [
+            {"user_id": user_id, "saison": saison, "updated_at": now, **totals}
+            for (user_id, saison), totals in by_club.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table("co2_club_seasons")
+    op.drop_table("co2_team_seasons")
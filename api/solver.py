@@ -0,0 +1,375 @@
+# solver.py
+"""
+Cœur numérique de l'optimisation, sans Google, sans BDD ni Pydantic :
+les participants sont des indices 0..n-1, les durées une matrice n×n
+int32 contiguë (ligne i = départs de i) et les trajets directs vers la
+destination une liste. Vers le pool de processus `executor`, la matrice
+passe par un segment de mémoire partagée : seul son nom est picklé, les
+workers la lisent sans copie.
+
+Même glouton que l'ancienne boucle de `_run_optimisation` :
+- le conducteur est le participant restant le plus loin (premier indice
+  en cas d'égalité),
+- un passager est compatible si conducteur → passager → destination
+  reste sous seuil × trajet direct du conducteur,
+- on garde le plus grand sous-ensemble de compatibles (ordre des
+  indices) qui tient sous le seuil, puis le plus court.
+
+Conducteurs imposés (Problem.drivers, retour d'un aller-retour) : seules
+leurs voitures roulent, max_passengers places chacune ; chacun prend ses
+passagers par le même glouton, du plus loin au plus proche, et ceux
+qu'aucun n'a pris sont insérés là où la route s'allonge le moins.
+"""
+import math
+import os
+import threading
+from array import array
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from itertools import combinations, pairwise
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+# tronçon non demandé (élagué) ou sans itinéraire : jamais sous le seuil
+UNREACHABLE = 1 << 30
+
+SOLVER_WORKERS = int(os.getenv("SOLVER_WORKERS", str(os.cpu_count() or 1)))
+SOLVER_QUEUE_MAX = int(os.getenv("SOLVER_QUEUE_MAX", "32"))        # en attente d'un worker
+SOLVER_INLINE_BELOW = int(os.getenv("SOLVER_INLINE_BELOW", "12"))  # effectif résolu sans worker
+# vitesse plafond de la borne inférieure vol d'oiseau (km/h) : doit majorer
+# toute vitesse moyenne porte-à-porte, sinon l'élagage écarte de vrais candidats
+MATRIX_VMAX_KMH = float(os.getenv("MATRIX_VMAX_KMH", "150"))
+
+
+def _buffer(shm: SharedMemory) -> memoryview:
+    # buf ne vaut None qu'après close()
+    if shm.buf is None:
+        raise ValueError(f"segment {shm.name} déjà fermé")
+    return shm.buf
+
+
+class SharedDurations:
+    """
+    Matrice int32 dans un segment multiprocessing.shared_memory.
+    Le créateur (processus API) en est propriétaire et la détruit avec
+    `unlink()` ; au pickle, seuls le nom et la longueur voyagent.
+    """
+
+    def __init__(self, values: Sequence[int]):
+        if not (isinstance(values, array) and values.typecode == "i"):
+            values = array("i", values)   # copie intermédiaire seulement hors int32
+        self.length = len(values)
+        self._shm = SharedMemory(create=True, size=max(1, self.length * values.itemsize))
+        self.name = self._shm.name
+        with memoryview(_buffer(self._shm)) as raw, raw.cast("i") as ints:
+            ints[:self.length] = values
+
+    def __getstate__(self):
+        return {"name": self.name, "length": self.length}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _shm=None)
+
+    @contextmanager
+    def view(self):
+        """Vue int32 en lecture sur le segment, sans copie."""
+        # les workers spawn partagent le resource_tracker du créateur : l'inscription
+        # faite ici est la sienne, retirée par son unlink()
+        shm = self._shm or SharedMemory(name=self.name)
+        try:
+            with (
+                memoryview(_buffer(shm)) as raw,
+                raw.cast("i") as ints,
+                ints[:self.length] as durations,
+            ):
+                yield durations
+        finally:
+            if shm is not self._shm:
+                shm.close()
+
+    def unlink(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+
+@dataclass(frozen=True)
+class Problem:
+    direct: Sequence[int]      # durée (s) participant i → destination
+    # n×n aplatie : durations[i * n + j] = durée i → j ; array("i") en local,
+    # SharedDurations une fois confié au pool
+    durations: Sequence[int] | SharedDurations
+    max_passengers: int
+    seuil: float
+    drivers: tuple[int, ...] = ()   # conducteurs imposés (voitures de l'aller), () = libres
+
+
+@dataclass
+class Solution:
+    routes: list[list[int]] = field(default_factory=list)   # [conducteur, passagers...]
+    compatible_pairs: int = 0
+    subsets_evaluated: int = 0
+
+
+def haversine_km(a: tuple[float, float], b: tuple[float, float]) -> float:
+    """Distance vol d'oiseau entre deux points (lng, lat)."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def candidate_legs(points: list[tuple[float, float]], destination: tuple[float, float],
+                   direct: Sequence[int], seuil: float,
+                   vmax_kmh: float = MATRIX_VMAX_KMH) -> set[tuple[int, int]]:
+    """
+    Tronçons (i, j) que le glouton peut consulter, quel que soit l'ordre
+    de choix des conducteurs. Élagage sûr par borne inférieure vol d'oiseau :
+    - i → j sert au test de compatibilité si lb(i, j) + direct[j] ≤ seuil × direct[i],
+    - a → b (a < b, ordre des sous-ensembles) sert si a et b sont compatibles
+      avec un même i et lb(i, a) + lb(a, b) + lb(b, dest) ≤ seuil × direct[i].
+    Les tronçons absents valent UNREACHABLE : le glouton les rejette de toute façon.
+    """
+    n = len(points)
+    to_s = 3600.0 / vmax_kmh
+    lb = [[haversine_km(p, q) * to_s for q in points] for p in points]
+    lb_dest = [haversine_km(p, destination) * to_s for p in points]
+
+    needed: set[tuple[int, int]] = set()
+    for i in range(n):
+        limit = seuil * direct[i]
+        lb_i = lb[i]
+        compatibles = [j for j in range(n) if j != i and lb_i[j] + direct[j] <= limit]
+        needed.update((i, j) for j in compatibles)
+        for x, a in enumerate(compatibles):
+            budget = limit - lb_i[a]
+            lb_a = lb[a]
+            for b in compatibles[x + 1:]:
+                if lb_a[b] + lb_dest[b] <= budget:
+                    needed.add((a, b))
+    return needed
+
+
+def empty_matrix(n: int) -> array:
+    """Matrice n×n int32 remplie de UNREACHABLE."""
+    return array("i", [UNREACHABLE]) * (n * n)
+
+
+@contextmanager
+def _matrix(problem: Problem) -> Iterator[Sequence[int]]:
+    """La matrice du problème, lue dans le segment partagé s'il y en a un."""
+    if isinstance(problem.durations, SharedDurations):
+        with problem.durations.view() as durations:
+            yield durations
+    else:
+        yield problem.durations
+
+
+def solve(problem: Problem) -> Solution:
+    with _matrix(problem) as durations:
+        return _solve(problem, durations)
+
+
+def _solve(problem: Problem, durations: Sequence[int]) -> Solution:
+    solution = Solution()
+    for _ in iter_routes(problem, durations, solution):
+        pass
+    return solution
+
+
+def iter_routes(problem: Problem, durations: Sequence[int],
+                solution: Solution) -> Iterator[list[int]]:
+    """
+    Les voitures une à une, dès que le glouton les fixe (affichage progressif) ;
+    routes et compteurs s'accumulent dans `solution`. Matrice locale (pas de
+    SharedDurations) : l'appelant peut s'arrêter entre deux voitures.
+    """
+    if problem.drivers:
+        yield from _iter_fixed_routes(problem, durations, solution)
+        return
+    direct = problem.direct
+    remaining = list(range(len(direct)))
+
+    while remaining:
+        driver = max(remaining, key=direct.__getitem__)
+        route = [driver, *_best_subset(problem, durations, driver, remaining, solution)]
+        solution.routes.append(route)
+        taken = set(route)
+        remaining = [j for j in remaining if j not in taken]
+        yield route
+
+
+def _iter_fixed_routes(problem: Problem, durations: Sequence[int],
+                       solution: Solution) -> Iterator[list[int]]:
+    """
+    Conducteurs imposés : routes rendues dans l'ordre de problem.drivers
+    (voiture k du retour = voiture k de l'aller), une fois tous les
+    passagers placés.
+    """
+    direct = problem.direct
+    n = len(direct)
+    drivers = problem.drivers
+    fixed = set(drivers)
+    remaining = [j for j in range(n) if j not in fixed]
+    routes = {}
+    for driver in sorted(drivers, key=direct.__getitem__, reverse=True):
+        routes[driver] = [driver, *_best_subset(problem, durations, driver, remaining, solution)]
+        taken = set(routes[driver])
+        remaining = [j for j in remaining if j not in taken]
+
+    # restés sans voiture (seuil ou places) : insertion la moins chère dans une
+    # voiture qui a encore une place. L'aller a placé tout le monde : il en reste une.
+    for j in remaining:
+        candidates = []
+        for driver in drivers:
+            route = routes[driver]
+            if len(route) > problem.max_passengers:
+                continue
+            limit = problem.seuil * direct[driver]
+            for pos in range(1, len(route) + 1):
+                duration = _route_duration(problem, durations, [*route[:pos], j, *route[pos:]])
+                candidates.append((max(0, duration - limit), duration, driver, pos))
+        _, _, driver, pos = min(candidates)
+        routes[driver].insert(pos, j)
+
+    for driver in drivers:
+        solution.routes.append(routes[driver])
+        yield routes[driver]
+
+
+def _route_duration(problem: Problem, durations: Sequence[int], route: list[int]) -> int:
+    """Durée conducteur → passagers → destination (tronçons absents : UNREACHABLE)."""
+    n = len(problem.direct)
+    return sum(durations[a * n + b] for a, b in pairwise(route)) + problem.direct[route[-1]]
+
+
+def _best_subset(problem: Problem, durations: Sequence[int], driver: int,
+                 remaining: list[int], solution: Solution) -> tuple[int, ...]:
+    """Plus grand sous-ensemble de passagers compatibles sous le seuil, puis le plus court."""
+    direct = problem.direct
+    n = len(direct)
+    limit = problem.seuil * direct[driver]
+    row = driver * n
+    compatibles = [
+        j for j in remaining
+        if j != driver and durations[row + j] + direct[j] <= limit
+    ]
+    solution.compatible_pairs += len(compatibles)
+
+    best_subset: tuple[int, ...] = ()
+    best_duration = math.inf
+    for k in range(min(problem.max_passengers, len(compatibles)), -1, -1):
+        for subset in combinations(compatibles, k):
+            solution.subsets_evaluated += 1
+            if k == 0:
+                duration = direct[driver]
+            else:
+                duration = durations[row + subset[0]] + direct[subset[-1]]
+                for a, b in pairwise(subset):
+                    duration += durations[a * n + b]
+            if duration <= limit and duration < best_duration:
+                best_duration = duration
+                best_subset = subset
+        if best_duration != math.inf:
+            break   # un k plus petit ne peut plus l'emporter
+    return best_subset
+
+
+# -------------------------------------------------------------------
+# Exécution hors de la boucle d'événements
+# -------------------------------------------------------------------
+class SolverBusy(Exception):
+    """Plus de workers + file d'attente disponibles : l'appelant répond 503."""
+
+
+class SolverExecutor:
+    """
+    Pool de processus borné pour la recherche de sous-ensembles (pur CPU,
+    le GIL empêcherait un pool de threads d'utiliser plusieurs cœurs).
+    Seuls des `Problem` traversent la frontière (ni ORM, ni Pydantic), leur
+    matrice étant placée en mémoire partagée le temps de la résolution.
+    Les petits effectifs (< inline_below) restent dans le thread appelant,
+    l'aller-retour vers un worker coûterait plus cher.
+    Au-delà de workers + queue_max problèmes en cours, SolverBusy (503).
+    """
+
+    def __init__(self, workers: int, queue_max: int, inline_below: int):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + queue_max
+        self.inline_below = inline_below
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0          # soumis aux workers, pas encore terminés
+        self.completed = 0
+        self.inline = 0
+        self.rejected = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn : les workers n'héritent ni des threads ni des connexions de l'API
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_context("spawn")
+                )
+            return self._pool
+
+    def solve_many(self, problems: list[Problem]) -> list[Solution]:
+        """Résout des problèmes indépendants ; bloquant, à appeler hors boucle asyncio."""
+        remote = [i for i, p in enumerate(problems) if len(p.direct) >= self.inline_below]
+        with self._lock:
+            # un appel seul passe toujours (batch plus gros que la file) ; sinon plafond
+            if self.pending and self.pending + len(remote) > self.capacity:
+                self.rejected += 1
+                raise SolverBusy(f"{self.pending} résolutions en cours (max {self.capacity})")
+            self.pending += len(remote)
+        shared: list[SharedDurations] = []
+        try:
+            futures = {}
+            for i in remote:
+                problem = problems[i]
+                # matrice déjà partagée : son créateur en garde la propriété
+                if not isinstance(problem.durations, SharedDurations):
+                    matrix = SharedDurations(problem.durations)
+                    shared.append(matrix)
+                    problem = replace(problem, durations=matrix)
+                futures[i] = self._executor().submit(solve, problem)
+            solutions = [
+                futures[i].result() if i in futures else solve(p) for i, p in enumerate(problems)
+            ]
+        finally:
+            for matrix in shared:
+                matrix.unlink()
+            with self._lock:
+                self.pending -= len(remote)
+                self.completed += len(remote)
+                self.inline += len(problems) - len(remote)
+        return solutions
+
+    def solve(self, problem: Problem) -> Solution:
+        return self.solve_many([problem])[0]
+
+    def iter_solve(self, problem: Problem, solution: Solution) -> Iterator[list[int]]:
+        """
+        Résolution progressive dans le thread appelant (flux vers le client) :
+        pas de worker, l'appelant lit chaque voiture avant la suivante.
+        """
+        with self._lock:
+            self.inline += 1
+        with _matrix(problem) as durations:
+            yield from iter_routes(problem, durations, solution)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "pending": self.pending,
+                "queued": max(0, self.pending - self.workers),
+                "completed": self.completed,
+                "inline": self.inline,
+                "rejected": self.rejected,
+            }
+
+
+executor = SolverExecutor(SOLVER_WORKERS, SOLVER_QUEUE_MAX, SOLVER_INLINE_BELOW)
@@ -0,0 +1,67 @@
+# startup.py
+"""
+Démarrage léger de l'API :
+- la pile PDF (WeasyPrint → Pango/Cairo) n'est chargée qu'au premier export,
+- aucun accès BDD à l'import ; le schéma est géré par `python migrate.py` (Alembic),
+- liveness (/healthz) et readiness (/readyz) sont distinctes.
+"""
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# tables sans lesquelles l'API ne peut pas servir de requêtes
+REQUIRED_TABLES = (
+    "users", "teams", "participants", "events", "trips", "trip_passengers", "trip_co2",
+)
+
+STARTED_AT = time.monotonic()
+
+
+@lru_cache(maxsize=1)
+def load_pdf_stack():
+    """Importe WeasyPrint au premier export PDF seulement. Retourne (HTML, CSS)."""
+    from weasyprint import CSS, HTML
+
+    return HTML, CSS
+
+
+def check_database(engine: Engine) -> dict:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            present = set(inspect(conn).get_table_names())
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    missing = [t for t in REQUIRED_TABLES if t not in present]
+    if missing:
+        return {"ok": False, "error": "migrations non appliquées", "missing_tables": missing}
+    current, head = _schema_revisions(engine)
+    if current != head:
+        return {"ok": False, "error": "migrations en retard", "revision": current, "head": head}
+    return {"ok": True, "revision": current}
+
+
+def _schema_revisions(engine: Engine) -> tuple[str | None, str | None]:
+    # import tardif : alembic n'est utile qu'au premier appel de /readyz
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory(str(Path(__file__).resolve().parent / "migrations"))
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    return current, script.get_current_head()
+
+
+def readiness(engine: Engine, google_api_key: str | None) -> dict:
+    checks = {
+        "database": check_database(engine),
+        "google_api_key": {"ok": bool(google_api_key)},
+    }
+    return {"ready": all(c["ok"] for c in checks.values()), "checks": checks}
+
+
+def liveness() -> dict:
+    return {"status": "ok", "uptime_s": round(time.monotonic() - STARTED_AT, 1)}
@@ -0,0 +1,80 @@
+# tracing.py
+"""
+Traces OpenTelemetry : une trace par requête HTTP, avec des spans pour
+chaque phase de l'optimisation, chaque appel fournisseur et chaque étape
+de persistance.
+
+Export choisi par TRACING_EXPORTER :
+- ""        : désactivé (tracer no-op, coût négligeable)
+- "console" : spans JSON sur stdout (visibles dans Dozzle)
+- "file"    : spans JSON, une ligne par span, dans TRACING_FILE
+- "otlp"    : collecteur OTLP (OTEL_EXPORTER_OTLP_ENDPOINT), si le paquet
+              opentelemetry-exporter-otlp est installé
+"""
+import os
+from contextlib import contextmanager
+
+from opentelemetry import trace
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").strip().lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "sportcov-api")
+
+tracer = trace.get_tracer("sportcov")
+
+
+def _json_line(span) -> str:
+    return span.to_json(indent=None) + "\n"
+
+
+def setup_tracing(exporter: str = TRACING_EXPORTER) -> bool:
+    """Installe le SDK si un export est demandé. Retourne True si actif."""
+    if not exporter:
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if exporter == "console":
+        span_exporter = ConsoleSpanExporter(formatter=_json_line)
+    elif exporter == "file":
+        # fichier ouvert pour toute la vie du process, comme stdout en mode console
+        out = open(TRACING_FILE, "a")  # noqa: SIM115
+        span_exporter = ConsoleSpanExporter(out=out, formatter=_json_line)
+    elif exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        span_exporter = OTLPSpanExporter()
+    else:
+        raise RuntimeError(f"TRACING_EXPORTER inconnu : {exporter}")
+
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+@contextmanager
+def span(name: str, **attributes):
+    with tracer.start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            current.set_attribute(key, value)
+        yield current
+
+
+def install(app) -> None:
+    """Span racine par requête HTTP, renommée d'après la route résolue."""
+    from fastapi import Request
+
+    @app.middleware("http")
+    async def _trace(request: Request, call_next):
+        with tracer.start_as_current_span(f"{request.method} {request.url.path}") as root:
+            root.set_attribute("http.method", request.method)
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if route is not None:
+                root.update_name(f"{request.method} {route.path}")
+                root.set_attribute("http.route", route.path)
+            root.set_attribute("http.status_code", response.status_code)
+            return response
@@ -327,10 +327,15 @@ async def optimiser_trajets(data: InputData):
 # --- Export PDF (basé sur optimiser_trajets) ---
 from fastapi.responses import FileResponse
 from jinja2 import Template
-from weasyprint import HTML, CSS
 import tempfile
 import datetime
 
+@lru_cache(maxsize=1)
+def _load_pdf_stack():
+    # WeasyPrint (Pango/Cairo) n'est chargé qu'au premier export
+    from weasyprint import CSS, HTML
+    return HTML, CSS
+
 PDF_CSS = """
 @page { size: A4; margin: 18mm; }
 body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Arial, sans-serif; font-size: 12pt; }
@@ -449,6 +454,7 @@ async def export_pdf(data: InputData, club_name: str = "Sport Cov", logo_url: st
         max_passagers=result["max_passagers"],
         seuil_rallonge=result["seuil_rallonge"],
     )
+    HTML, CSS = _load_pdf_stack()
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
     HTML(string=html_str).write_pdf(tmp.name, stylesheets=[CSS(string=PDF_CSS)])
     return FileResponse(tmp.name, media_type="application/pdf", filename="Mon_equipe_covoiturage.pdf")
@@ -474,6 +480,7 @@ async def export_pdf_from_result(
         max_passagers=result.max_passagers,
         seuil_rallonge=result.seuil_rallonge,
     )
+    HTML, CSS = _load_pdf_stack()
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
     HTML(string=html_str).write_pdf(tmp.name, stylesheets=[CSS(string=PDF_CSS)])
     return FileResponse(tmp.name, media_type="application/pdf", filename="Mon_equipe_covoiturage.pdf")
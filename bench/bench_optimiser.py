@@ -0,0 +1,181 @@
+# bench/bench_optimiser.py
+"""
+Benchmark de `_run_optimisation` sur des effectifs synthétiques,
+avec un fournisseur de routage factice (aucun appel Google).
+
+    python -m bench.bench_optimiser --sizes 5,10,20,50 --repeat 3
+    python -m bench.bench_optimiser --json out.json
+    python -m bench.bench_optimiser --compare out.json   # code retour 1 si régression
+
+Mesures par (taille, config) : temps mur, appels fournisseur par endpoint,
+éléments facturés (Distance Matrix : origines × destinations), voitures
+utilisées, détour total (s) par rapport aux trajets directs.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+sys.path.insert(0, str(API_DIR))
+os.environ.setdefault("DATABASE_URL", "sqlite://")   # import seul ; forcé en ligne de commande
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault("GOOGLE_QPS", "1000000")     # débit illimité sauf --qps
+
+from bench.fake_routing import FakeRoutingProvider  # noqa: E402
+from bench.rosters import make_roster  # noqa: E402
+
+if TYPE_CHECKING:
+    import main  # importé par _load_main, après l'environnement ci-dessus
+
+# (max_passagers, seuil_rallonge)
+DEFAULT_CONFIGS = [(3, 1.5), (4, 1.5), (3, 1.3)]
+
+
+def _load_main():
+    import main
+
+    return main
+
+
+def total_detour_s(result: "main.OptimiserResult", roster, provider: FakeRoutingProvider) -> int:
+    """Somme, par voiture, de (durée du trajet avec passagers − durée directe du conducteur)."""
+    book = roster.address_book
+    by_name = {p["name"]: book[p["address"]] for p in roster.participants}
+    dest = book[roster.destination]
+    detour = 0
+    for t in result.trajets:
+        points = [by_name[t.conducteur]] + [by_name[p.nom] for p in t.passagers] + [dest]
+        route = sum(provider.leg(points[i], points[i + 1])[0] for i in range(len(points) - 1))
+        detour += route - provider.leg(points[0], dest)[0]
+    return detour
+
+
+def run_case(size: int, config: tuple[int, float], venue: str, seed: int,
+             latency_ms: float, repeat: int, qps: float = 0.0) -> dict:
+    main = _load_main()
+    from gateway import TokenBucket
+
+    bucket = TokenBucket(qps, qps, 0.0) if qps else main.gateway.bucket
+    max_passengers, seuil = config
+    roster = make_roster(size, venue=venue, seed=seed)
+    provider = FakeRoutingProvider(roster.address_book, latency_ms=latency_ms, seed=seed)
+    data = main.InputData(participants=roster.participants, destination=roster.destination)
+
+    timings = []
+    result = None
+    calls: dict = {}
+    elements: dict = {}
+    with (
+        patch.object(main.session, "get", side_effect=provider.get),
+        patch.object(main, "MAX_PASSENGERS", max_passengers),
+        patch.object(main, "SEUIL_RALLONGE", seuil),
+        patch.object(main.gateway, "bucket", bucket),
+        # à froid : la table geocodes n'est pas relue (ni vidée, quelle que soit la base)
+        patch.object(main, "prime_geocodes", lambda addresses: None),
+    ):
+        for _ in range(repeat):
+            main.clear_provider_caches()   # chaque répétition part d'un cache froid
+            provider.reset()
+            t0 = time.perf_counter()
+            result = main._run_optimisation(data)
+            timings.append(time.perf_counter() - t0)
+            calls = dict(provider.calls)
+            elements = dict(provider.elements)
+
+    return {
+        "size": size,
+        "max_passagers": max_passengers,
+        "seuil_rallonge": seuil,
+        "venue": venue,
+        "wall_s_median": round(statistics.median(timings), 4),
+        "wall_s_min": round(min(timings), 4),
+        "provider_calls": calls,
+        "provider_calls_total": sum(calls.values()),
+        "provider_elements": elements,
+        "provider_elements_total": sum(elements.values()),
+        "cars": len(result.trajets),
+        "total_detour_s": total_detour_s(result, roster, provider),
+    }
+
+
+def compare(current: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Régressions : plus d'appels, plus de voitures, plus de détour, ou temps > (1+tol)×."""
+    key = lambda r: (r["size"], r["max_passagers"], r["seuil_rallonge"], r["venue"])  # noqa: E731
+    base = {key(r): r for r in baseline}
+    problems = []
+    for r in current:
+        b = base.get(key(r))
+        if not b:
+            continue
+        label = "size={} cfg=({}, {}) venue={}".format(*key(r))
+        if r["provider_calls_total"] > b["provider_calls_total"]:
+            problems.append(
+                f"{label}: appels {b['provider_calls_total']} -> {r['provider_calls_total']}"
+            )
+        elements = b.get("provider_elements_total")
+        if elements is not None and r["provider_elements_total"] > elements:
+            problems.append(f"{label}: éléments {elements} -> {r['provider_elements_total']}")
+        if r["cars"] > b["cars"]:
+            problems.append(f"{label}: voitures {b['cars']} -> {r['cars']}")
+        if r["total_detour_s"] > b["total_detour_s"] * (1 + tolerance):
+            problems.append(f"{label}: détour {b['total_detour_s']} -> {r['total_detour_s']}")
+        if r["wall_s_median"] > b["wall_s_median"] * (1 + tolerance) and r["wall_s_median"] > 0.05:
+            problems.append(f"{label}: temps {b['wall_s_median']}s -> {r['wall_s_median']}s")
+    return problems
+
+
+def main_cli(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", default="5,10,20,50", help="tailles d'effectif (5 à 200)")
+    parser.add_argument(
+        "--configs", default=None,
+        help="liste 'max_passagers:seuil' séparée par des virgules, ex. 3:1.5,4:1.5",
+    )
+    parser.add_argument("--venue", default="amboise")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latence simulée par appel")
+    parser.add_argument("--qps", type=float, default=0.0, help="quota simulé (0 = illimité)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", dest="json_out", help="écrit les résultats dans ce fichier")
+    parser.add_argument("--compare", help="fichier JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        configs = [(int(m), float(s)) for m, s in (c.split(":") for c in args.configs.split(","))]
+
+    results = []
+    print(f"{'size':>5} {'cfg':>9} {'wall(s)':>9} {'calls':>7} {'elements':>9} "
+          f"{'cars':>5} {'detour(s)':>10}")
+    for size in sizes:
+        for cfg in configs:
+            r = run_case(size, cfg, args.venue, args.seed, args.latency_ms, args.repeat, args.qps)
+            results.append(r)
+            print(f"{size:>5} {cfg[0]}:{cfg[1]:<7} {r['wall_s_median']:>9.4f} "
+                  f"{r['provider_calls_total']:>7} {r['provider_elements_total']:>9} "
+                  f"{r['cars']:>5} {r['total_detour_s']:>10}")
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+
+    if args.compare:
+        problems = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for p in problems:
+            print("REGRESSION", p)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    os.environ["DATABASE_URL"] = "sqlite://"   # jamais la base de l'appelant
+    sys.exit(main_cli())
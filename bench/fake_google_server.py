@@ -0,0 +1,310 @@
+# bench/fake_google_server.py
+"""
+Serveur HTTP local qui se fait passer pour Google Maps (geocode, directions,
+distancematrix, generate_204), avec latence et pannes injectées, pour mesurer
+caches, retries, seau à jetons et disjoncteur sans réseau ni facture :
+
+    python -m bench.fake_google_server --port 8765 --latency lognormal --latency-ms 80
+    python -m bench.fake_google_server --error-rate 0.05 --quota 20000 --carnet carnet.json
+    GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765 uvicorn main:app      # l'API pointe dessus
+
+Durées et distances : celles de bench.fake_routing (vol d'oiseau × facteur
+route, trafic aux heures de pointe avec departure_time). Adresse absente du
+carnet : coordonnées stables tirées de son hachage autour de Tours (--strict :
+ZERO_RESULTS).
+
+Pannes, tirées à chaque appel dans cet ordre :
+- --hang-rate : la réponse n'arrive qu'après --hang-s (timeout côté client),
+- --error-rate : HTTP 503,
+- --rate-limit-rate : HTTP 429,
+- --qps : au-delà de N appels dans la même seconde, OVER_QUERY_LIMIT,
+- --quota : une fois N éléments facturés, OVER_QUERY_LIMIT jusqu'au reset,
+- --over-query-rate : OVER_QUERY_LIMIT aléatoire.
+
+Administration (JSON) : GET /_stats (appels, éléments, pannes),
+POST /_faults (modifie les réglages à chaud), POST /_reset (compteurs et quota).
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from bench.fake_routing import FakeRoutingProvider
+
+DEFAULT_CENTER = (0.6848, 47.3941)   # Tours (lng, lat)
+DEFAULT_RADIUS_KM = 60.0             # rayon des adresses inconnues
+
+
+@dataclass
+class Faults:
+    latency: str = "fixed"          # fixed | uniform | lognormal
+    latency_ms: float = 0.0         # délai (fixed), centre (uniform) ou médiane (lognormal)
+    jitter_ms: float = 0.0          # demi-largeur (uniform)
+    sigma: float = 0.5              # dispersion (lognormal)
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    over_query_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_s: float = 60.0
+    qps: float = 0.0                # 0 = pas de limite par seconde
+    quota: int = 0                  # éléments facturés avant épuisement, 0 = illimité
+
+
+class FakeGoogle:
+    """État du serveur : carnet d'adresses, réglages de pannes et compteurs."""
+
+    def __init__(self, address_book: dict | None = None, faults: Faults | None = None,
+                 seed: int = 0, strict: bool = False,
+                 center: tuple[float, float] = DEFAULT_CENTER,
+                 radius_km: float = DEFAULT_RADIUS_KM):
+        self.provider = FakeRoutingProvider(address_book)
+        self.faults = faults or Faults()
+        self.strict = strict
+        self.center = center
+        self.radius_km = radius_km
+        self.billed = 0
+        self.faults_served: Counter = Counter()
+        self._window: deque = deque()   # horodatages de la dernière seconde (--qps)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # -- géométrie --------------------------------------------------------
+    def locate(self, address: str) -> tuple[float, float] | None:
+        """Coordonnées du carnet, sinon point stable dérivé de l'adresse."""
+        loc = self.provider.address_book.get(address)
+        if loc is not None or self.strict or not address:
+            return loc
+        digest = hashlib.blake2b(address.encode(), digest_size=8).digest()
+        angle = 2 * math.pi * int.from_bytes(digest[:4], "big") / 0xFFFFFFFF
+        dist = self.radius_km * math.sqrt(int.from_bytes(digest[4:], "big") / 0xFFFFFFFF)
+        lat = self.center[1] + dist / 111.0 * math.sin(angle)
+        km_per_lng = 111.0 * math.cos(math.radians(self.center[1]))
+        lng = self.center[0] + dist / km_per_lng * math.cos(angle)
+        loc = (round(lng, 6), round(lat, 6))
+        with self._lock:
+            self.provider.address_book[address] = loc
+        return loc
+
+    # -- pannes -----------------------------------------------------------
+    def delay(self) -> float:
+        f = self.faults
+        with self._lock:
+            if f.latency == "uniform":
+                ms = f.latency_ms + self._rng.uniform(-f.jitter_ms, f.jitter_ms)
+            elif f.latency == "lognormal":
+                ms = f.latency_ms * math.exp(self._rng.gauss(0.0, f.sigma))
+            else:
+                ms = f.latency_ms
+        return max(ms, 0.0) / 1000.0
+
+    def fault(self, billed: int) -> str | None:
+        """Panne à servir pour cet appel (None = réponse normale) ; compte le quota consommé."""
+        f = self.faults
+        now = time.monotonic()
+        with self._lock:
+            draw = self._rng.random
+            kind = None
+            if draw() < f.hang_rate:
+                kind = "hang"
+            elif draw() < f.error_rate:
+                kind = "http_503"
+            elif draw() < f.rate_limit_rate:
+                kind = "http_429"
+            else:
+                while self._window and now - self._window[0] >= 1.0:
+                    self._window.popleft()
+                if f.qps and len(self._window) >= f.qps:
+                    kind = "qps"
+                elif f.quota and self.billed + billed > f.quota:
+                    kind = "quota"
+                elif draw() < f.over_query_rate:
+                    kind = "over_query_limit"
+                else:
+                    self._window.append(now)
+                    self.billed += billed
+            if kind:
+                self.faults_served[kind] += 1
+        return kind
+
+    # -- administration ---------------------------------------------------
+    def configure(self, changes: dict) -> dict:
+        unknown = set(changes) - {f.name for f in fields(Faults)}
+        if unknown:
+            raise ValueError(f"réglages inconnus : {', '.join(sorted(unknown))}")
+        with self._lock:
+            for name, value in changes.items():
+                if name != "latency":
+                    value = type(getattr(self.faults, name))(value)
+                setattr(self.faults, name, value)
+        return asdict(self.faults)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": dict(self.provider.calls),
+                "elements": dict(self.provider.elements),
+                "billed": self.billed,
+                "faults": dict(self.faults_served),
+                "settings": asdict(self.faults),
+            }
+
+    def reset(self) -> None:
+        self.provider.reset()
+        with self._lock:
+            self.billed = 0
+            self.faults_served.clear()
+            self._window.clear()
+
+
+def _billed(endpoint: str, params: dict) -> int:
+    if endpoint == "distancematrix":
+        origins = params.get("origins", "").split("|")
+        return len(origins) * len(params.get("destinations", "").split("|"))
+    return 1
+
+
+def _handler(google: FakeGoogle):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, comme le pool de requests
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, payload: dict | None = None) -> None:
+            body = b"" if payload is None else json.dumps(payload).encode()
+            self.send_response(status)
+            if payload is not None:
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            parts = urlsplit(self.path)
+            if parts.path == "/_stats":
+                return self._send(200, google.stats())
+            if parts.path == "/generate_204":
+                return self._send(204)
+            segments = parts.path.strip("/").split("/")
+            if segments[:2] != ["maps", "api"] or len(segments) != 4 or segments[3] != "json" \
+                    or segments[2] not in ("geocode", "directions", "distancematrix"):
+                return self._send(404, {"status": "NOT_FOUND"})
+            endpoint = segments[2]
+            params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            if not params.get("key"):
+                denied = {"status": "REQUEST_DENIED", "error_message": "clé API manquante"}
+                return self._send(200, denied)
+
+            kind = google.fault(_billed(endpoint, params))
+            time.sleep(google.faults.hang_s if kind == "hang" else google.delay())
+            if kind == "http_503":
+                return self._send(503, {"status": "UNKNOWN_ERROR"})
+            if kind == "http_429":
+                return self._send(429, {"status": "OVER_QUERY_LIMIT"})
+            if kind in ("qps", "quota", "over_query_limit"):
+                return self._send(200, {"status": "OVER_QUERY_LIMIT", "error_message": kind})
+
+            if endpoint == "geocode":
+                # carnet complété à la volée : le fournisseur répond comme pour une adresse connue
+                google.locate(params.get("address", ""))
+            try:
+                resp = google.provider.get(f"/maps/api/{endpoint}/json", params=params)
+            except (KeyError, ValueError) as e:
+                message = f"paramètre invalide : {e}"
+                return self._send(200, {"status": "INVALID_REQUEST", "error_message": message})
+            self._send(resp.status_code, resp.json())
+
+        def do_POST(self) -> None:
+            path = urlsplit(self.path).path
+            if path == "/_reset":
+                google.reset()
+                return self._send(200, {"ok": True})
+            if path == "/_faults":
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    settings = google.configure(json.loads(self.rfile.read(length) or b"{}"))
+                except (ValueError, TypeError) as e:
+                    return self._send(400, {"detail": str(e)})
+                return self._send(200, settings)
+            self._send(404, {"detail": "introuvable"})
+
+    return Handler
+
+
+class FakeGoogleServer:
+    """Serveur dans un thread : `with FakeGoogleServer(google) as srv: srv.base_url`."""
+
+    def __init__(self, google: FakeGoogle | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.google = google or FakeGoogle()
+        self.httpd = ThreadingHTTPServer((host, port), _handler(self.google))
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGoogleServer":
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="fake-google", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeGoogleServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main_cli(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--carnet", metavar="CARNET_JSON", default=None,
+                        help="{adresse: [lng, lat]}")
+    parser.add_argument("--strict", action="store_true", help="adresse hors carnet → ZERO_RESULTS")
+    parser.add_argument("--seed", type=int, default=0)
+    defaults = Faults()
+    parser.add_argument("--latency", choices=("fixed", "uniform", "lognormal"),
+                        default=defaults.latency)
+    for f in fields(Faults):
+        if f.name != "latency":
+            flag = f"--{f.name.replace('_', '-')}"
+            parser.add_argument(flag, type=type(f.default), default=f.default)
+    args = parser.parse_args(argv)
+
+    book = {}
+    if args.carnet:
+        with open(args.carnet, encoding="utf-8") as fh:
+            book = {address: tuple(coords) for address, coords in json.load(fh).items()}
+    faults = Faults(**{f.name: getattr(args, f.name) for f in fields(Faults)})
+    google = FakeGoogle(book, faults, seed=args.seed, strict=args.strict)
+    server = FakeGoogleServer(google, args.host, args.port)
+    print(f"Google factice sur {server.base_url} — GOOGLE_MAPS_BASE_URL={server.base_url}",
+          flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,152 @@
+# bench/fake_routing.py
+"""
+Fournisseur de routage factice et déterministe, branché à la place de
+`main.session.get` : il répond aux URLs Google (geocode / directions /
+distancematrix) avec des durées calculées à partir des coordonnées.
+"""
+import datetime
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import Counter
+from zoneinfo import ZoneInfo
+
+ROAD_FACTOR = 1.3          # distance route ≈ vol d'oiseau × 1.3
+AVG_SPEED_KMH = 65.0       # vitesse moyenne porte-à-porte
+RUSH_HOURS = {7, 8, 17, 18}   # en semaine : durée avec trafic × RUSH_FACTOR
+LOCAL_TZ = ZoneInfo("Europe/Paris")   # heure locale des rosters (comme Google au départ)
+RUSH_FACTOR = 1.4
+
+
+def haversine_km(a: tuple[float, float], b: tuple[float, float]) -> float:
+    """a, b en (lng, lat), comme dans main.py."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+class FakeResponse:
+    def __init__(self, payload: dict, status_code: int = 200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def json(self) -> dict:
+        return self._payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class FakeRoutingProvider:
+    """
+    - `address_book` : adresse → (lng, lat) ; adresse inconnue → ZERO_RESULTS
+    - `latency_ms` / `jitter_ms` : délai simulé par appel
+    - `calls` : nombre d'appels par endpoint ("geocode", "directions", ...)
+    - `elements` : éléments facturés par endpoint (origines × destinations
+      pour Distance Matrix, 1 sinon)
+    - avec departure_time, Distance Matrix renvoie aussi duration_in_traffic
+      (heures de pointe en semaine plus lentes)
+    """
+
+    def __init__(self, address_book: dict | None = None, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, seed: int = 0):
+        self.address_book = dict(address_book or {})
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls: Counter = Counter()
+        self.elements: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # -- modèle de durée --------------------------------------------------
+    @staticmethod
+    def leg(origin: tuple[float, float], destination: tuple[float, float]) -> tuple[int, int]:
+        """(durée s, distance m) déterministes pour un tronçon."""
+        km = haversine_km(origin, destination) * ROAD_FACTOR
+        # ±10 % stable par couple, pour casser les égalités parfaites
+        digest = hashlib.blake2b(repr((origin, destination)).encode(), digest_size=2).digest()
+        noise = 0.9 + 0.2 * int.from_bytes(digest, "big") / 0xFFFF
+        seconds = int(round(60 + km / AVG_SPEED_KMH * 3600 * noise))
+        return seconds, int(round(km * 1000))
+
+    @staticmethod
+    def traffic_factor(departure_time: int) -> float:
+        """Multiplicateur de duration_in_traffic pour un départ (horodatage)."""
+        depart = datetime.datetime.fromtimestamp(departure_time, LOCAL_TZ)
+        return RUSH_FACTOR if depart.weekday() < 5 and depart.hour in RUSH_HOURS else 1.0
+
+    # -- interface requests.Session.get ------------------------------------
+    def _sleep(self) -> None:
+        if self.latency_ms or self.jitter_ms:
+            with self._lock:
+                extra = self._rng.uniform(0, self.jitter_ms)
+            time.sleep((self.latency_ms + extra) / 1000.0)
+
+    def get(self, url: str, params: dict | None = None, timeout=None) -> FakeResponse:
+        params = params or {}
+        if url.endswith("/json"):
+            endpoint = url.rstrip("/").split("/")[-2]
+        else:
+            endpoint = url.rsplit("/", 1)[-1]
+        billed = 1
+        if endpoint == "distancematrix":
+            billed = len(params["origins"].split("|")) * len(params["destinations"].split("|"))
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.elements[endpoint] += billed
+        self._sleep()
+
+        if endpoint == "geocode":
+            loc = self.address_book.get(params.get("address", ""))
+            if loc is None:
+                return FakeResponse({"status": "ZERO_RESULTS", "results": []})
+            return FakeResponse({
+                "status": "OK",
+                "results": [{"geometry": {"location": {"lat": loc[1], "lng": loc[0]}}}],
+            })
+        if endpoint == "directions":
+            origin = _parse_latlng(params["origin"])
+            destination = _parse_latlng(params["destination"])
+            seconds, meters = self.leg(origin, destination)
+            return FakeResponse({
+                "status": "OK",
+                "routes": [
+                    {"legs": [{"duration": {"value": seconds}, "distance": {"value": meters}}]}
+                ],
+            })
+        if endpoint == "distancematrix":
+            origins = [_parse_latlng(o) for o in params["origins"].split("|")]
+            destinations = [_parse_latlng(d) for d in params["destinations"].split("|")]
+            departure = params.get("departure_time")
+            factor = self.traffic_factor(int(departure)) if departure else None
+            rows = []
+            for origin in origins:
+                elements = []
+                for destination in destinations:
+                    seconds, meters = self.leg(origin, destination)
+                    element = {
+                        "status": "OK",
+                        "duration": {"value": seconds},
+                        "distance": {"value": meters},
+                    }
+                    if factor is not None:
+                        element["duration_in_traffic"] = {"value": int(seconds * factor)}
+                    elements.append(element)
+                rows.append({"elements": elements})
+            return FakeResponse({"status": "OK", "rows": rows})
+        if endpoint == "generate_204":
+            return FakeResponse({}, status_code=204)
+        raise AssertionError(f"URL inattendue : {url}")
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.elements.clear()
+
+
+def _parse_latlng(value: str) -> tuple[float, float]:
+    lat, lng = (float(x) for x in value.split(","))
+    return (lng, lat)
@@ -0,0 +1,440 @@
+# bench/loadtest.py
+"""
+Scénario de charge « samedi matin » contre l'API complète (HTTP + WebSockets),
+pour dimensionner les workers et bloquer une release qui régresse.
+
+    python -m bench.loadtest --duration 60 --teams 20 --players 300
+    python -m bench.loadtest --target http://localhost:8000      # API déjà lancée
+    python -m bench.loadtest --json out.json --max-p95-ms 800 --max-error-rate 0.01
+
+Sans --target, le script lance sa propre API (uvicorn, SQLite jetable) avec
+le fournisseur de routage factice : aucun appel Google. --google-url
+http://127.0.0.1:8765 fait passer ce routage par bench.fake_google_server
+(vraie pile HTTP, retries, disjoncteur). Avec --target, le routage est celui
+de l'API visée.
+
+Trafic modélisé, façon Locust (utilisateurs virtuels + temps de pause) :
+- coachs : rafale de /auth/login à l'ouverture, puis /teams/{id}/carpool/optimize
+  et relecture du plan,
+- joueurs : à l'envoi des SMS (--sms-at s), des centaines de
+  /events/{id}/trips/player/{token},
+- voitures : /ws/location (le conducteur publie sa position, les passagers
+  la reçoivent) et /ws/chat ouverts toute la durée.
+
+Rapport par endpoint : requêtes, erreurs, p50 / p95 / p99 (ms), débit. Pour
+les sockets, la latence est celle d'un message (position publiée → reçue par
+un passager, message de chat → écho).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+import websockets
+
+from bench.rosters import VENUES, make_roster
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PASSWORD = "charge-samedi"
+
+
+# -------------------------------------------------------------------
+# Mesures
+# -------------------------------------------------------------------
+class Stats:
+    """Latences (s) et erreurs par nom d'endpoint."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def record(self, name: str, seconds: float, ok: bool = True) -> None:
+        self.latencies[name].append(seconds)
+        if not ok:
+            self.errors[name] += 1
+
+    def error(self, name: str) -> None:
+        self.errors[name] += 1
+
+    @staticmethod
+    def percentile(values: list[float], q: float) -> float:
+        """Percentile au rang le plus proche (q entre 0 et 100)."""
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def report(self) -> list[dict]:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        rows = []
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies[name]
+            count = max(len(values), self.errors[name])
+            rows.append({
+                "endpoint": name,
+                "requetes": count,
+                "erreurs": self.errors[name],
+                "taux_erreur": round(self.errors[name] / count, 4) if count else 0.0,
+                "p50_ms": round(self.percentile(values, 50) * 1000, 1),
+                "p95_ms": round(self.percentile(values, 95) * 1000, 1),
+                "p99_ms": round(self.percentile(values, 99) * 1000, 1),
+                "rps": round(len(values) / elapsed, 2),
+            })
+        return rows
+
+
+async def _timed(stats: Stats, name: str, call) -> httpx.Response | None:
+    start = time.perf_counter()
+    try:
+        response = await call
+    except httpx.HTTPError:
+        stats.record(name, time.perf_counter() - start, ok=False)
+        return None
+    stats.record(name, time.perf_counter() - start, ok=response.status_code < 400)
+    return response
+
+
+# -------------------------------------------------------------------
+# Jeu de données : une équipe = un coach, un effectif, un match
+# -------------------------------------------------------------------
+@dataclass
+class TeamFixture:
+    email: str
+    team_id: int
+    payload: dict
+    event_id: int = 0
+    tokens: list[str] = field(default_factory=list)
+    voitures: list[str] = field(default_factory=list)
+
+
+def _team_roster(index: int, roster_size: int):
+    venue = VENUES[index % len(VENUES)][0]
+    return make_roster(roster_size, venue=venue, seed=1000 + index)
+
+
+def address_book(teams: int, roster_size: int) -> dict:
+    book: dict = {}
+    for index in range(teams):
+        book.update(_team_roster(index, roster_size).address_book)
+    return book
+
+
+async def prepare(
+    client: httpx.AsyncClient, teams: int, roster_size: int, run_id: str
+) -> list[TeamFixture]:
+    """Crée coachs, équipes, joueurs et un premier plan par équipe (hors mesures)."""
+
+    async def one(index: int) -> TeamFixture:
+        roster = _team_roster(index, roster_size)
+        email = f"coach{index}-{run_id}@charge.test"
+        user = {"email": email, "full_name": f"Coach {index}", "password": PASSWORD}
+        r = await client.post("/auth/register", json=user)
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        team = {"code": f"charge-{run_id}-{index}", "name": f"Charge {index}"}
+        r = await client.post("/teams", json=team, headers=headers)
+        r.raise_for_status()
+        team_id = r.json()["id"]
+        ids, tokens = [], []
+        for p in roster.participants:
+            member = {"name": p["name"], "address": p["address"]}
+            r = await client.post(f"/teams/{team_id}/participants", json=member, headers=headers)
+            r.raise_for_status()
+            ids.append(r.json()["id"])
+            tokens.append(r.json()["token"])
+        payload = {"participant_ids": ids, "event_address": roster.destination}
+        fixture = TeamFixture(email, team_id, payload, tokens=tokens)
+        r = await client.post(
+            f"/teams/{team_id}/carpool/optimize", json=fixture.payload, headers=headers
+        )
+        r.raise_for_status()
+        fixture.voitures = [t["voiture"] for t in r.json()["trajets"]]
+        r = await client.get(f"/teams/{team_id}/events", headers=headers)
+        r.raise_for_status()
+        fixture.event_id = r.json()[0]["id"]
+        return fixture
+
+    return list(await asyncio.gather(*(one(i) for i in range(teams))))
+
+
+# -------------------------------------------------------------------
+# Utilisateurs virtuels
+# -------------------------------------------------------------------
+async def coach(client: httpx.AsyncClient, stats: Stats, fixture: TeamFixture, deadline: float,
+                wait: float) -> None:
+    r = await _timed(stats, "POST /auth/login", client.post(
+        "/auth/login", data={"username": fixture.email, "password": PASSWORD}))
+    if r is None or r.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    while time.perf_counter() < deadline:
+        await _timed(stats, "POST /teams/{id}/carpool/optimize", client.post(
+            f"/teams/{fixture.team_id}/carpool/optimize", json=fixture.payload, headers=headers))
+        await _timed(stats, "GET /teams/{id}/events", client.get(
+            f"/teams/{fixture.team_id}/events", headers=headers))
+        await asyncio.sleep(random.uniform(0.5, 1.5) * wait)
+
+
+async def player(client: httpx.AsyncClient, stats: Stats, fixtures: list[TeamFixture],
+                 deadline: float, wait: float) -> None:
+    while time.perf_counter() < deadline:
+        fixture = random.choice(fixtures)
+        token = random.choice(fixture.tokens)
+        await _timed(stats, "GET /events/{id}/trips/player/{token}", client.get(
+            f"/events/{fixture.event_id}/trips/player/{token}"))
+        await asyncio.sleep(random.uniform(0.5, 1.5) * wait)
+
+
+async def car_sockets(ws_url: str, stats: Stats, event_id: int, voiture: str, deadline: float,
+                      interval: float, passengers: int) -> None:
+    """Un conducteur qui publie sa position, des passagers abonnés, un salon de chat."""
+    location = f"{ws_url}/ws/location/{event_id}/{voiture.replace(' ', '%20')}"
+    chat = f"{ws_url}/ws/chat/{event_id}/{voiture.replace(' ', '%20')}"
+
+    async def connect(name: str, url: str):
+        start = time.perf_counter()
+        try:
+            ws = await websockets.connect(url)
+        except (OSError, websockets.WebSocketException):
+            stats.record(name, time.perf_counter() - start, ok=False)
+            return None
+        stats.record(name, time.perf_counter() - start)
+        return ws
+
+    async def passenger() -> None:
+        ws = await connect("WS /ws/location connect", f"{location}?role=passenger")
+        if ws is None:
+            return
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), deadline - time.perf_counter())
+                    message = json.loads(raw)
+                except TimeoutError:
+                    break
+                if "ts" in message:
+                    stats.record("WS /ws/location position", time.time() - message["ts"])
+        except websockets.WebSocketException:
+            stats.error("WS /ws/location position")
+        finally:
+            await ws.close()
+
+    async def driver() -> None:
+        ws = await connect("WS /ws/location connect", f"{location}?role=driver")
+        if ws is None:
+            return
+        try:
+            while time.perf_counter() < deadline:
+                position = {"lat": 47.39 + random.random() / 100, "lng": 0.68, "ts": time.time()}
+                await ws.send(json.dumps(position))
+                await asyncio.sleep(interval)
+        except websockets.WebSocketException:
+            stats.error("WS /ws/location position")
+        finally:
+            await ws.close()
+
+    async def talker() -> None:
+        ws = await connect("WS /ws/chat connect", chat)
+        if ws is None:
+            return
+        marker = f"{voiture}-{random.random()}"
+        try:
+            while time.perf_counter() < deadline:
+                sent = time.time()
+                await ws.send(json.dumps({"nom": marker, "msg": "j'arrive", "ts": sent}))
+                while True:   # historique et messages des autres avant notre écho
+                    message = json.loads(await asyncio.wait_for(ws.recv(), 10))
+                    if message.get("nom") == marker and message.get("ts") == sent:
+                        stats.record("WS /ws/chat message", time.time() - sent)
+                        break
+                await asyncio.sleep(interval * 3)
+        except (TimeoutError, websockets.WebSocketException):
+            stats.error("WS /ws/chat message")
+        finally:
+            await ws.close()
+
+    await asyncio.gather(driver(), talker(), *(passenger() for _ in range(passengers)))
+
+
+async def run_scenario(base_url: str, args) -> Stats:
+    run_id = f"{int(time.time())}{random.randint(0, 999)}"
+    limits = httpx.Limits(
+        max_connections=args.connections, max_keepalive_connections=args.connections
+    )
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        fixtures = await prepare(client, args.teams, args.roster_size, run_id)
+        stats = Stats()
+        start = time.perf_counter()
+        deadline = start + args.duration
+
+        async def players_after_sms() -> None:
+            await asyncio.sleep(min(args.sms_at, args.duration))
+            await asyncio.gather(*(player(client, stats, fixtures, deadline, args.player_wait)
+                                   for _ in range(args.players)))
+
+        ws_url = base_url.replace("http", "ws", 1)
+        cars = [(f.event_id, v) for f in fixtures for v in f.voitures][:args.cars]
+        await asyncio.gather(
+            *(coach(client, stats, f, deadline, args.coach_wait) for f in fixtures),
+            players_after_sms(),
+            *(car_sockets(ws_url, stats, event_id, voiture, deadline, args.ws_interval,
+                          args.passengers_per_car)
+              for event_id, voiture in cars),
+        )
+    return stats
+
+
+# -------------------------------------------------------------------
+# API locale avec routage factice
+# -------------------------------------------------------------------
+def serve(port: int, teams: int, roster_size: int, latency_ms: float,
+          google_url: str | None = None) -> None:
+    """
+    Lance l'API (uvicorn) sur une SQLite jetable, Google remplacé par
+    FakeRoutingProvider, ou par le serveur bench.fake_google_server à google_url.
+    """
+    db_file = Path(tempfile.mkdtemp(prefix="sportcov-charge-")) / "sportcov.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"   # jamais la base de l'appelant
+    if google_url:
+        os.environ["GOOGLE_MAPS_BASE_URL"] = google_url
+    os.environ.setdefault("GOOGLE_API_KEY", "charge")
+    os.environ.setdefault("GOOGLE_QPS", "1000000")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")   # on mesure l'API, pas le coût du hachage
+    sys.path.insert(0, str(ROOT_DIR / "api"))
+    import uvicorn
+
+    import main
+    import migrate
+    from bench.fake_routing import FakeRoutingProvider
+
+    migrate.run_migrations(main.engine)
+    if not google_url:
+        book = address_book(teams, roster_size)
+        main.session.get = FakeRoutingProvider(book, latency_ms=latency_ms).get
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_local_api(args) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.loadtest", "serve", "--port", str(port),
+         "--teams", str(args.teams), "--roster-size", str(args.roster_size),
+         "--latency-ms", str(args.latency_ms)]
+        + (["--google-url", args.google_url] if args.google_url else []),
+        cwd=ROOT_DIR,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        if proc.poll() is not None:
+            raise RuntimeError("l'API locale s'est arrêtée au démarrage")
+        try:
+            if httpx.get(f"{base_url}/healthz", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("l'API locale ne répond pas")
+
+
+# -------------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------------
+def _print_report(rows: list[dict]) -> None:
+    print(f"{'endpoint':42} {'req':>6} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>7}")
+    for row in rows:
+        print(f"{row['endpoint']:42} {row['requetes']:6d} {row['taux_erreur'] * 100:6.2f} "
+              f"{row['p50_ms']:8.1f} {row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['rps']:7.2f}")
+
+
+def main_cli(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    sub = parser.add_subparsers(dest="command")
+    server = sub.add_parser("serve", help="API locale avec routage factice (usage interne)")
+    server.add_argument("--port", type=int, required=True)
+    for p in (parser, server):
+        p.add_argument("--teams", type=int, default=10, help="équipes (un coach, un match chacune)")
+        p.add_argument("--roster-size", type=int, default=15, help="joueurs par équipe")
+        p.add_argument("--latency-ms", type=float, default=30.0, help="latence du routage factice")
+        p.add_argument("--google-url", default=None,
+                       help="routage par bench.fake_google_server à cette URL (pannes, quota)")
+    parser.add_argument("--target", default=None, help="URL d'une API déjà lancée")
+    parser.add_argument("--duration", type=float, default=60.0, help="durée des mesures (s)")
+    parser.add_argument("--players", type=int, default=200,
+                        help="joueurs simultanés après les SMS")
+    parser.add_argument("--sms-at", type=float, default=10.0,
+                        help="envoi des SMS (s après le début)")
+    parser.add_argument("--cars", type=int, default=20, help="voitures avec sockets ouvertes")
+    parser.add_argument("--passengers-per-car", type=int, default=3)
+    parser.add_argument("--ws-interval", type=float, default=2.0, help="période des positions (s)")
+    parser.add_argument("--coach-wait", type=float, default=5.0,
+                        help="pause moyenne d'un coach (s)")
+    parser.add_argument("--player-wait", type=float, default=2.0,
+                        help="pause moyenne d'un joueur (s)")
+    parser.add_argument("--connections", type=int, default=200, help="connexions HTTP simultanées")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", default=None, help="écrit le rapport dans ce fichier")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="code retour 1 si un p95 dépasse")
+    parser.add_argument("--max-error-rate", type=float, default=None,
+                        help="code retour 1 si un taux dépasse")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port, args.teams, args.roster_size, args.latency_ms, args.google_url)
+        return 0
+
+    proc = None
+    base_url = args.target
+    if base_url is None:
+        proc, base_url = _start_local_api(args)
+    try:
+        stats = asyncio.run(run_scenario(base_url.rstrip("/"), args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                # sockets passagers : le serveur ne les voit partir qu'au prochain ping
+                proc.kill()
+                proc.wait()
+
+    rows = stats.report()
+    _print_report(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2, ensure_ascii=False))
+
+    failed = [
+        row["endpoint"] for row in rows
+        if (args.max_p95_ms is not None and row["p95_ms"] > args.max_p95_ms)
+        or (args.max_error_rate is not None and row["taux_erreur"] > args.max_error_rate)
+    ]
+    for name in failed:
+        print(f"### seuil dépassé : {name}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
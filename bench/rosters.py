@@ -0,0 +1,63 @@
+# bench/rosters.py
+"""Effectifs synthétiques autour de vrais stades / gymnases français."""
+import math
+import random
+from dataclasses import dataclass
+
+# (nom, adresse, (lng, lat))
+VENUES = [
+    ("amboise", "Stade de l'Île d'Or, Amboise", (0.9871, 47.4159)),
+    ("tours", "Stade de la Vallée du Cher, Tours", (0.7015, 47.3745)),
+    ("blois", "Stade des Allées, Blois", (1.3202, 47.5741)),
+    ("orleans", "Stade Omnisports de la Source, Orléans", (1.9380, 47.8460)),
+    ("angers", "Stade Raymond Kopa, Angers", (-0.5300, 47.4603)),
+    ("poitiers", "Stade Rébeilleau, Poitiers", (0.3526, 46.5920)),
+    ("lyon", "Gymnase Jean Jaurès, Lyon", (4.8383, 45.7399)),
+    ("nantes", "Complexe sportif Mangin Beaulieu, Nantes", (-1.5317, 47.2112)),
+]
+
+# communes de résidence typiques d'un club de l'Indre-et-Loire (lng, lat)
+HOME_TOWNS = [
+    ("Tours", "37000", (0.6848, 47.3941)),
+    ("Joué-lès-Tours", "37300", (0.6630, 47.3524)),
+    ("Saint-Cyr-sur-Loire", "37540", (0.6676, 47.4004)),
+    ("Montlouis-sur-Loire", "37270", (0.8275, 47.3886)),
+    ("Amboise", "37400", (0.9828, 47.4125)),
+    ("Chambray-lès-Tours", "37170", (0.7144, 47.3347)),
+    ("Fondettes", "37230", (0.5977, 47.4039)),
+    ("Vouvray", "37210", (0.7988, 47.4108)),
+]
+
+STREETS = ["rue Nationale", "avenue de Grammont", "rue de la Loire", "boulevard Béranger",
+           "rue des Écoles", "allée des Tilleuls", "chemin des Vignes", "place du Marché"]
+
+
+@dataclass
+class Roster:
+    participants: list[dict]
+    destination: str
+    address_book: dict[str, tuple[float, float]]
+
+
+def make_roster(size: int, venue: str = "amboise", seed: int = 0, spread_km: float = 6.0) -> Roster:
+    """`size` joueurs dispersés autour de HOME_TOWNS, à destination de `venue`."""
+    rng = random.Random(f"{seed}-{size}-{venue}")
+    _, dest_address, dest_coords = next(v for v in VENUES if v[0] == venue)
+    book = {dest_address: dest_coords}
+    participants = []
+    for i in range(size):
+        town, postcode, (lng, lat) = rng.choice(HOME_TOWNS)
+        # décalage aléatoire (~spread_km) autour du centre de la commune
+        dist = abs(rng.gauss(0, spread_km / 2))
+        angle = rng.uniform(0, 2 * math.pi)
+        dlat = dist / 111.0 * math.sin(angle)
+        dlng = dist / (111.0 * math.cos(math.radians(lat))) * math.cos(angle)
+        address = f"{i + 1} {rng.choice(STREETS)}, {postcode} {town}, France"
+        book[address] = (round(lng + dlng, 6), round(lat + dlat, 6))
+        participants.append({
+            "name": f"Joueur {i + 1:03d}",
+            "address": address,
+            "email": f"joueur{i + 1}@club.test",
+            "telephone": f"06{i:08d}",
+        })
+    return Roster(participants=participants, destination=dest_address, address_book=book)
@@ -0,0 +1,79 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# L'API (api/main.py) s'importe sans accès BDD : une base SQLite jetable suffit
+ROOT_DIR = Path(__file__).resolve().parent.parent
+API_DIR = ROOT_DIR / "api"
+_DB_FILE = Path(tempfile.mkdtemp(prefix="sportcov-tests-")) / "sportcov.db"
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_FILE}")
+os.environ.setdefault("GOOGLE_API_KEY", "dummy")
+os.environ.setdefault("GOOGLE_QPS", "100000")  # pas de limitation de débit en test
+os.environ.setdefault("VENUE_REFRESH_WORKERS", "0")  # recalcul des lieux appelé explicitement
+for _path in (API_DIR, ROOT_DIR):  # api/ (main, auth...) et bench/
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    import main
+    import migrate
+
+    migrate.run_migrations(main.engine)
+    return main
+
+
+@pytest.fixture
+def client(main_module):
+    return TestClient(main_module.app)
+
+
+@pytest.fixture
+def cold_caches(main_module):
+    """Départ à froid complet : caches mémoire et table geocodes de la base de test."""
+    def reset():
+        with main_module.SessionLocal() as db:
+            db.query(main_module.GeocodeORM).delete()
+            db.commit()
+        main_module.clear_provider_caches()
+
+    return reset
+
+
+@pytest.fixture
+def register(client):
+    """Inscrit un coach (admin, comme tout premier compte) et renvoie son en-tête Bearer."""
+    def _register(email, full_name="Coach"):
+        user = {"email": email, "full_name": full_name, "password": "secret"}
+        r = client.post("/auth/register", json=user)
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    return _register
+
+
+@pytest.fixture
+def team_with_roster(client, register):
+    """Équipe créée par un coach, un participant par ligne du roster.
+
+    ``team_with_roster(roster.participants, email=..., code=..., name=...)`` renvoie
+    ``(headers, team_id, ids)`` ; ``headers=`` réutilise un coach déjà inscrit.
+    """
+    def build(participants, *, code, name, email=None, headers=None):
+        headers = headers or register(email)
+        team = {"code": code, "name": name}
+        team_id = client.post("/teams", json=team, headers=headers).json()["id"]
+        url = f"/teams/{team_id}/participants"
+        ids = [
+            client.post(url, json={"name": p["name"], "address": p["address"]}, headers=headers)
+            .json()["id"]
+            for p in participants
+        ]
+        return headers, team_id, ids
+
+    return build
@@ -0,0 +1,54 @@
+# tests/test_addresses.py
+from unittest.mock import patch
+
+from addresses import AddressKey, GeocodeIndex, address_key, clean_address
+from bench.fake_routing import FakeRoutingProvider
+
+
+def test_spellings_of_one_address_share_a_key():
+    key = address_key("10 rue Nationale, Tours")
+    assert key == AddressKey("10 rue nationale tours", "")
+    expected = AddressKey("10 rue nationale tours", "37000")
+    assert address_key("10 Rue  Nationale , 37000 Tours, France") == expected
+    assert address_key("10 r. Nationale, TOURS") == key
+    boulevard = address_key("3 Boulevard Beranger, Tours").text
+    assert address_key("3 bd Béranger, Tours").text == boulevard
+    assert clean_address("  10 Rue  Nationale ,37000 Tours ,, ") == "10 Rue Nationale, 37000 Tours"
+
+
+def test_index_matches_a_missing_postcode_only_when_unambiguous():
+    index = GeocodeIndex()
+    index.put(address_key("1 place de la mairie, 37000 Tours"), (0.68, 47.39))
+    assert index.get(address_key("1 Pl. de la Mairie, Tours")) == (0.68, 47.39)
+    assert index.get(address_key("1 place de la mairie, 37100 Tours")) is None
+    index.put(address_key("1 place de la mairie, 37100 Tours"), (0.70, 47.42))
+    assert index.get(address_key("1 place de la mairie, Tours")) is None
+    assert index.get(address_key("1 place de la mairie, 37100 Tours, France")) == (0.70, 47.42)
+
+
+def test_each_physical_address_is_geocoded_once(main_module, client, cold_caches):
+    book = {
+        "12 avenue Grammont, 37000 Tours": (0.6894, 47.3836),
+        "Stade des Allées, Blois": (1.3202, 47.5741),
+        "4 rue Colbert, Tours": (0.6900, 47.3960),
+    }
+    provider = FakeRoutingProvider(book)
+    payload = {
+        "participants": [
+            {"name": "Alice", "address": "12 avenue Grammont, 37000 Tours"},
+            {"name": "Bob", "address": "12 Av. Grammont,  Tours, France"},
+            {"name": "Chloé", "address": "4 rue Colbert, Tours"},
+        ],
+        "destination": "Stade des Allées, Blois",
+    }
+
+    cold_caches()
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        assert client.post("/optimiser_direct", json=payload).status_code == 200
+        assert provider.calls["geocode"] == 3   # Bob réutilise le géocodage d'Alice
+
+        # caches mémoire vidés (redémarrage) : la table geocodes suffit
+        main_module.clear_provider_caches()
+        provider.reset()
+        assert client.post("/optimiser_direct", json=payload).status_code == 200
+    assert provider.calls["geocode"] == 0
@@ -0,0 +1,111 @@
+# tests/test_auth.py
+from sqlalchemy import event
+
+import auth
+
+
+def test_login_answers_503_when_the_hash_pool_is_full(main_module, client, register, monkeypatch):
+    register("pool@club.test")
+    pool = auth._HashPool(workers=1, queue_max=0)
+    pool.pending = 1   # un hachage déjà en cours
+    monkeypatch.setattr(auth, "_hash_pool", pool)
+
+    login = {"username": "pool@club.test", "password": "secret"}
+    assert client.post("/auth/login", data=login).status_code == 503
+    assert (pool.stats()["rejected"], pool.stats()["completed"]) == (1, 0)
+
+    pool.pending = 0
+    assert client.post("/auth/login", data=login).status_code == 200
+    assert pool.stats()["completed"] == 1
+
+
+def test_login_rehashes_when_the_cost_changes(main_module, client, register, monkeypatch):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    register("rehash@club.test")
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+
+    r = client.post("/auth/login", data={"username": "rehash@club.test", "password": "secret"})
+    assert r.status_code == 200
+    with auth._SessionLocal() as db:
+        stored = db.query(auth.UserORM).filter_by(email="rehash@club.test").one().password_hash
+    assert stored.startswith("$2b$05$") and auth._verify("secret", stored)
+
+
+def test_hashing_diagnostics_require_an_admin(main_module, client, register):
+    assert client.get("/auth/_diag/hashing").status_code == 401
+    r = client.get("/auth/_diag/hashing", headers=register("diag@club.test"))
+    assert r.status_code == 200 and r.json()["capacity"] >= 1
+
+
+def _statements_on_users(engine):
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    return seen, lambda: event.remove(engine, "before_cursor_execute", record)
+
+
+def test_principal_is_cached_between_requests(main_module, client, register):
+    headers = register("cache@club.test")
+    auth.invalidate_principal()
+    seen, stop = _statements_on_users(auth._engine)
+    try:
+        for _ in range(3):
+            assert client.get("/auth/me", headers=headers).status_code == 200
+    finally:
+        stop()
+    assert len(seen) == 1   # une lecture, puis le cache jusqu'à PRINCIPAL_CACHE_TTL
+
+
+def test_role_change_invalidates_tokens_and_the_local_cache(main_module, client, register):
+    admin = register("roles-admin@club.test")
+    coach = register("roles-coach@club.test")
+    coach_id = client.get("/auth/me", headers=coach).json()["id"]   # principal en cache
+
+    r = client.patch(f"/auth/users/{coach_id}/role", params={"is_admin": False}, headers=admin)
+    assert r.json()["role"] == "coach"
+    # même process : cache invalidé, ancien token (ver périmé) refusé tout de suite
+    assert client.get("/auth/me", headers=coach).status_code == 401
+
+    login = {"username": "roles-coach@club.test", "password": "secret"}
+    token = client.post("/auth/login", data=login).json()["access_token"]
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"}).json()
+    assert me["is_admin"] is False
+
+
+def test_other_workers_see_a_role_change_within_the_cache_ttl(main_module, client, register):
+    headers = register("ttl@club.test")
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+
+    # rôle changé par un autre worker : notre cache n'est pas invalidé
+    with auth._SessionLocal() as db:
+        user = db.get(auth.UserORM, user_id)
+        user.is_admin, user.token_version = False, user.token_version + 1
+        db.commit()
+    assert client.get("/auth/me", headers=headers).status_code == 200   # ancien rôle, au plus TTL
+
+    expires, principal = auth._principal_cache[user_id]
+    # TTL écoulé
+    auth._principal_cache[user_id] = (expires - auth.PRINCIPAL_CACHE_TTL - 1, principal)
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_a_token_newer_than_the_cache_reloads_the_principal(main_module, client, register):
+    headers = register("relogin@club.test")
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+
+    # rôle changé par un autre worker, puis nouvelle connexion : ver = n + 1
+    with auth._SessionLocal() as db:
+        user = db.get(auth.UserORM, user_id)
+        user.is_admin, user.token_version = False, user.token_version + 1
+        db.commit()
+    login = {"username": "relogin@club.test", "password": "secret"}
+    token = client.post("/auth/login", data=login).json()["access_token"]
+
+    # notre cache tient encore ver = n : relu en BDD au lieu d'un 401
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert me.status_code == 200 and me.json()["is_admin"] is False
+    assert client.get("/auth/me", headers=headers).status_code == 401
@@ -0,0 +1,53 @@
+# tests/test_batch_cli.py
+import json
+import os
+import subprocess
+import sys
+
+from conftest import API_DIR, ROOT_DIR
+
+from bench.rosters import make_roster
+
+
+def _run(tmp_path, *args):
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "GOOGLE_API_KEY")}
+    env["SOLVER_INLINE_BELOW"] = "1000"
+    cache = str(tmp_path / "cache.sqlite")
+    proc = subprocess.run(
+        [sys.executable, str(API_DIR / "batch_cli.py"), *args, "--cache-db", cache],
+        capture_output=True, text=True, cwd=ROOT_DIR, env=env, timeout=120,
+    )
+    out = [json.loads(line) for line in proc.stdout.splitlines()]
+    return proc, out, json.loads(proc.stderr.splitlines()[-1])
+
+
+def test_cli_streams_results_in_order_and_keeps_the_geocode_cache(tmp_path):
+    roster = make_roster(10, seed=51)
+    book = tmp_path / "carnet.json"
+    book.write_text(json.dumps(roster.address_book))
+    players, destination = roster.participants, roster.destination
+    nowhere = [{"name": "X", "address": "nulle part"}]
+    records = [
+        {"id": "u13", "participants": players[:6], "destination": destination},
+        {"id": "u15", "participants": players[4:], "destination": destination,
+         "aller_retour": True},
+        {"id": "inconnu", "participants": nowhere, "destination": destination},
+        {"participants": "pas une liste"},
+    ]
+    plans = tmp_path / "plans.jsonl"
+    plans.write_text("\n".join(json.dumps(r) for r in records) + "\n")
+
+    proc, out, summary = _run(tmp_path, str(plans), "--fake-routing", str(book), "--workers", "3")
+    assert proc.returncode == 1   # au moins une entrée en erreur
+    assert [o["ligne"] for o in out] == [1, 2, 3, 4]
+    assert [o.get("id") for o in out[:3]] == ["u13", "u15", "inconnu"]
+    assert sum(len(t["passagers"]) + 1 for t in out[0]["resultat"]["trajets"]) == 6
+    assert out[1]["resultat"]["retour"]["trajets"]
+    assert out[2]["erreur"]["status"] == 400 and out[3]["erreur"]["status"] == 422
+    assert all(o["duree_s"] >= 0 for o in out)
+    assert summary["lignes"] == 4 and summary["erreurs"] == 2
+
+    # relance de nuit : géocodages relus depuis --cache-db
+    _, again, summary = _run(tmp_path, str(plans), "--fake-routing", str(book))
+    assert again[0]["resultat"] == out[0]["resultat"]
+    assert summary["appels_fournisseur"]["geocode"] == 1   # l'adresse introuvable seulement
@@ -0,0 +1,43 @@
+# tests/test_bench.py
+import json
+
+from bench.bench_optimiser import compare, run_case
+from bench.loadtest import Stats
+from bench.loadtest import main_cli as loadtest_cli
+
+
+def test_bench_is_deterministic(main_module):
+    a = run_case(10, (3, 1.5), "amboise", seed=1, latency_ms=0, repeat=1)
+    b = run_case(10, (3, 1.5), "amboise", seed=1, latency_ms=0, repeat=1)
+    assert a["cars"] == b["cars"] >= 1
+    assert a["provider_calls"] == b["provider_calls"]
+    assert a["total_detour_s"] == b["total_detour_s"] >= 0
+
+
+def test_compare_flags_call_volume_regression(main_module):
+    base = run_case(5, (3, 1.5), "amboise", seed=1, latency_ms=0, repeat=1)
+    worse = dict(base, provider_calls_total=base["provider_calls_total"] + 10)
+    assert compare([base], [base], 0.2) == []
+    assert len(compare([worse], [base], 0.2)) == 1
+
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]   # 1 à 100 ms
+    assert [Stats.percentile(values, q) for q in (50, 95, 99)] == [0.05, 0.095, 0.099]
+    assert Stats.percentile([], 95) == 0.0
+
+
+def test_load_scenario_reports_every_endpoint_and_gates(tmp_path):
+    out = tmp_path / "charge.json"
+    code = loadtest_cli([
+        "--duration", "2", "--teams", "2", "--roster-size", "6", "--players", "5",
+        "--sms-at", "0.5", "--cars", "1", "--passengers-per-car", "1", "--ws-interval", "0.3",
+        "--coach-wait", "0.5",
+        "--player-wait", "0.2", "--latency-ms", "0", "--json", str(out), "--max-error-rate", "0",
+    ])
+    rows = {row["endpoint"]: row for row in json.loads(out.read_text())}
+    assert code == 0
+    assert {"POST /auth/login", "POST /teams/{id}/carpool/optimize",
+            "GET /events/{id}/trips/player/{token}",
+            "WS /ws/location position", "WS /ws/chat message"} <= set(rows)
+    assert all(row["erreurs"] == 0 and row["p99_ms"] >= row["p50_ms"] for row in rows.values())
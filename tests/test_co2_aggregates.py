@@ -0,0 +1,58 @@
+# tests/test_co2_aggregates.py
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def _summed_from_trips(main_module, team_id):
+    """Ce que la page CO₂ re-sommait avant : tout trip_co2 de l'équipe."""
+    with main_module.SessionLocal() as db:
+        return db.execute(
+            select(func.count(), func.sum(main_module.TripCO2ORM.co2_voiture_kg))
+            .join(main_module.EventORM, main_module.EventORM.id == main_module.TripCO2ORM.event_id)
+            .where(main_module.EventORM.team_id == team_id)
+        ).one()
+
+
+def test_season_totals_follow_saves_and_recomputes(main_module, client, team_with_roster):
+    roster = make_roster(7, venue="angers", seed=17)
+    provider = FakeRoutingProvider(roster.address_book)
+    headers, team_id, ids = team_with_roster(
+        roster.participants, email="co2@club.test", code="cadets", name="Cadets"
+    )
+
+    plans = []
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        for date in ("2025-09-14T15:00:00", "2026-03-01T15:00:00", "2026-09-06T15:00:00"):
+            payload = {"participant_ids": ids, "event_address": roster.destination,
+                       "event_date": date}
+            url = f"/teams/{team_id}/carpool/optimize"
+            plans.append(client.post(url, json=payload, headers=headers).json())
+
+        body = client.get("/co2/seasons", headers=headers).json()
+        (equipe,) = body["equipes"]
+        assert [s["libelle"] for s in equipe["saisons"]] == ["2026-2027", "2025-2026"]
+        assert equipe["saisons"][1]["nb_evenements"] == 2
+        assert body["club"] == equipe["saisons"]
+        saved = plans[0]["co2_economise_kg"] + plans[1]["co2_economise_kg"]
+        assert equipe["saisons"][1]["co2_kg"] == round(saved, 2)
+
+        # recalcul en aller-retour : l'ancien plan est retiré, le nouveau ajouté
+        events = client.get(f"/teams/{team_id}/events", headers=headers).json()
+        (first,) = [e for e in events if e["event_date"].startswith("2025-09-14")]
+        data = {"participants": roster.participants, "destination": roster.destination,
+                "aller_retour": True}
+        redone = client.post(f"/events/{first['id']}/recompute", json=data).json()
+
+    body = client.get("/co2/seasons?saison=2025", headers=headers).json()
+    (saison,) = body["equipes"][0]["saisons"]
+    assert saison["nb_evenements"] == 2
+    cars = len(redone["trajets"]) + len(redone["retour"]["trajets"]) + len(plans[1]["trajets"])
+    assert saison["nb_voitures"] == cars
+    total_cars, total_kg = _summed_from_trips(main_module, team_id)
+    totals = client.get("/co2/seasons", headers=headers).json()["club"]
+    assert sum(s["nb_voitures"] for s in totals) == total_cars
+    assert abs(sum(s["co2_kg"] for s in totals) - total_kg) < 0.02
@@ -0,0 +1,79 @@
+# tests/test_fake_google.py
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from bench.fake_google_server import FakeGoogle, FakeGoogleServer, Faults
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def test_api_runs_against_the_stand_in_server(main_module, monkeypatch, cold_caches):
+    roster = make_roster(8, venue="poitiers", seed=21)
+    data = main_module.InputData(
+        participants=[
+            main_module.Participant(name=p["name"], address=p["address"])
+            for p in roster.participants
+        ],
+        destination=roster.destination,
+    )
+    cold_caches()
+    provider = FakeRoutingProvider(roster.address_book)
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        in_process = main_module._run_optimisation(data)
+
+    cold_caches()
+    google = FakeGoogle(roster.address_book, Faults(latency="uniform", latency_ms=2, jitter_ms=1))
+    with FakeGoogleServer(google) as server:
+        monkeypatch.setattr(main_module, "GOOGLE_MAPS_BASE_URL", server.base_url)
+        over_http = main_module._run_optimisation(data)
+        stats = requests.get(f"{server.base_url}/_stats").json()
+
+    # même géométrie que le fournisseur en mémoire, mais à travers la vraie pile HTTP
+    assert [t.conducteur for t in over_http.trajets] == [t.conducteur for t in in_process.trajets]
+    assert stats["calls"]["geocode"] == 9
+    assert stats["billed"] >= 9 + stats["calls"]["distancematrix"]
+    assert stats["faults"] == {}
+
+
+def test_stand_in_injects_faults_and_exhausts_its_quota():
+    with FakeGoogleServer(FakeGoogle(faults=Faults(quota=3))) as server:
+        geocode = f"{server.base_url}/maps/api/geocode/json"
+        unknown = {"address": "12 rue Nationale, Tours", "key": "k"}
+        first = requests.get(geocode, params=unknown).json()
+        again = requests.get(geocode, params=unknown).json()
+        # adresse inconnue mais stable
+        assert first["status"] == "OK" and again["results"] == first["results"]
+        assert requests.get(geocode, params={"address": "x"}).json()["status"] == "REQUEST_DENIED"
+
+        matrix = {"origins": "47.39,0.68|47.40,0.70", "destinations": "47.50,0.60", "key": "k"}
+        distancematrix = f"{server.base_url}/maps/api/distancematrix/json"
+        over = requests.get(distancematrix, params=matrix).json()
+        assert over["status"] == "OVER_QUERY_LIMIT"   # 2 + 2 éléments > quota de 3
+
+        requests.post(f"{server.base_url}/_reset")
+        assert requests.get(distancematrix, params=matrix).json()["status"] == "OK"
+
+        faults = requests.post(f"{server.base_url}/_faults", json={"error_rate": 1}).json()
+        assert faults["error_rate"] == 1.0
+        assert requests.get(geocode, params={"address": "x", "key": "k"}).status_code == 503
+        assert requests.post(f"{server.base_url}/_faults", json={"nope": 1}).status_code == 400
+        assert requests.get(f"{server.base_url}/_stats").json()["faults"] == {"http_503": 1}
+
+
+def test_gateway_fails_fast_without_http_retries(main_module):
+    from gateway import ProviderGateway, ProviderUnavailable
+
+    with FakeGoogleServer(FakeGoogle(faults=Faults(error_rate=1.0))) as server:
+        gateway = ProviderGateway(main_module.session)   # pas le disjoncteur partagé de l'API
+        started = time.monotonic()
+        with pytest.raises(ProviderUnavailable):
+            gateway.get_json("geocode", f"{server.base_url}/maps/api/geocode/json",
+                             {"address": "1 rue Nationale, Tours", "key": "k"},
+                             main_module.DEFAULT_TIMEOUT)
+        assert time.monotonic() - started < 1.0
+        # un seul appel, pas de retry urllib3
+        assert requests.get(f"{server.base_url}/_stats").json()["faults"] == {"http_503": 1}
+        assert gateway.breaker.failures == 1
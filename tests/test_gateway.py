@@ -0,0 +1,243 @@
+# tests/test_gateway.py
+import datetime
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+
+import gateway
+from bench.fake_routing import FakeResponse, FakeRoutingProvider
+from bench.rosters import make_roster
+from gateway import (
+    BATCH,
+    INTERACTIVE,
+    CircuitBreaker,
+    ProviderGateway,
+    ProviderUnavailable,
+    QuotaExceeded,
+    TokenBucket,
+)
+
+
+class _SlowSession:
+    def __init__(self, responses=None, delay=0.05):
+        self.calls = 0
+        self.delay = delay
+        self.responses = list(responses or [])
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeResponse({"status": "OK"})
+
+
+def test_identical_inflight_requests_are_coalesced():
+    session = _SlowSession()
+    gw = ProviderGateway(session, rate=1000, burst=1000, batch_reserve=0)
+    results = []
+
+    def call(key):
+        results.append(gw.get_json("directions", "https://x/directions/json",
+                                   {"origin": "1,2", "destination": "3,4", "key": key}, 5))
+
+    # même tronçon, clés API différentes : une seule requête réelle
+    threads = [threading.Thread(target=call, args=(f"k{i}",)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert session.calls == 1
+    assert results == [{"status": "OK"}] * 5
+
+
+def test_batch_lane_keeps_a_reserve_for_interactive():
+    bucket = TokenBucket(rate=0.001, burst=4, batch_reserve=0.5)   # réserve = 2 jetons
+    bucket.acquire(BATCH, timeout=0.01)      # 4 -> 3
+    bucket.acquire(BATCH, timeout=0.01)      # 3 -> 2
+    with pytest.raises(QuotaExceeded):
+        bucket.acquire(BATCH, timeout=0.01)  # il faut >= 1 + réserve jetons au batch
+    bucket.acquire(INTERACTIVE, timeout=0.01)
+    bucket.acquire(INTERACTIVE, timeout=0.01)
+
+
+def test_over_query_limit_pauses_then_retries():
+    session = _SlowSession(
+        responses=[FakeResponse({"status": "OVER_QUERY_LIMIT"}), FakeResponse({"status": "OK"})],
+        delay=0,
+    )
+    gw = ProviderGateway(session, rate=1000, burst=1000, batch_reserve=0)
+    with patch.object(gateway, "GOOGLE_QUOTA_BACKOFF", 0.01):
+        data = gw.get_json("geocode", "https://x/geocode/json", {"address": "A"}, 5)
+    assert data == {"status": "OK"}
+    assert session.calls == 2
+
+
+def test_breaker_fails_fast_then_probe_closes_it():
+    session = _SlowSession(delay=0)
+    session.responses = [FakeResponse({}, status_code=503)] * 2
+    gw = ProviderGateway(session, rate=1000, burst=1000, batch_reserve=0)
+    gw.breaker = CircuitBreaker(gw._probe, threshold=2, cooldown=3600)
+    params = {"origin": "1,2", "destination": "3,4"}
+
+    for _ in range(2):
+        with pytest.raises(ProviderUnavailable):
+            gw.get_json("directions", "https://x/directions/json", params, 5)
+    assert gw.breaker.is_open
+    with pytest.raises(ProviderUnavailable):
+        gw.get_json("directions", "https://x/directions/json", params, 5)
+    assert session.calls == 2   # disjoncteur ouvert : aucun appel réseau
+
+    assert gw.breaker.try_probe()   # la sonde rejoue la dernière requête en échec
+    assert not gw.breaker.is_open
+    assert gw.get_json("directions", "https://x/directions/json", params, 5) == {"status": "OK"}
+
+
+def test_routing_outage_degrades_to_flagged_estimates(main_module, client):
+    from bench.fake_routing import FakeRoutingProvider
+    from bench.rosters import make_roster
+
+    roster = make_roster(5, seed=4)
+    provider = FakeRoutingProvider(roster.address_book)
+
+    def geocode_only(url, params=None, timeout=None):
+        if "/geocode/" not in url:
+            raise requests.exceptions.ConnectTimeout("Google injoignable")
+        return provider.get(url, params=params, timeout=timeout)
+
+    main_module.clear_provider_caches()
+    breaker = CircuitBreaker(main_module.gateway._probe, threshold=2, cooldown=3600)
+    with (
+        patch.object(main_module.session, "get", side_effect=geocode_only),
+        patch.object(main_module.gateway, "breaker", breaker),
+    ):
+        r = client.post(
+            "/optimiser_direct",
+            json={"participants": roster.participants, "destination": roster.destination},
+        )
+    assert r.status_code == 200
+    body = r.json()
+    assert body["approximatif"] is True
+    assert body["troncons_estimes"] > 0
+    assert breaker.is_open
+    assert sum(len(t["passagers"]) + 1 for t in body["trajets"]) == 5
+
+
+def test_healthy_routing_gives_an_exact_plan(main_module, client, cold_caches):
+    roster = make_roster(12, seed=38)
+    provider = FakeRoutingProvider(roster.address_book)
+    cold_caches()
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post(
+            "/optimiser_direct",
+            json={"participants": roster.participants, "destination": roster.destination},
+        )
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["approximatif"], body["troncons_estimes"]) == (False, 0)
+    placed = [t["conducteur"] for t in body["trajets"]]
+    placed += [p["nom"] for t in body["trajets"] for p in t["passagers"]]
+    assert sorted(placed) == sorted(p["name"] for p in roster.participants)
+    cars = body["co2_par_voiture"]
+    assert body["co2_economise_kg"] == round(sum(v["co2_voiture_kg"] for v in cars), 2)
+    assert [v["conducteur"] for v in cars] == [t["conducteur"] for t in body["trajets"]]
+
+
+def test_leg_cache_is_keyed_by_departure_slot(main_module, cold_caches):
+    roster = make_roster(5, seed=21)
+    provider = FakeRoutingProvider(roster.address_book)
+    sent = []
+
+    def record(url, params=None, timeout=None):
+        if "distancematrix" in url:
+            sent.append((params or {}).get("departure_time"))
+        return provider.get(url, params=params, timeout=timeout)
+
+    def plan(event_date):
+        data = main_module.InputData(
+            participants=[
+                main_module.Participant(name=p["name"], address=p["address"])
+                for p in roster.participants
+            ],
+            destination=roster.destination,
+            event_date=event_date,
+        )
+        with patch.object(main_module.session, "get", side_effect=record):
+            return main_module._run_optimisation(data)
+
+    cold_caches()
+    plan(datetime.datetime(2026, 10, 24, 10, 0))      # samedi, départ vers 9 h
+    (departure,) = set(sent)
+    depart = datetime.datetime.fromtimestamp(int(departure), main_module.EVENT_TZ)
+    assert (depart.weekday(), depart.hour) == (5, 9)
+    assert depart > datetime.datetime.now(main_module.EVENT_TZ)
+
+    # autre samedi matin, même créneau : tout vient du cache
+    sent.clear()
+    plan(datetime.datetime(2026, 11, 21, 9, 45))
+    assert sent == []
+
+    # mardi 17 h 30 : autre créneau, trafic de pointe
+    rush = datetime.datetime(2026, 11, 24, 18, 30)
+    plan(rush)
+    assert sent and None not in sent
+    sent.clear()
+    plan(None)
+    assert sent and set(sent) == {None}
+    home = roster.address_book[roster.participants[0]["address"]]
+    venue = roster.address_book[roster.destination]
+    bucket = main_module.departure_bucket(rush)
+    in_traffic = main_module.get_google_duration(home, venue, bucket)
+    assert in_traffic > main_module.get_google_duration(home, venue)
+
+
+def test_departure_slots_follow_the_event_time_zone(main_module):
+    paris = main_module.EVENT_TZ
+    kickoff = datetime.datetime(2026, 10, 24, 10, 0)                # samedi 10 h, heure de Paris
+    utc = datetime.datetime(2026, 10, 24, 8, 0, tzinfo=datetime.UTC)   # toISOString()
+    assert main_module.departure_bucket(kickoff) == main_module.departure_bucket(utc) == (5, 4)
+    # retour après le match : autre créneau que l'aller
+    assert main_module.departure_bucket(kickoff, retour=True) == (5, 6)
+
+    # serveur en UTC : le départ envoyé à Google reste 9 h à Paris
+    now = datetime.datetime(2026, 10, 19, 12, 0, tzinfo=datetime.UTC)
+    sent = main_module.bucket_departure_time((5, 4), now)
+    assert datetime.datetime.fromtimestamp(sent, paris) == datetime.datetime(
+        2026, 10, 24, 9, 0, tzinfo=paris
+    )
+
+
+def test_return_legs_use_the_after_match_slot(main_module, cold_caches):
+    roster = make_roster(4, seed=23)
+    provider = FakeRoutingProvider(roster.address_book)
+    venue = roster.address_book[roster.destination]
+    from_venue = f"{venue[1]},{venue[0]}"
+    slots = {}
+
+    def record(url, params=None, timeout=None):
+        if "distancematrix" in url:
+            direction = "retour" if params["origins"] == from_venue else "aller"
+            slots.setdefault(direction, set()).add(int(params["departure_time"]))
+        return provider.get(url, params=params, timeout=timeout)
+
+    data = main_module.InputData(
+        participants=[
+            main_module.Participant(name=p["name"], address=p["address"])
+            for p in roster.participants
+        ],
+        destination=roster.destination,
+        event_date=datetime.datetime(2026, 10, 24, 10, 0),
+        aller_retour=True,
+    )
+    cold_caches()
+    with patch.object(main_module.session, "get", side_effect=record):
+        main_module._run_optimisation(data)
+    # lieu → domiciles : le créneau d'après-match ; domiciles → lieu : celui d'avant
+    hours = {
+        direction: {datetime.datetime.fromtimestamp(t, main_module.EVENT_TZ).hour for t in sent}
+        for direction, sent in slots.items()
+    }
+    assert hours["retour"] == {13} and 9 in hours["aller"]   # plages 12-14 h et 8-10 h
@@ -0,0 +1,151 @@
+# tests/test_import.py
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from bench.fake_routing import FakeRoutingProvider
+
+CSV = (
+    "Nom;Adresse;Code postal;Ville;Email\n"
+    "Alice;12 avenue Grammont;37000;Tours;alice@club.test\n"
+    "Bob;12 Av. Grammont;37000;Tours;\n"
+    "Chloé;;37000;Tours;\n"
+    "David;4 rue Colbert;;Tours;david@club.test\n"
+    "Emma;1 place Plumereau;37000;Tours;\n"
+).encode()
+
+
+def test_streamed_csv_import_inserts_by_chunk_then_geocodes(
+    main_module, client, cold_caches, team_with_roster
+):
+    headers, team_id, _ = team_with_roster([], email="import@club.test", code="u19", name="U19")
+    provider = FakeRoutingProvider({
+        "12 avenue Grammont, 37000 Tours, France": (0.6894, 47.3836),
+        "4 rue Colbert, Tours, France": (0.6900, 47.3960),
+        "1 place Plumereau, 37000 Tours, France": (0.6833, 47.3955),
+    })
+
+    inserts = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO participants"):
+            inserts.append(executemany)
+
+    cold_caches()
+    event.listen(main_module.engine, "before_cursor_execute", count_inserts)
+    try:
+        with (
+            patch.object(main_module, "IMPORT_CHUNK_ROWS", 2),
+            patch.object(main_module.session, "get", side_effect=provider.get),
+        ):
+            # paquets coupés au milieu des lignes, comme sur le réseau
+            r = client.post(
+                f"/teams/{team_id}/participants/import",
+                content=(CSV[i:i + 37] for i in range(0, len(CSV), 37)),
+                headers={**headers, "Content-Type": "text/csv"},
+            )
+    finally:
+        event.remove(main_module.engine, "before_cursor_execute", count_inserts)
+
+    assert r.status_code == 202
+    body = r.json()
+    assert (body["rows"], body["inserted"], body["rejected"]) == (5, 4, 1)
+    assert body["errors"] == ["ligne 4 : adresse manquante"]
+    assert inserts == [False, False]   # 4 lignes, paquets de 2 : deux INSERT multi-lignes
+
+    progress = client.get(f"/imports/{body['id']}", headers=headers).json()
+    assert progress["status"] == "done"
+    assert (progress["to_geocode"], progress["geocoded"], progress["geocode_failed"]) == (4, 4, 0)
+    assert provider.calls["geocode"] == 3   # Alice et Bob : même adresse physique
+
+    participants = client.get(f"/teams/{team_id}/participants", headers=headers).json()
+    assert [p["name"] for p in participants] == ["Alice", "Bob", "David", "Emma"]
+
+
+def test_n8n_roster_sync_is_a_constant_number_of_statements(main_module, client):
+    from bench.rosters import make_roster
+
+    roster = make_roster(12, venue="tours", seed=8)
+    provider = FakeRoutingProvider(roster.address_book)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "participants" in statement or "INTO teams" in statement:
+            statements.append(statement.split()[0])
+
+    def sync(players):
+        statements.clear()
+        event.listen(main_module.engine, "before_cursor_execute", record)
+        try:
+            with patch.object(main_module.session, "get", side_effect=provider.get):
+                r = client.post("/events/optimize_and_save", json={
+                    "team_name": "Seniors Tours",
+                    "destination": roster.destination,
+                    "participants": players,
+                })
+        finally:
+            event.remove(main_module.engine, "before_cursor_execute", record)
+        assert r.status_code == 200
+        return r.json()["team_id"], list(statements)
+
+    team_id, created = sync(roster.participants[:3])
+    assert created == ["INSERT", "INSERT"]   # équipe + roster
+    _, small = sync(roster.participants[:3])
+    new_address = roster.participants[5]["address"]
+    moved = dict(roster.participants[0], name="JOUEUR 001", address=new_address)
+    same_team, large = sync([moved, *roster.participants[1:]])
+    assert same_team == team_id
+    assert small == large   # 3 ou 12 joueurs : mêmes instructions
+
+    with main_module.SessionLocal() as db:
+        rows = db.query(main_module.ParticipantORM).filter_by(team_id=team_id).all()
+    assert len(rows) == 12   # Joueur 001 mis à jour, pas dupliqué
+    assert [r.address for r in rows if r.name == "Joueur 001"] == [new_address]
+
+
+def test_n8n_sync_refuses_a_team_name_that_collides_on_code(main_module, client):
+    from bench.rosters import make_roster
+
+    roster = make_roster(3, venue="orleans", seed=4)
+    provider = FakeRoutingProvider(roster.address_book)
+    players = [
+        dict(roster.participants[0], name="ÉMILE ROY"),
+        # SQLite : lower() ne replie que l'ASCII
+        dict(roster.participants[1], name="émile roy"),
+        dict(roster.participants[2], name="ZOé Petit"),
+        # même identité : la dernière ligne gagne
+        dict(roster.participants[2], name="Zoé Petit"),
+    ]
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post("/events/optimize_and_save", json={
+            "team_name": "Réserve B", "destination": roster.destination, "participants": players,
+        })
+        assert r.status_code == 200
+        clash = client.post("/events/optimize_and_save", json={
+            "team_name": "Réserve/B", "destination": roster.destination,
+            "participants": players[:1],
+        })
+    assert clash.status_code == 409 and "Réserve B" in clash.json()["detail"]
+
+    with main_module.SessionLocal() as db:
+        rows = db.query(main_module.ParticipantORM).filter_by(team_id=r.json()["team_id"])
+        names = sorted(p.name for p in rows)
+    assert names == ["Zoé Petit", "ÉMILE ROY", "émile roy"]
+
+
+def test_n8n_sync_finds_a_team_created_with_its_own_code(main_module, client, team_with_roster):
+    from bench.rosters import make_roster
+
+    # code ≠ slugify("U13 A")
+    headers, team_id, _ = team_with_roster([], email="u13a@club.test", code="u13a", name="U13 A")
+
+    roster = make_roster(3, venue="tours", seed=6)
+    provider = FakeRoutingProvider(roster.address_book)
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post("/events/optimize_and_save", json={
+            "team_name": "U13 A", "destination": roster.destination,
+            "participants": roster.participants,
+        })
+    assert r.json()["team_id"] == team_id
+    events = client.get(f"/teams/{team_id}/events", headers=headers).json()
+    assert [e["id"] for e in events] == [r.json()["event_id"]]
@@ -0,0 +1,24 @@
+# tests/test_metrics.py
+from unittest.mock import patch
+
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def test_metrics_endpoint_reports_provider_calls_and_phases(main_module, client, cold_caches):
+    roster = make_roster(6, seed=3)
+    provider = FakeRoutingProvider(roster.address_book)
+    cold_caches()
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post(
+            "/optimiser_direct",
+            json={"participants": roster.participants, "destination": roster.destination},
+        )
+    assert r.status_code == 200
+
+    body = client.get("/metrics").text
+    assert 'sportcov_provider_calls_total{endpoint="geocode",status="OK"}' in body
+    assert 'sportcov_provider_cache_lookups_total{endpoint="directions",result="hit"}' in body
+    assert 'sportcov_optimiser_phase_seconds_count{phase="solve"}' in body
+    assert 'sportcov_db_queries_per_request_count{route="/optimiser_direct"}' in body
+    assert 'sportcov_ws_rooms{kind="chat"}' in body
@@ -0,0 +1,89 @@
+# tests/test_migrations.py
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, text
+
+# requêtes chaudes de main.py -> index attendu dans le plan
+HOT_QUERIES = [
+    ("SELECT * FROM trips WHERE event_id = 1", "ix_trips_event_id"),
+    ("SELECT * FROM trip_passengers WHERE trip_id = 1", "ix_trip_passengers_trip_id"),
+    ("SELECT * FROM trip_co2 WHERE event_id = 1", "ix_trip_co2_event_id"),
+    ("SELECT * FROM participants WHERE team_id = 1 ORDER BY name", "ix_participants_team_id_name"),
+    (
+        "SELECT * FROM events WHERE team_id = 1 ORDER BY created_at DESC",
+        "ix_events_team_id_created_at",
+    ),
+    (
+        "SELECT * FROM teams WHERE user_id = 1 ORDER BY created_at DESC",
+        "ix_teams_user_id_created_at",
+    ),
+    ("SELECT * FROM teams WHERE name = 'U13'", "ix_teams_name"),
+    ("SELECT * FROM co2_team_seasons WHERE team_id = 1 AND saison = 2025", "ux_co2_team_seasons"),
+    (
+        "SELECT * FROM co2_club_seasons WHERE user_id = 1 ORDER BY saison DESC",
+        "ux_co2_club_seasons",
+    ),
+    ("SELECT * FROM participants WHERE token = 'abc'", None),  # contrainte unique
+]
+
+
+def _plan(conn, sql: str) -> str:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = conn.execute(text(f"EXPLAIN {sql}")).all()
+        return "\n".join(r[0] for r in rows)
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(r[-1] for r in rows)
+
+
+@pytest.mark.parametrize("sql,index", HOT_QUERIES)
+def test_hot_queries_use_an_index(main_module, sql, index):
+    with main_module.engine.begin() as conn:
+        plan = _plan(conn, sql)
+    assert "index" in plan.lower(), plan
+    if index:
+        assert index in plan, plan
+
+
+def test_models_match_migrations(main_module):
+    with main_module.engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), main_module.Base.metadata)
+    assert diff == []
+
+
+def test_identity_migration_reports_duplicates_instead_of_deleting(main_module, tmp_path):
+    import migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'doublons.db'}")
+    migrate.run_migrations(engine, "0004_geocodes")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO teams (id, code, name) VALUES (1, 'u11', 'U11')"))
+        conn.execute(text(
+            "INSERT INTO participants (id, team_id, name, address, email, token) VALUES "
+            "(1, 1, 'Léo Martin', 'a', 'leo@club.test', 't1'), "
+            "(2, 1, 'LÉO MARTIN', 'b', NULL, 't2'), "
+            "(3, 1, 'LéO MARTIN ', 'c', 'LEO@club.test', 't3')"
+        ))
+
+    with pytest.raises(RuntimeError, match="participants 1, 3"):
+        migrate.run_migrations(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM participants")).scalar() == 3
+
+
+def test_identity_migration_trims_names_saved_by_the_old_sync(main_module, tmp_path):
+    import migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'espaces.db'}")
+    migrate.run_migrations(engine, "0004_geocodes")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO teams (id, code, name) VALUES (1, 'u11', 'U11')"))
+        conn.execute(text(
+            "INSERT INTO participants (id, team_id, name, address, email, token) VALUES "
+            "(1, 1, ' Léa Petit ', 'a', 'lea@club.test ', 't1')"
+        ))
+    migrate.run_migrations(engine)
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT name, email FROM participants")).one()
+    assert tuple(row) == ("Léa Petit", "lea@club.test")
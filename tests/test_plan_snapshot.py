@@ -0,0 +1,90 @@
+# tests/test_plan_snapshot.py
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event as sa_event
+
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def test_plan_reads_come_from_the_event_snapshot(main_module, client, team_with_roster):
+    roster = make_roster(7, venue="tours", seed=41)
+    provider = FakeRoutingProvider(roster.address_book)
+    headers, team_id, ids = team_with_roster(
+        roster.participants, email="snapshot@club.test", code="feminines", name="Féminines"
+    )
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        body = {"participant_ids": ids, "event_address": roster.destination}
+        plan = client.post(f"/teams/{team_id}/carpool/optimize", json=body, headers=headers).json()
+    (event,) = client.get(f"/teams/{team_id}/events", headers=headers).json()
+    url = f"/events/{event['id']}/trips"
+
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sa_event.listen(main_module.engine, "before_cursor_execute", listener)
+    try:
+        r = client.get(url, headers=headers)
+    finally:
+        sa_event.remove(main_module.engine, "before_cursor_execute", listener)
+    assert r.json() == plan
+    # utilisateur courant + une ligne events, sans jointure trips / trip_co2
+    assert not any("trips" in s or "trip_co2" in s for s in statements)
+
+    etag = r.headers["etag"]
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    # plan antérieur aux snapshots : reconstruit depuis les tables
+    with main_module.SessionLocal() as db:
+        db.get(main_module.EventORM, event["id"]).plan_format = None
+        db.commit()
+    legacy = client.get(url, headers=headers)
+    assert "etag" not in legacy.headers
+    assert legacy.json()["trajets"] == plan["trajets"]
+
+
+def test_pdf_of_a_stored_event_reuses_its_snapshot(main_module, client):
+    roster = make_roster(5, venue="nantes", seed=43)
+    provider = FakeRoutingProvider(roster.address_book)
+    data = main_module.InputData(
+        participants=[
+            main_module.Participant(name=p["name"], address=p["address"])
+            for p in roster.participants
+        ],
+        destination=roster.destination,
+    )
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        body = {"team_name": "Loisirs Nantes", **data.model_dump()}
+        r = client.post("/events/optimize_and_save", json=body)
+    event_id = r.json()["event_id"]
+
+    provider.reset()
+    main_module.clear_provider_caches()
+    drivers = [t["conducteur"] for t in r.json()["trajets"]]
+    # équipe créée par n8n : sans propriétaire, seul un admin imprime
+    admin = main_module.CurrentUser(1, "admin@club.test", "Admin", True, 0)
+    coach = main_module.CurrentUser(2, "coach@club.test", "Coach", False, 0)
+    with (
+        patch.object(main_module.session, "get", side_effect=provider.get),
+        main_module.SessionLocal() as db,
+    ):
+        printed, destination = main_module._pdf_plan(db, None, event_id, admin)
+        assert not provider.calls   # aucun appel Google payé pour réimprimer
+        assert [t.conducteur for t in printed.trajets] == drivers
+        assert destination == roster.destination
+        with pytest.raises(main_module.HTTPException) as denied:
+            main_module._pdf_plan(db, None, event_id, coach)
+        assert denied.value.status_code == 403
+
+        # pas de snapshot : plan des tables sans corps, ré-optimisé avec
+        db.get(main_module.EventORM, event_id).plan_format = None
+        db.commit()
+        stored, _ = main_module._pdf_plan(db, None, event_id, admin)
+        assert [t.conducteur for t in stored.trajets] == drivers and not provider.calls
+        assert main_module._pdf_plan(db, data, event_id, admin)[0].trajets
+        assert provider.calls["distancematrix"]
+
+    assert client.post(f"/export_pdf?event_id={event_id}").status_code == 401
@@ -0,0 +1,97 @@
+# tests/test_round_trip.py
+from itertools import pairwise
+from unittest.mock import patch
+
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def _billed(main_module, cold_caches, provider, data):
+    cold_caches()
+    provider.reset()
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        result = main_module._run_optimisation(data)
+    return result, provider.elements["distancematrix"], provider.calls["geocode"]
+
+
+def test_return_plan_reuses_the_outbound_pass(main_module, cold_caches):
+    roster = make_roster(30, seed=8)
+    provider = FakeRoutingProvider(roster.address_book)
+    data = main_module.InputData(
+        participants=[
+            main_module.Participant(name=p["name"], address=p["address"])
+            for p in roster.participants
+        ],
+        destination=roster.destination,
+    )
+
+    one_way, one_way_elements, _ = _billed(main_module, cold_caches, provider, data)
+    round_trip_data = data.model_copy(update={"aller_retour": True})
+    round_trip, elements, geocodes = _billed(main_module, cold_caches, provider, round_trip_data)
+
+    assert one_way.retour is None
+    assert [t.conducteur for t in round_trip.trajets] == [t.conducteur for t in one_way.trajets]
+    assert geocodes == 31 and elements < 1.5 * one_way_elements
+
+    # chaque voiture du retour : lieu → passagers → domicile du conducteur, sous le seuil
+    book = roster.address_book
+    home = {p["name"]: book[p["address"]] for p in roster.participants}
+    dest = book[roster.destination]
+    seen = []
+    for trajet in round_trip.retour.trajets:
+        stops = [dest] + [home[p.nom] for p in trajet.passagers] + [home[trajet.conducteur]]
+        duration = sum(FakeRoutingProvider.leg(a, b)[0] for a, b in pairwise(stops))
+        alone = FakeRoutingProvider.leg(dest, home[trajet.conducteur])[0]
+        assert duration <= round_trip.seuil_rallonge * alone
+        assert trajet.ordre.startswith(roster.destination)
+        seen += [trajet.conducteur] + [p.nom for p in trajet.passagers]
+    assert sorted(seen) == sorted(p["name"] for p in roster.participants)
+
+
+def test_return_plan_only_uses_the_outbound_cars(main_module, cold_caches):
+    for size, seed in ((10, 3), (30, 0), (30, 3), (60, 4)):
+        roster = make_roster(size, seed=seed)
+        provider = FakeRoutingProvider(roster.address_book)
+        data = main_module.InputData(
+            participants=[
+                main_module.Participant(name=p["name"], address=p["address"])
+                for p in roster.participants
+            ],
+            destination=roster.destination,
+            aller_retour=True,
+        )
+        result, _, _ = _billed(main_module, cold_caches, provider, data)
+        trajets, retour = result.trajets, result.retour.trajets
+
+        # les voitures sont au lieu : pas de nouveau conducteur, pas de voiture en plus
+        assert {t.conducteur for t in retour} <= {t.conducteur for t in trajets}
+        assert len(retour) <= len(trajets)
+        assert all(len(t.passagers) <= result.max_passagers for t in retour)
+        seen = [t.conducteur for t in retour] + [p.nom for t in retour for p in t.passagers]
+        assert sorted(seen) == sorted(p["name"] for p in roster.participants)
+
+
+def test_round_trip_plans_are_stored_on_the_event(main_module, client, team_with_roster):
+    roster = make_roster(6, venue="blois", seed=12)
+    provider = FakeRoutingProvider(roster.address_book)
+    headers, team_id, ids = team_with_roster(
+        roster.participants, email="retour@club.test", code="seniors", name="Seniors"
+    )
+    payload = {"participant_ids": ids, "event_address": roster.destination, "aller_retour": True}
+
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post(f"/teams/{team_id}/carpool/optimize", json=payload, headers=headers)
+    assert r.status_code == 200
+    plan = r.json()
+    assert plan["retour"]["trajets"]
+
+    (event,) = client.get(f"/teams/{team_id}/events", headers=headers).json()
+    stored = client.get(f"/events/{event['id']}/trips", headers=headers).json()
+    assert stored["trajets"] == plan["trajets"]
+    assert stored["retour"]["trajets"] == plan["retour"]["trajets"]
+    assert stored["co2_economise_kg"] == plan["co2_economise_kg"]
+
+    player_token = main_module.SessionLocal().get(main_module.ParticipantORM, ids[0]).token
+    trip = client.get(f"/events/{event['id']}/trips/player/{player_token}").json()
+    assert trip["ordre"].endswith(roster.destination)
+    assert trip["retour"]["ordre"].startswith(roster.destination)
@@ -0,0 +1,116 @@
+# tests/test_solver.py
+import pickle
+from array import array
+from multiprocessing.shared_memory import SharedMemory
+from unittest.mock import patch
+
+import pytest
+
+import solver
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def _full_problem(roster, seuil=1.5, max_passengers=3):
+    book = roster.address_book
+    points = [book[p["address"]] for p in roster.participants]
+    dest = book[roster.destination]
+    n = len(points)
+    direct = [FakeRoutingProvider.leg(p, dest)[0] for p in points]
+    durations = [
+        FakeRoutingProvider.leg(points[i], points[j])[0] for i in range(n) for j in range(n)
+    ]
+    return points, dest, solver.Problem(direct, durations, max_passengers, seuil)
+
+
+def test_pruned_matrix_gives_the_same_plan_as_the_full_matrix():
+    for seed in (1, 2, 3):
+        points, dest, full = _full_problem(make_roster(25, seed=seed))
+        n = len(points)
+        pruned = [solver.UNREACHABLE] * (n * n)
+        needed = solver.candidate_legs(points, dest, full.direct, full.seuil)
+        for i, j in needed:
+            pruned[i * n + j] = full.durations[i * n + j]
+        assert len(needed) < n * (n - 1)
+        pruned_plan = solver.solve(solver.Problem(full.direct, pruned, 3, 1.5))
+        assert pruned_plan.routes == solver.solve(full).routes
+
+
+def test_every_participant_is_assigned_once():
+    _, _, problem = _full_problem(make_roster(12, seed=5), max_passengers=4)
+    routes = solver.solve(problem).routes
+    assert sorted(i for route in routes for i in route) == list(range(12))
+    assert all(len(route) <= 5 for route in routes)
+
+
+def test_executor_ships_problems_to_worker_processes():
+    problems = [_full_problem(make_roster(8, seed=seed))[2] for seed in (1, 2)]
+    executor = solver.SolverExecutor(workers=2, queue_max=0, inline_below=5)
+    assert executor.solve_many(problems) == [solver.solve(p) for p in problems]
+    stats = executor.stats()
+    assert (stats["completed"], stats["inline"], stats["pending"]) == (2, 0, 0)
+
+
+def test_executor_rejects_when_workers_and_queue_are_full():
+    _, _, problem = _full_problem(make_roster(8, seed=1))
+    executor = solver.SolverExecutor(workers=1, queue_max=0, inline_below=5)
+    executor.pending = 1   # une résolution déjà en cours
+    with pytest.raises(solver.SolverBusy):
+        executor.solve(problem)
+    assert executor.stats()["rejected"] == 1
+    # les petits effectifs restent dans le thread appelant, sans passer par la file
+    assert executor.solve_many([_full_problem(make_roster(3, seed=1))[2]])[0].routes
+
+
+def test_batch_endpoint_shares_legs_and_isolates_failing_jobs(
+    main_module, client, cold_caches, register, team_with_roster
+):
+    headers = register("batch@club.test")
+
+    roster = make_roster(8, seed=11)
+    provider = FakeRoutingProvider(roster.address_book)
+    venue = roster.destination
+
+    jobs = []
+    for code, players in (("u13", roster.participants[:5]), ("u15", roster.participants[3:])):
+        _, team_id, ids = team_with_roster(
+            players, code=code, name=code.upper(), headers=headers
+        )
+        jobs.append({"team_id": team_id, "participant_ids": ids, "event_address": venue})
+    jobs.append({"team_id": 999999, "participant_ids": [1], "event_address": venue})
+
+    cold_caches()
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post("/carpool/optimize_batch", json={"jobs": jobs}, headers=headers)
+    assert r.status_code == 200
+    first, second, missing = r.json()
+    assert first["event_id"] and second["event_id"]
+    assert sum(len(t["passagers"]) + 1 for t in first["result"]["trajets"]) == 5
+    assert missing["error"] == "Équipe introuvable"
+    # 2 joueurs communs + même stade : 8 géocodages d'adresses + 1 pour le stade
+    assert provider.calls["geocode"] == 9
+
+
+def test_executor_shares_the_matrix_instead_of_pickling_it():
+    _, _, problem = _full_problem(make_roster(30, seed=4))
+    matrix = solver.SharedDurations(array("i", problem.durations))
+    try:
+        # seul le nom du segment voyage vers le worker
+        assert len(pickle.dumps(matrix)) < 200 < len(pickle.dumps(problem.durations))
+        shipped = pickle.loads(pickle.dumps(solver.Problem(problem.direct, matrix, 3, 1.5)))
+        assert solver.solve(shipped) == solver.solve(problem)
+    finally:
+        matrix.unlink()
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=matrix.name)
+
+
+def test_shared_matrix_accepts_int32_arrays_and_plain_lists():
+    _, _, problem = _full_problem(make_roster(8, seed=5))
+    for values in (array("i", problem.durations), list(problem.durations)):
+        matrix = solver.SharedDurations(values)
+        try:
+            with matrix.view() as durations:
+                assert durations.tolist() == list(problem.durations)
+        finally:
+            matrix.unlink()
@@ -0,0 +1,31 @@
+# tests/test_startup.py
+import subprocess
+import sys
+
+from conftest import API_DIR
+
+
+def test_import_main_is_lazy():
+    # ni WeasyPrint ni connexion BDD à l'import (URL volontairement injoignable)
+    code = (
+        "import sys, main; "
+        "assert 'weasyprint' not in sys.modules; "
+        "print('ok')"
+    )
+    env = {"DATABASE_URL": "postgresql+psycopg2://x:y@127.0.0.1:1/none", "PATH": ""}
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=API_DIR, env=env, capture_output=True, text=True, timeout=30,
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "ok"
+
+
+def test_liveness_and_readiness(client):
+    r = client.get("/healthz")
+    assert r.status_code == 200
+    assert r.json()["status"] == "ok"
+
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    assert r.json()["ready"] is True
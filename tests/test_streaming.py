@@ -0,0 +1,80 @@
+# tests/test_streaming.py
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def test_stream_sends_progress_then_each_car_then_the_saved_plan(
+    main_module, client, register, team_with_roster
+):
+    roster = make_roster(9, venue="tours", seed=31)
+    provider = FakeRoutingProvider(roster.address_book)
+    headers, team_id, ids = team_with_roster(
+        roster.participants, email="stream@club.test", code="veterans", name="Vétérans"
+    )
+    payload = {"participant_ids": ids, "event_address": roster.destination}
+
+    optimize = f"/teams/{team_id}/carpool/optimize"
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post(f"{optimize}/stream", json=payload, headers=headers)
+        plain = client.post(optimize, json=payload, headers=headers).json()
+    assert r.status_code == 200 and r.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.text.splitlines()]
+
+    geocoded = [
+        m["fait"] for m in lines if m["type"] == "progression" and m["phase"] == "geocode"
+    ]
+    assert geocoded == list(range(1, 10))
+    cars = [m for m in lines if m["type"] == "voiture"]
+    assigned = [m["assignes"] for m in cars]
+    assert assigned == sorted(assigned) and assigned[-1] == 9
+    *_, final = lines
+    assert final["type"] == "resultat" and final["event_id"]
+    assert [m["trajet"] for m in cars] == final["trajets"] == plain["trajets"]
+    assert final["co2_economise_kg"] == plain["co2_economise_kg"]
+
+    stored = client.get(f"/events/{final['event_id']}/trips", headers=headers).json()
+    assert stored["trajets"] == final["trajets"]
+
+    # un autre coach (non admin) ne planifie pas pour cette équipe
+    login = {"username": "stream-other@club.test", "password": "secret"}
+    other_id = client.get(
+        "/auth/me", headers=register(login["username"], full_name="Autre")
+    ).json()["id"]
+    client.patch(f"/auth/users/{other_id}/role", params={"is_admin": False}, headers=headers)
+    other_token = client.post("/auth/login", data=login).json()["access_token"]
+    denied = client.post(
+        f"{optimize}/stream", json=payload, headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert denied.status_code == 403
+
+
+def test_streaming_solve_stops_when_the_client_leaves(main_module):
+    roster = make_roster(12, venue="tours", seed=32)
+    provider = FakeRoutingProvider(roster.address_book)
+    data = main_module.InputData(
+        participants=[
+            main_module.Participant(name=p["name"], address=p["address"])
+            for p in roster.participants
+        ],
+        destination=roster.destination,
+    )
+    cancelled = threading.Event()
+    seen = []
+
+    def emit(item):
+        seen.append(item["type"])
+        if item["type"] == "voiture":
+            cancelled.set()   # le client ferme après la première voiture
+
+    with (
+        patch.object(main_module.session, "get", side_effect=provider.get),
+        pytest.raises(main_module.OptimisationCancelled),
+    ):
+        main_module._run_optimisation_streaming(data, emit, cancelled)
+    assert seen.count("voiture") == 1
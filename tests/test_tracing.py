@@ -0,0 +1,39 @@
+# tests/test_tracing.py
+from unittest.mock import patch
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+_exporter = InMemorySpanExporter()
+_provider = TracerProvider()
+_provider.add_span_processor(SimpleSpanProcessor(_exporter))
+trace.set_tracer_provider(_provider)
+
+
+def test_optimisation_trace_has_phases_and_provider_calls(main_module, client, cold_caches):
+    roster = make_roster(5, seed=7)
+    provider = FakeRoutingProvider(roster.address_book)
+    cold_caches()
+    _exporter.clear()
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        r = client.post(
+            "/optimiser_direct",
+            json={"participants": roster.participants, "destination": roster.destination},
+        )
+    assert r.status_code == 200
+
+    spans = {s.name: s for s in _exporter.get_finished_spans()}
+    run = spans["optimiser.run"]
+    assert run.attributes["roster_size"] == 5
+    assert run.attributes["cars"] == len(r.json()["trajets"])
+    assert run.attributes["subsets_evaluated"] >= run.attributes["cars"]
+    for name in ("optimiser.geocode", "optimiser.solve", "optimiser.co2", "provider.geocode"):
+        assert name in spans
+    # tout est rattaché à la span racine de la requête HTTP
+    root = spans["POST /optimiser_direct"]
+    assert run.context.trace_id == root.context.trace_id
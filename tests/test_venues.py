@@ -0,0 +1,48 @@
+# tests/test_venues.py
+from unittest.mock import patch
+
+from bench.fake_routing import FakeRoutingProvider
+from bench.rosters import make_roster
+
+
+def test_normalize_address_ignores_case_accents_and_punctuation(main_module):
+    key = main_module.normalize_address("Stade de l'Île d'Or, Amboise")
+    assert key == "stade de l ile d or amboise"
+    assert main_module.normalize_address("  STADE DE L'ILE D'OR -- amboise ") == key
+
+
+def test_known_venue_starts_with_inbound_legs_loaded(main_module, client, team_with_roster):
+    roster = make_roster(6, venue="blois", seed=3)
+    provider = FakeRoutingProvider(roster.address_book)
+    venue_param = "{1},{0}".format(*roster.address_book[roster.destination])
+
+    headers, team_id, ids = team_with_roster(
+        roster.participants, email="venues@club.test", code="u17", name="U17"
+    )
+    payload = {"participant_ids": ids, "event_address": roster.destination}
+
+    main_module.clear_provider_caches()
+    with patch.object(main_module.session, "get", side_effect=provider.get):
+        first = client.post(f"/teams/{team_id}/carpool/optimize", json=payload, headers=headers)
+        venues = client.get("/venues", headers=headers).json()
+        (venue,) = [v for v in venues if v["address"] == roster.destination]
+        assert main_module.refresh_venue(venue["id"]) == 6
+
+    # le même stade, autrement écrit : ni géocodage (lieu connu, domiciles dans la
+    # table geocodes), ni tronçon domicile → lieu
+    main_module.clear_provider_caches()
+    provider.reset()
+    requested = []
+
+    def record(url, params=None, timeout=None):
+        requested.append((params or {}).get("destinations", ""))
+        return provider.get(url, params=params, timeout=timeout)
+
+    payload["event_address"] = "STADE DES ALLEES - BLOIS"
+    with patch.object(main_module.session, "get", side_effect=record):
+        second = client.post(f"/teams/{team_id}/carpool/optimize", json=payload, headers=headers)
+    assert second.status_code == 200
+    assert provider.calls["geocode"] == 0
+    assert not any(venue_param in destinations for destinations in requested)
+    drivers = [t["conducteur"] for t in first.json()["trajets"]]
+    assert [t["conducteur"] for t in second.json()["trajets"]] == drivers